@@ -6,6 +6,22 @@ import argparse
 import sys
 from aider_mcp_server.server import serve
 from aider_mcp_server.capabilities.utils import DEFAULT_EDITOR_MODEL
+from aider_mcp_server.capabilities.coder_cache import DEFAULT_CODER_POOL_SIZE
+from aider_mcp_server.capabilities.response_cache import DEFAULT_CACHE_TTL
+from aider_mcp_server.capabilities.tools.aider_ask import DEFAULT_MAX_CONNECTIONS
+from aider_mcp_server.capabilities.workspaces import DEFAULT_IDLE_TIMEOUT
+from aider_mcp_server.capabilities.worktree_pool import DEFAULT_WORKTREE_POOL_SIZE
+from aider_mcp_server.capabilities.http_workers import DEFAULT_DRAIN_TIMEOUT
+from aider_mcp_server.capabilities.rate_limits import DEFAULT_UPSTREAM_CONCURRENCY, parse_rate_limit
+from aider_mcp_server.capabilities.process_pool import (
+    DEFAULT_MAX_TASKS_PER_WORKER,
+    DEFAULT_MAX_WORKER_MEMORY_MB,
+)
+from aider_mcp_server.capabilities.worker_pool import (
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_MAX_QUEUE,
+    WORKER_MODES,
+)
 
 
 def main():
@@ -30,16 +46,213 @@ def main():
         default=".",
         help="Current working directory (default: current directory)"
     )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help=f"Maximum number of concurrent Aider sessions (default: {DEFAULT_MAX_WORKERS})"
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=DEFAULT_MAX_QUEUE,
+        help=f"Maximum number of Aider sessions waiting for a worker (default: {DEFAULT_MAX_QUEUE})"
+    )
+    parser.add_argument(
+        "--worker-mode",
+        type=str,
+        choices=WORKER_MODES,
+        default="thread",
+        help="Run Aider sessions on a thread or process pool (default: thread)"
+    )
+    parser.add_argument(
+        "--worker-max-tasks",
+        type=int,
+        default=DEFAULT_MAX_TASKS_PER_WORKER,
+        help="With --worker-mode process, sessions a worker process runs before it is replaced, "
+             f"0 for no limit (default: {DEFAULT_MAX_TASKS_PER_WORKER})"
+    )
+    parser.add_argument(
+        "--worker-max-memory",
+        type=int,
+        default=DEFAULT_MAX_WORKER_MEMORY_MB,
+        help="With --worker-mode process, resident memory in MiB above which a worker process "
+             f"is replaced, 0 for no limit (default: {DEFAULT_MAX_WORKER_MEMORY_MB})"
+    )
+    parser.add_argument(
+        "--coder-cache-size",
+        type=int,
+        default=DEFAULT_CODER_POOL_SIZE,
+        help=f"Number of warm Aider models and coders kept for reuse, 0 to disable (default: {DEFAULT_CODER_POOL_SIZE})"
+    )
+    parser.add_argument(
+        "--ask-cache-size",
+        type=int,
+        default=0,
+        help="Number of ask_question responses cached in memory, 0 to disable (default: 0)"
+    )
+    parser.add_argument(
+        "--ask-cache-ttl",
+        type=float,
+        default=DEFAULT_CACHE_TTL,
+        help=f"Seconds a cached ask_question response stays valid (default: {DEFAULT_CACHE_TTL:g})"
+    )
+    parser.add_argument(
+        "--ask-cache-path",
+        type=str,
+        help="SQLite file for an on-disk ask_question response cache (optional)"
+    )
+    parser.add_argument(
+        "--ask-max-connections",
+        type=int,
+        default=DEFAULT_MAX_CONNECTIONS,
+        help=f"Size of the ask_question keep-alive HTTP connection pool (default: {DEFAULT_MAX_CONNECTIONS})"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="Seconds after which an ai_code session is stopped and its edits rolled back, "
+             "unless its settings give a timeout (default: no limit)"
+    )
+    parser.add_argument(
+        "--worktree-pool-size",
+        type=int,
+        default=DEFAULT_WORKTREE_POOL_SIZE,
+        help="Number of git worktrees kept ready for sessions run with the worktree setting "
+             f"(default: {DEFAULT_WORKTREE_POOL_SIZE}, worktrees are created on demand)"
+    )
+    parser.add_argument(
+        "--workspace",
+        action="append",
+        default=[],
+        metavar="NAME=PATH",
+        help="Serve another workspace that requests can select by name; may be repeated"
+    )
+    parser.add_argument(
+        "--workspace-root",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="Directory inside which clients may register workspaces; may be repeated"
+    )
+    parser.add_argument(
+        "--workspace-max-sessions",
+        type=int,
+        help="Number of sessions a workspace may run at once (default: --max-workers)"
+    )
+    parser.add_argument(
+        "--workspace-idle-timeout",
+        type=float,
+        default=DEFAULT_IDLE_TIMEOUT,
+        help="Seconds without sessions after which a workspace's warm coders are dropped "
+             f"(default: {DEFAULT_IDLE_TIMEOUT:g})"
+    )
+    parser.add_argument(
+        "--job-db",
+        type=str,
+        help="SQLite database of the jobs queued with submit_ai_code "
+             "(default: .aider-mcp/jobs.db under --cwd)"
+    )
+    parser.add_argument(
+        "--job-concurrency",
+        type=int,
+        help="Number of queued jobs run at once (default: --max-workers)"
+    )
+    parser.add_argument(
+        "--http-workers",
+        type=int,
+        default=1,
+        help="Number of processes serving SSE on the same port, each with its own "
+             "worker pool (default: 1)"
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=DEFAULT_DRAIN_TIMEOUT,
+        help=f"Seconds running requests get to finish when the server stops (default: {DEFAULT_DRAIN_TIMEOUT:g})"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        action="append",
+        default=[],
+        metavar="KEY=RPM[:TPM]",
+        help="Requests and tokens per minute allowed for a model, a provider or * (every model); "
+             "may be repeated"
+    )
+    parser.add_argument(
+        "--upstream-concurrency",
+        type=int,
+        default=DEFAULT_UPSTREAM_CONCURRENCY,
+        help="Highest number of concurrent LLM requests per model, adapted down on 429 "
+             f"responses and slow replies (default: {DEFAULT_UPSTREAM_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--fast-model",
+        type=str,
+        default=None,
+        help="Model to try each ai_code session with first, escalating to the architect and "
+             "editor models when its edits fail to apply, parse or validate"
+    )
+    parser.add_argument(
+        "--validate-cmd",
+        type=str,
+        default=None,
+        help="Command the fast model's changed files must pass, such as a linter; "
+             "the files' paths are appended to it"
+    )
+    parser.add_argument(
+        "--no-prewarm",
+        action="store_true",
+        help="Import Aider only on the first tool call instead of in the background at startup"
+    )
     
     # Parse arguments
     args = parser.parse_args()
+    workspaces = {}
+    for spec in args.workspace:
+        name, sep, path = spec.partition("=")
+        if not sep:
+            parser.error(f"--workspace must be NAME=PATH, got {spec!r}")
+        workspaces[name] = path
+    rate_limits = {}
+    for spec in args.rate_limit:
+        try:
+            key, limit = parse_rate_limit(spec)
+        except ValueError as e:
+            parser.error(str(e))
+        rate_limits[key] = limit
     
     try:
         # Start the server
         serve(
             editor_model=args.editor_model,
             current_working_dir=args.cwd,
-            architect_model=args.architect_model
+            architect_model=args.architect_model,
+            max_workers=args.max_workers,
+            max_queue=args.max_queue,
+            worker_mode=args.worker_mode,
+            coder_cache_size=args.coder_cache_size,
+            ask_cache_size=args.ask_cache_size,
+            ask_cache_ttl=args.ask_cache_ttl,
+            ask_cache_path=args.ask_cache_path,
+            ask_max_connections=args.ask_max_connections,
+            prewarm=not args.no_prewarm,
+            default_timeout=args.timeout,
+            worktree_pool_size=args.worktree_pool_size,
+            workspaces=workspaces,
+            workspace_roots=args.workspace_root,
+            workspace_max_sessions=args.workspace_max_sessions,
+            workspace_idle_timeout=args.workspace_idle_timeout,
+            job_db=args.job_db,
+            job_concurrency=args.job_concurrency,
+            worker_max_tasks=args.worker_max_tasks,
+            worker_max_memory_mb=args.worker_max_memory,
+            http_workers=args.http_workers,
+            drain_timeout=args.drain_timeout,
+            rate_limits=rate_limits,
+            upstream_concurrency=args.upstream_concurrency,
+            fast_model=args.fast_model,
+            validate_cmd=args.validate_cmd
         )
     except KeyboardInterrupt:
         print("Server stopped by user", file=sys.stderr)
@@ -0,0 +1,3 @@
+"""
+Offline benchmarks of the server against a local mock LLM.
+"""
@@ -0,0 +1,114 @@
+"""
+Entry point for the server benchmark.
+
+Run with ``python -m aider_mcp_server.benchmarks``.
+"""
+
+import argparse
+import asyncio
+import sys
+from aider_mcp_server.benchmarks.harness import (
+    MODES,
+    TOOLS,
+    format_results,
+    results_json,
+    run_benchmarks,
+)
+
+
+def _list(choices):
+    def parse(value):
+        items = [item.strip() for item in value.split(",") if item.strip()]
+        unknown = [item for item in items if item not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown choice(s): {', '.join(unknown)}")
+        return items
+    return parse
+
+
+def _concurrencies(value):
+    try:
+        levels = [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a list of integers: {value}")
+    if not levels or min(levels) < 1:
+        raise argparse.ArgumentTypeError("concurrency levels must be at least 1")
+    return levels
+
+
+def main():
+    """
+    Parse command line arguments and run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description="Aider MCP Server benchmark")
+    parser.add_argument(
+        "--modes",
+        type=_list(MODES),
+        default=list(MODES),
+        help=f"Comma separated ways to drive the tools (default: {','.join(MODES)})"
+    )
+    parser.add_argument(
+        "--tools",
+        type=_list(TOOLS),
+        default=list(TOOLS),
+        help=f"Comma separated tools to benchmark (default: {','.join(TOOLS)})"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=_concurrencies,
+        default=[1, 4, 16],
+        help="Comma separated concurrency levels (default: 1,4,16)"
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=32,
+        help="Requests per run (default: 32)"
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=1,
+        help="Untimed requests before the runs of each tool (default: 1)"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds the mock LLM waits before answering (default: 0)"
+    )
+    parser.add_argument(
+        "--chunk-delay",
+        type=float,
+        default=0.0,
+        help="Seconds between the chunks of a streamed mock answer (default: 0)"
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the results as JSON instead of a table"
+    )
+    parser.add_argument(
+        "server_args",
+        nargs=argparse.REMAINDER,
+        help="Arguments after -- are passed to the stdio and SSE servers"
+    )
+
+    args = parser.parse_args()
+    server_args = args.server_args[1:] if args.server_args[:1] == ["--"] else args.server_args
+    results = asyncio.run(run_benchmarks(
+        modes=args.modes,
+        tools=args.tools,
+        concurrencies=args.concurrency,
+        requests=args.requests,
+        warmup=args.warmup,
+        latency=args.latency,
+        chunk_delay=args.chunk_delay,
+        server_args=server_args,
+    ))
+    print(results_json(results) if args.json else format_results(results))
+    return 1 if any(result.errors for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,434 @@
+"""
+End-to-end throughput benchmark of the server's tools against a mock LLM.
+
+Each run sends a number of requests to one tool at a fixed concurrency and
+reports throughput, latency percentiles and memory. Tools are driven either
+directly, by calling ``code_with_aider``, ``ask_question`` and
+``list_models`` in this process, or through a server subprocess over the
+stdio or SSE transport. The LLM is always the local ``MockLLMServer``, so
+the numbers measure the server's own overhead plus the configured latency.
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aider_mcp_server.benchmarks.mock_llm import MockLLMServer, edit_prompt
+
+TOOLS = ("ai_code", "ask_question", "list_models")
+MODES = ("direct", "stdio", "sse")
+BENCHMARK_MODEL = "gpt-4o"
+# Server tool names of the benchmarked tools
+SERVER_TOOLS = {"ai_code": "ai_code", "ask_question": "ask_question", "list_models": "get_models"}
+# Seconds to wait for an SSE server to accept connections
+SERVER_START_TIMEOUT = 60.0
+
+# Sends request number ``index`` and returns whether it succeeded
+Request = Callable[[int], Awaitable[bool]]
+
+
+@dataclass
+class BenchmarkResult:
+    """Measurements of one benchmark run."""
+    mode: str
+    tool: str
+    concurrency: int
+    requests: int
+    errors: int
+    seconds: float
+    throughput: float
+    p50_ms: float
+    p99_ms: float
+    mean_ms: float
+    rss_mib: Optional[float]
+    rss_per_request_kib: Optional[float]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Return a percentile of ``values`` by linear interpolation.
+
+    Args:
+        values: The samples
+        fraction: The percentile as a fraction, e.g. 0.99
+
+    Returns:
+        The percentile, or 0.0 when there are no samples
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def process_tree_rss(pid: Optional[int] = None) -> Optional[int]:
+    """
+    Return the resident memory of a process and its descendants, in bytes.
+
+    Args:
+        pid: The root process (this process when None)
+
+    Returns:
+        The total RSS, or None where ``/proc`` is not available
+    """
+    pid = pid or os.getpid()
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            if current == pid:
+                return None
+    return total
+
+
+def benchmark_env(base_url: str) -> Dict[str, str]:
+    """
+    Return the environment that points every LLM client at the mock server.
+
+    Args:
+        base_url: The mock server's OpenAI base URL
+
+    Returns:
+        The variables to set
+    """
+    return {
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_API_BASE": base_url,
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_DEFAULT_MODEL": BENCHMARK_MODEL,
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+    }
+
+
+def prepare_workdir(directory: str, count: int) -> List[str]:
+    """
+    Create one file per request, so concurrent ai_code sessions never wait on each other's file locks.
+
+    Args:
+        directory: The working directory of the sessions
+        count: Number of files
+
+    Returns:
+        The relative paths of the files
+    """
+    names = [f"bench_{index}.py" for index in range(count)]
+    for name in names:
+        with open(os.path.join(directory, name), "w") as f:
+            f.write("VALUE = 0\n")
+    return names
+
+
+async def measure(send: Request, requests: int, concurrency: int,
+                  rss: Callable[[], Optional[int]]) -> Dict[str, Any]:
+    """
+    Send ``requests`` requests, at most ``concurrency`` at a time, and time them.
+
+    Args:
+        send: Sends one request
+        requests: Number of requests
+        concurrency: Number of requests in flight at once
+        rss: Returns the memory to report, in bytes
+
+    Returns:
+        The measured fields of a BenchmarkResult
+    """
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal errors, next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                ok = await send(index)
+            except Exception as e:
+                print(f"Benchmark request failed: {str(e)}", file=sys.stderr)
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    rss_before = rss()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+    rss_after = rss()
+
+    growth = None
+    if rss_before is not None and rss_after is not None:
+        growth = (rss_after - rss_before) / 1024 / requests
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": seconds,
+        "throughput": requests / seconds if seconds else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "rss_mib": rss_after / 1024 / 1024 if rss_after is not None else None,
+        "rss_per_request_kib": growth,
+    }
+
+
+def direct_request(tool: str, workdir: str, files: List[str]) -> Request:
+    """
+    Build the request function calling a tool's implementation in this process.
+
+    Args:
+        tool: One of TOOLS
+        workdir: Working directory of ai_code sessions
+        files: Files created by ``prepare_workdir``
+
+    Returns:
+        The request function; it runs the call on a worker thread
+    """
+    if tool == "ai_code":
+        from aider_mcp_server.capabilities.tools.aider_ai_code import code_with_aider
+
+        def call(index: int) -> bool:
+            name = files[index % len(files)]
+            # Aider's terminal output is not thread-safe; the server streams it as progress instead
+            result = code_with_aider(
+                edit_prompt(name), [name], editor_model=BENCHMARK_MODEL, current_working_dir=workdir,
+                progress_callback=lambda event: None
+            )
+            return result["status"] == "success"
+    elif tool == "ask_question":
+        from aider_mcp_server.capabilities.tools.aider_ask import ask_question
+
+        def call(index: int) -> bool:
+            # A distinct question per request, so a configured cache cannot answer it
+            return bool(ask_question(f"Benchmark question {index}", use_cache=False))
+    else:
+        from aider_mcp_server.capabilities.tools.aider_list_models import list_models
+
+        def call(index: int) -> bool:
+            return bool(list_models("gpt", limit=20))
+
+    async def send(index: int) -> bool:
+        return await asyncio.to_thread(call, index)
+    return send
+
+
+def server_arguments(tool: str, index: int, files: List[str]) -> Dict[str, Any]:
+    """
+    Return the arguments of one benchmark request to the server tool.
+
+    Args:
+        tool: One of TOOLS
+        index: Number of the request
+        files: Files created by ``prepare_workdir``
+
+    Returns:
+        The tool arguments
+    """
+    if tool == "ai_code":
+        name = files[index % len(files)]
+        return {"ai_coding_prompt": edit_prompt(name), "relative_editable_files": [name]}
+    if tool == "ask_question":
+        return {"prompt": f"Benchmark question {index}", "use_cache": False}
+    return {"substring": "gpt", "limit": 20}
+
+
+def server_succeeded(tool: str, result: Any) -> bool:
+    """Tell whether a server tool call result counts as a success."""
+    if result.isError or not result.content:
+        return False
+    if tool != "ai_code":
+        return True
+    try:
+        return json.loads(result.content[0].text).get("status") == "success"
+    except (ValueError, AttributeError):
+        return False
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def server_session(mode: str, workdir: str, env: Dict[str, str], server_args: List[str]):
+    """
+    Start a server subprocess and connect an MCP client session to it.
+
+    Args:
+        mode: "stdio" or "sse"
+        workdir: The server's working directory
+        env: Extra environment of the server
+        server_args: Extra command line arguments of the server
+
+    Yields:
+        The initialized ClientSession and the server's process id (None when unknown)
+    """
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.sse import sse_client
+    from mcp.client.stdio import stdio_client
+
+    command = [sys.executable, "-m", "aider_mcp_server", "--cwd", workdir,
+               "--editor-model", BENCHMARK_MODEL, *server_args]
+    server_env = {**os.environ, **env, "TRANSPORT": mode}
+
+    if mode == "stdio":
+        params = StdioServerParameters(command=command[0], args=command[1:], env=server_env)
+        with open(os.devnull, "w") as errlog:
+            async with stdio_client(params, errlog=errlog) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    yield session, None
+        return
+
+    port = _free_port()
+    server_env.update({"HOST": "127.0.0.1", "PORT": str(port)})
+    process = subprocess.Popen(command, env=server_env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=1):
+                    break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("The benchmark server did not start")
+                await asyncio.sleep(0.1)
+        async with sse_client(f"http://127.0.0.1:{port}/sse") as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                yield session, process.pid
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def run_benchmarks(modes: List[str], tools: List[str], concurrencies: List[int],
+                         requests: int, warmup: int = 1, latency: float = 0.0,
+                         chunk_delay: float = 0.0,
+                         server_args: Optional[List[str]] = None) -> List[BenchmarkResult]:
+    """
+    Run every combination of mode, tool and concurrency against a fresh mock LLM.
+
+    Args:
+        modes: Modes from MODES
+        tools: Tools from TOOLS
+        concurrencies: Concurrency levels
+        requests: Requests per run
+        warmup: Untimed requests sent before the first run of each mode and tool
+        latency: Seconds the mock LLM waits before answering
+        chunk_delay: Seconds between the chunks of a streamed answer
+        server_args: Extra command line arguments of the server subprocesses
+
+    Returns:
+        One BenchmarkResult per run
+    """
+    results = []
+    workdir = tempfile.mkdtemp(prefix="aider-mcp-bench-")
+    files = prepare_workdir(workdir, max(concurrencies))
+    with MockLLMServer(latency=latency, chunk_delay=chunk_delay) as llm:
+        env = benchmark_env(llm.base_url)
+        saved = {key: os.environ.get(key) for key in env}
+        os.environ.update(env)
+        try:
+            for mode in modes:
+                if mode == "direct":
+                    results += await _run_direct(tools, concurrencies, requests, warmup, workdir, files)
+                else:
+                    results += await _run_server(mode, tools, concurrencies, requests, warmup,
+                                                 workdir, files, env, server_args or [])
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+async def _run_direct(tools, concurrencies, requests, warmup, workdir, files):
+    results = []
+    for tool in tools:
+        send = direct_request(tool, workdir, files)
+        # Aider prints its chat to stdout; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            for index in range(warmup):
+                await send(index)
+            for concurrency in concurrencies:
+                measured = await measure(send, requests, concurrency, process_tree_rss)
+                results.append(BenchmarkResult("direct", tool, concurrency, **measured))
+    return results
+
+
+async def _run_server(mode, tools, concurrencies, requests, warmup, workdir, files, env, server_args):
+    results = []
+    async with server_session(mode, workdir, env, server_args) as (session, pid):
+        # The stdio server is a child of this process, so its memory is in our tree
+        rss = (lambda: process_tree_rss(pid)) if pid else process_tree_rss
+        for tool in tools:
+            async def send(index: int, tool=tool) -> bool:
+                result = await session.call_tool(SERVER_TOOLS[tool], server_arguments(tool, index, files))
+                return server_succeeded(tool, result)
+
+            for index in range(warmup):
+                await send(index)
+            for concurrency in concurrencies:
+                measured = await measure(send, requests, concurrency, rss)
+                results.append(BenchmarkResult(mode, tool, concurrency, **measured))
+    return results
+
+
+def format_results(results: List[BenchmarkResult]) -> str:
+    """
+    Format benchmark results as a table.
+
+    Args:
+        results: The results to show
+
+    Returns:
+        The table, one line per run
+    """
+    header = f"{'mode':<7} {'tool':<13} {'conc':>4} {'reqs':>5} {'errs':>4} " \
+             f"{'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'rss MiB':>8} {'KiB/req':>8}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        rss = f"{r.rss_mib:.1f}" if r.rss_mib is not None else "-"
+        growth = f"{r.rss_per_request_kib:.1f}" if r.rss_per_request_kib is not None else "-"
+        lines.append(
+            f"{r.mode:<7} {r.tool:<13} {r.concurrency:>4} {r.requests:>5} {r.errors:>4} "
+            f"{r.throughput:>8.2f} {r.p50_ms:>9.1f} {r.p99_ms:>9.1f} {rss:>8} {growth:>8}"
+        )
+    return "\n".join(lines)
+
+
+def results_json(results: List[BenchmarkResult]) -> str:
+    """Serialize benchmark results as a JSON list."""
+    return json.dumps([asdict(result) for result in results], indent=2)
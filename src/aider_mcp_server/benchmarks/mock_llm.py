@@ -0,0 +1,213 @@
+"""
+Local OpenAI-compatible server returning canned completions.
+
+The benchmark points Aider, litellm and the OpenAI client at this server so
+that every request is answered offline after a configurable delay. A prompt
+containing ``[[edit:PATH]]`` is answered with a SEARCH/REPLACE block that
+appends a line to PATH, so ``ai_code`` sessions apply a real edit; any other
+prompt gets a short canned answer. Both streamed and plain completions are
+supported, with usage reported so token accounting runs as it would against
+a real provider.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+EDIT_MARKER = re.compile(r"\[\[edit:([^\]\s]+)\]\]")
+ANSWER = "This is a canned answer from the benchmark LLM."
+
+
+def edit_prompt(path: str) -> str:
+    """
+    Build an ai_code prompt the mock LLM answers with an edit of ``path``.
+
+    Args:
+        path: The file to edit, as Aider names it in the chat
+
+    Returns:
+        The prompt
+    """
+    return f"Append a benchmark marker to the file. [[edit:{path}]]"
+
+
+def canned_reply(messages: List[Dict[str, Any]]) -> str:
+    """
+    Choose the reply to a chat request.
+
+    Args:
+        messages: The request's chat messages
+
+    Returns:
+        An edit block when the last user message asks for one, otherwise a canned answer
+    """
+    for message in reversed(messages):
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        match = EDIT_MARKER.search(content or "")
+        if match is None:
+            break
+        path = match.group(1)
+        return (
+            f"{path}\n```python\n<<<<<<< SEARCH\n=======\n"
+            f"# edited by the benchmark\n>>>>>>> REPLACE\n```\n"
+        )
+    return ANSWER
+
+
+def _chunks(text: str, count: int) -> List[str]:
+    size = max(1, -(-len(text) // max(1, count)))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class MockLLMServer:
+    """An OpenAI-compatible chat completions endpoint served from a background thread."""
+
+    def __init__(self, latency: float = 0.0, chunk_delay: float = 0.0, chunks: int = 8,
+                 host: str = "127.0.0.1", port: int = 0):
+        """
+        Create the server without starting it.
+
+        Args:
+            latency: Seconds before the first byte of each completion
+            chunk_delay: Seconds between the chunks of a streamed completion
+            chunks: Number of chunks a streamed completion is split into
+            host: Interface to listen on
+            port: Port to listen on (any free port when 0)
+        """
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """The OpenAI base URL of the server, ending in ``/v1``."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        """Start serving in a daemon thread and return the server."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json({"object": "list", "data": [
+                        {"id": "gpt-4o", "object": "model", "owned_by": "benchmark"}
+                    ]})
+                else:
+                    self._send_json({"error": {"message": "Not found"}}, status=404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json({"error": {"message": "Invalid JSON"}}, status=400)
+                    return
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json({"error": {"message": "Not found"}}, status=404)
+                    return
+                with server._lock:
+                    server.requests += 1
+
+                messages = request.get("messages") or []
+                reply = canned_reply(messages)
+                model = request.get("model", "gpt-4o")
+                prompt_chars = sum(len(json.dumps(m.get("content", ""))) for m in messages)
+                usage = {
+                    "prompt_tokens": max(1, prompt_chars // 4),
+                    "completion_tokens": max(1, len(reply) // 4),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                time.sleep(server.latency)
+                if request.get("stream"):
+                    self._stream(model, reply, usage)
+                else:
+                    self._send_json({
+                        "id": f"chatcmpl-{uuid.uuid4().hex}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": reply},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": usage,
+                    })
+
+            def _send_json(self, body: Dict[str, Any], status: int = 200) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, model: str, reply: str, usage: Dict[str, int]) -> None:
+                # Without a length the end of the stream is the end of the connection
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+                def event(delta: Dict[str, Any], finish_reason: Optional[str] = None,
+                          usage: Optional[Dict[str, int]] = None) -> None:
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    }
+                    if usage is not None:
+                        chunk["usage"] = usage
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+
+                event({"role": "assistant", "content": ""})
+                for index, text in enumerate(_chunks(reply, server.chunks)):
+                    if index and server.chunk_delay:
+                        time.sleep(server.chunk_delay)
+                    event({"content": text})
+                event({}, finish_reason="stop", usage=usage)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
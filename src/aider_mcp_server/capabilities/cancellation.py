@@ -0,0 +1,220 @@
+"""
+Cancellation and deadlines for Aider sessions.
+
+A ``CancelToken`` is activated on the worker thread running a session. The
+hooks installed here check it before every LLM call and edit application,
+and between the chunks of a streamed response, and raise ``SessionCancelled``
+once the token is cancelled or its deadline has passed. Cancelling a token
+also closes the response being streamed, so its connection is released
+without waiting for the next chunk.
+
+A token passed to a worker process is copied along with the session. The
+copy keeps the deadline, and ``cancel_received`` cancels it when the pool
+forwards a cancellation from the server.
+
+``SessionCancelled`` derives from BaseException, like KeyboardInterrupt, so
+that Aider's broad ``except Exception`` handlers around the LLM call let it
+through instead of reporting it and carrying on.
+"""
+
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from collections.abc import Iterator
+from typing import Any, Optional
+
+from aider.coders import Coder
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+# Tokens copied into this process, by id, while their session holds them
+_received: "weakref.WeakValueDictionary[str, CancelToken]" = weakref.WeakValueDictionary()
+
+
+class SessionCancelled(BaseException):
+    """Raised inside a session whose token was cancelled or timed out."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """
+    Cancellation flag and optional deadline shared between the event loop and a worker.
+
+    ``cancel`` may be called from any thread.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        Create the token.
+
+        Args:
+            timeout: Seconds from now after which the session times out (no deadline when None)
+        """
+        self.id = uuid.uuid4().hex
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stream: Any = None
+
+    def __getstate__(self) -> dict:
+        # The monotonic clock is shared by the processes of one machine
+        with self._lock:
+            return {"id": self.id, "deadline": self.deadline, "reason": self.reason}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._stream = None
+        _received[self.id] = self
+
+    @property
+    def cancelled(self) -> bool:
+        """True once the token was cancelled or its deadline passed."""
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("timeout")
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, or None without one."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """
+        Cancel the session and abort the response it is streaming, if any.
+
+        Args:
+            reason: "cancelled" or "timeout"; the first reason given is kept
+        """
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+            stream, self._stream = self._stream, None
+        _close_stream(stream)
+
+    def check(self) -> None:
+        """Raise SessionCancelled if the session should stop."""
+        if self.cancelled:
+            raise SessionCancelled(self.reason)
+
+    @contextmanager
+    def activate(self) -> Iterator["CancelToken"]:
+        """Make this the token checked by every Coder used on this thread inside the block."""
+        _install_hooks()
+        previous = getattr(_local, "token", None)
+        _local.token = self
+        try:
+            yield self
+        finally:
+            _local.token = previous
+
+    def _track_stream(self, stream: Any) -> None:
+        with self._lock:
+            self._stream = stream
+            cancelled = self.reason is not None
+        if cancelled:
+            _close_stream(stream)
+
+    def _untrack_stream(self, stream: Any) -> None:
+        with self._lock:
+            if self._stream is stream:
+                self._stream = None
+
+
+def cancel_received(token_id: str, reason: str = "cancelled") -> bool:
+    """
+    Cancel the copy of a token that was passed to this process.
+
+    Args:
+        token_id: The token's id
+        reason: "cancelled" or "timeout"
+
+    Returns:
+        True if the token was found, False if its session already finished or never arrived
+    """
+    token = _received.get(token_id)
+    if token is None:
+        return False
+    token.cancel(reason)
+    return True
+
+
+def current_token() -> Optional[CancelToken]:
+    """Return the CancelToken active on this thread, if any."""
+    return getattr(_local, "token", None)
+
+
+def _close_stream(stream: Any) -> None:
+    if stream is None:
+        return
+    # litellm wraps the provider's stream, which owns the HTTP response
+    for target in (getattr(stream, "completion_stream", None), stream):
+        close = getattr(target, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+            return
+
+
+def _install_hooks() -> None:
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        # Patched before the flag is set, so a session starting meanwhile
+        # waits for the hooks rather than running without them
+        _patch_coder()
+        _installed = True
+
+
+def _patch_coder() -> None:
+    original_send = Coder.send
+    original_stream = Coder.show_send_output_stream
+    original_apply = Coder.apply_updates
+
+    def send(self, *args, **kwargs):
+        token = current_token()
+        if token is not None:
+            token.check()
+        return (yield from original_send(self, *args, **kwargs))
+
+    def checked_chunks(token: CancelToken, completion):
+        token._track_stream(completion)
+        try:
+            for chunk in completion:
+                token.check()
+                yield chunk
+        except SessionCancelled:
+            _close_stream(completion)
+            raise
+        except Exception:
+            # Closing the stream from another thread makes the read fail
+            token.check()
+            raise
+        finally:
+            token._untrack_stream(completion)
+
+    def show_send_output_stream(self, completion):
+        token = current_token()
+        if token is not None:
+            completion = checked_chunks(token, completion)
+        return original_stream(self, completion)
+
+    def apply_updates(self):
+        token = current_token()
+        if token is not None:
+            token.check()
+        return original_apply(self)
+
+    Coder.send = send
+    Coder.show_send_output_stream = show_send_output_stream
+    Coder.apply_updates = apply_updates
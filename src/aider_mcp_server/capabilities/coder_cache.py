@@ -0,0 +1,267 @@
+"""
+Warm caches of Aider Model and Coder objects.
+
+Building an ``aider.models.Model`` looks up model metadata and settings, and
+``Coder.create`` sets up the repo map and, with git enabled, scans the
+repository. Both are reused across requests with the same configuration so
+that small edits are not dominated by setup cost.
+
+Aider is only imported for type checking here, so that the server can size
+the caches at startup without paying for Aider's import.
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Hashable, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    from aider.coders import Coder
+    from aider.io import InputOutput
+
+# Default number of cached Model objects and idle Coder objects
+DEFAULT_MODEL_CACHE_SIZE = 8
+DEFAULT_CODER_POOL_SIZE = 8
+
+
+class CoderKey(NamedTuple):
+    """Everything fixed when a Coder is constructed, identifying interchangeable Coders."""
+    model: str
+    editor_model: Optional[str]
+    edit_format: Optional[str]
+    # The session's resolved working directory
+    cwd: str
+    use_git: bool
+    auto_commits: bool
+    suggest_shell_commands: bool
+    detect_urls: bool
+    tag_index: bool
+    cache_prompts: bool
+    model_extra_params: str
+
+
+class LRUCache:
+    """A small thread-safe LRU cache."""
+
+    def __init__(self, max_size: int):
+        """
+        Create the cache.
+
+        Args:
+            max_size: Maximum number of entries kept; 0 disables caching
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for ``key``, creating it with ``factory`` on a miss.
+
+        The factory runs outside the lock so that slow construction of one
+        entry does not block lookups of others.
+        """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        value = factory()
+
+        with self._lock:
+            if self.max_size > 0:
+                # Another thread may have raced us; keep the first value stored
+                value = self._entries.setdefault(key, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+class CoderPool:
+    """
+    Pool of idle Coder objects keyed by their configuration.
+
+    A Coder is checked out with ``acquire`` so that only one request uses it at
+    a time, and returned with ``release`` once the request finishes. The least
+    recently released Coders are evicted when the pool is full.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Create the pool.
+
+        Args:
+            max_size: Maximum number of idle Coders kept; 0 disables pooling
+        """
+        self.max_size = max_size
+        self._idle: "OrderedDict[Tuple[Hashable, int], Coder]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def acquire(self, key: Hashable) -> Optional["Coder"]:
+        """Check out the most recently released idle Coder for ``key``, if any."""
+        with self._lock:
+            for entry in reversed(self._idle):
+                if entry[0] == key:
+                    self.hits += 1
+                    return self._idle.pop(entry)
+            self.misses += 1
+        return None
+
+    def release(self, key: Hashable, coder: "Coder") -> None:
+        """Return ``coder`` to the pool so a later request with ``key`` can reuse it."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._idle[(key, id(coder))] = coder
+            while len(self._idle) > self.max_size:
+                self._idle.popitem(last=False)
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Drop the idle Coders whose key matches ``predicate``.
+
+        Returns:
+            The number of Coders dropped
+        """
+        with self._lock:
+            entries = [entry for entry in self._idle if predicate(entry[0])]
+            for entry in entries:
+                del self._idle[entry]
+        return len(entries)
+
+    def clear(self) -> None:
+        """Drop every idle Coder."""
+        with self._lock:
+            self._idle.clear()
+
+
+# Warm caches shared by every session in this process
+model_cache = LRUCache(DEFAULT_MODEL_CACHE_SIZE)
+coder_pool = CoderPool(DEFAULT_CODER_POOL_SIZE)
+
+
+def configure_coder_cache(model_cache_size: int, coder_pool_size: int) -> None:
+    """
+    Resize the warm Model cache and Coder pool.
+
+    Args:
+        model_cache_size: Maximum number of cached Model objects
+        coder_pool_size: Maximum number of idle Coder objects kept for reuse
+    """
+    model_cache.max_size = model_cache_size
+    coder_pool.max_size = coder_pool_size
+    if model_cache_size <= 0:
+        model_cache.clear()
+    if coder_pool_size <= 0:
+        coder_pool.clear()
+
+
+def reset_coder(coder: "Coder", io: "InputOutput", fnames: List[str],
+                read_only_fnames: Optional[List[str]] = None) -> "Coder":
+    """
+    Clear a Coder's per-request state and point it at a new set of files.
+
+    The model, repo, repo map and linter are kept; chat history and its
+    summary, edit and commit tracking, reflections, lint and test outcomes,
+    suggested shell commands, ignored mentions, cost counters and the file
+    lists are reset.
+
+    Args:
+        coder: The Coder to reset
+        io: The InputOutput to use for the next request
+        fnames: Absolute paths of the files the next request may edit
+        read_only_fnames: Absolute paths of the files the next request only reads
+
+    Returns:
+        The reset Coder
+    """
+    from aider import utils
+
+    coder.io = io
+    coder.pretty = io.pretty
+    coder.commands.io = io
+    if coder.repo:
+        coder.repo.io = io
+    if getattr(coder, "repo_map", None):
+        coder.repo_map.io = io
+
+    coder.cur_messages = []
+    coder.done_messages = []
+    # A summary still being made of the previous history is never merged back
+    coder.summarizer_thread = None
+    coder.summarizing_messages = None
+    coder.summarized_done_messages = []
+    coder.aider_commit_hashes = set()
+    coder.last_aider_commit_hash = None
+    coder.last_aider_commit_message = None
+    coder.commit_before_message = []
+    coder.need_commit_before_edits = set()
+    coder.rejected_urls = set()
+    coder.chat_completion_call_hashes = []
+    coder.chat_completion_response_hashes = []
+    coder.partial_response_content = ""
+    coder.partial_response_function_call = dict()
+    coder.multi_response_content = ""
+    coder.got_reasoning_content = False
+    coder.ended_reasoning_content = False
+    coder.usage_report = None
+    coder.total_cost = 0.0
+    coder.message_cost = 0.0
+    coder.message_tokens_sent = 0
+    coder.message_tokens_received = 0
+    coder.num_exhausted_context_windows = 0
+    coder.num_malformed_responses = 0
+    coder.num_reflections = 0
+    coder.reflected_message = None
+    coder.lint_outcome = None
+    coder.test_outcome = None
+    coder.shell_commands = []
+    coder.ignore_mentions = set()
+    coder.aider_edited_files = set()
+
+    coder.abs_fnames = set()
+    for fname in fnames:
+        path = Path(fname)
+        if not path.exists() and not utils.touch_file(path):
+            io.tool_warning(f"Can not create {fname}, skipping.")
+            continue
+        if not path.is_file():
+            io.tool_warning(f"Skipping {fname} that is not a normal file.")
+            continue
+        coder.abs_fnames.add(str(path.resolve()))
+
+    if not coder.repo:
+        # Without git the root is derived from the edited files
+        coder.root = utils.find_common_root(coder.abs_fnames)
+        coder.linter.root = coder.root
+        coder.abs_root_path_cache = {}
+
+    coder.abs_read_only_fnames = set()
+    for fname in read_only_fnames or []:
+        abs_fname = coder.abs_root_path(fname)
+        if Path(abs_fname).exists():
+            coder.abs_read_only_fnames.add(abs_fname)
+        else:
+            io.tool_warning(f"Error: Read-only file {fname} does not exist. Skipping.")
+
+    return coder
@@ -0,0 +1,330 @@
+"""
+Fitting the read-only files of a session into a context budget.
+
+Aider sends every read-only file in full, however large the files are
+compared with the model's context window. Before a session starts, the
+planner counts the tokens of the prompt, the editable files and the
+read-only files. If they exceed the budget, the read-only files are ranked
+by how relevant they look to the prompt. The most relevant ones are kept
+while they fit, and the rest are sent as outlines of their definitions, in
+the repo map's format, or left out.
+
+Token counts use the model's tokenizer and are cached per file, by size
+and modification time, until the file changes. Files are read through the
+session's snapshots, so the planner and Aider share one read of each file.
+"""
+
+import math
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from aider_mcp_server.capabilities import metrics
+
+# Share of the model's input window the prompt and files may fill by default;
+# the rest is left for Aider's system prompt, examples, repo map and reply
+DEFAULT_WINDOW_SHARE = 0.75
+# Files whose token counts are kept in memory
+FILE_CACHE_SIZE = 4096
+# Relevance of a file whose path or name appears in the prompt
+PATH_MENTION_SCORE = 100.0
+# Relevance of each prompt word found in a file's path
+PATH_TERM_SCORE = 5.0
+# Relevance of a file defining or using every word of the prompt
+CONTENT_SCORE = 10.0
+# Words too common in prompts to say anything about a file
+STOP_WORDS = frozenset("""
+    the and for with that this from into than then them they there these those when where which
+    while what will would should could can not are was were has have had its use used using make
+    add added update change fix file files code function functions class method new all any each
+    only also more most some such like just please sure need needs want
+""".split())
+
+
+@dataclass
+class FileBudget:
+    """What the plan does with one read-only file."""
+    file: str
+    tokens: int
+    action: str = "full"
+    sent_tokens: int = 0
+    score: float = 0.0
+
+
+@dataclass
+class ContextPlan:
+    """Which read-only files a session sends in full, as outlines or not at all."""
+    budget: int
+    available: int
+    files: List[FileBudget] = field(default_factory=list)
+    outlines: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def kept(self) -> List[str]:
+        """Relative paths of the files sent in full or as outlines, in their original order."""
+        return [entry.file for entry in self.files if entry.action != "dropped"]
+
+    @property
+    def trimmed(self) -> List[FileBudget]:
+        """The files sent as outlines or left out."""
+        return [entry for entry in self.files if entry.action != "full"]
+
+    @property
+    def readonly_tokens(self) -> int:
+        """Tokens of the read-only files in full."""
+        return sum(entry.tokens for entry in self.files)
+
+    @property
+    def sent_tokens(self) -> int:
+        """Tokens of the read-only context that is sent."""
+        return sum(entry.sent_tokens for entry in self.files)
+
+    def warning(self) -> Optional[str]:
+        """Describe the trimmed files for the user, or return None when nothing was trimmed."""
+        trimmed = self.trimmed
+        if not trimmed:
+            return None
+        files = ", ".join(f"{entry.file} ({entry.action})" for entry in trimmed)
+        return (
+            f"Trimmed {len(trimmed)} read-only files to fit the context budget of "
+            f"{self.budget} tokens: {files}. Set \"context_budget\" to 0 to send them in full."
+        )
+
+
+def read_file(path: str) -> Optional[str]:
+    """
+    Read a file's text, or return None when it cannot be read.
+
+    Args:
+        path: The file
+    """
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _terms(text: str) -> FrozenSet[str]:
+    """Return the lowercased words of the identifiers in ``text``, and the identifiers themselves."""
+    terms = set()
+    for identifier in set(re.findall(r"[A-Za-z_][A-Za-z0-9_]*", text)):
+        words = re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+", identifier)
+        for term in [identifier] + words:
+            term = term.lower()
+            if len(term) > 2 and term not in STOP_WORDS:
+                terms.add(term)
+    return frozenset(terms)
+
+
+class FileCache:
+    """Token counts of recently planned files, by model and path, until the files change."""
+
+    def __init__(self, max_entries: int = FILE_CACHE_SIZE):
+        """
+        Create an empty cache.
+
+        Args:
+            max_entries: Files kept; the least recently used are evicted
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def tokens(self, model, path: str, read: Callable[[str], Optional[str]] = read_file) -> Optional[int]:
+        """
+        Return a file's token count, reading and counting it again only when it changed.
+
+        Args:
+            model: The Aider Model whose tokenizer counts the file
+            path: The file
+            read: Returns the file's text, or None when it cannot be read
+
+        Returns:
+            The token count, or None when the file cannot be read
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_size, stat.st_mtime_ns)
+        key = (model.name, os.path.abspath(path))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        text = read(path)
+        if text is None:
+            return None
+        tokens = model.token_count(text) or 0
+        with self._lock:
+            self._entries[key] = (signature, tokens)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return tokens
+
+
+file_cache = FileCache()
+
+
+def outline(path: str, rel_path: str, text: str) -> Optional[str]:
+    """
+    Render the definitions of a source file the way the repo map shows them.
+
+    Args:
+        path: The file's path, which selects the language
+        rel_path: The path shown for the file
+        text: The file's content
+
+    Returns:
+        The outline, or None when the language is not supported or nothing is defined
+    """
+    from aider.repomap import USING_TSL_PACK, get_scm_fname
+    from grep_ast import TreeContext, filename_to_lang
+    from grep_ast.tsl import get_language, get_parser
+
+    lang = filename_to_lang(path)
+    if not lang:
+        return None
+    try:
+        language = get_language(lang)
+        parser = get_parser(lang)
+        query_scm = get_scm_fname(lang)
+        if not query_scm.exists():
+            return None
+        tree = parser.parse(bytes(text, "utf-8"))
+        captures = language.query(query_scm.read_text()).captures(tree.root_node)
+    except Exception as e:
+        print(f"Error outlining {rel_path}: {str(e)}", file=sys.stderr)
+        return None
+    if USING_TSL_PACK:
+        nodes = [(node, tag) for tag, tagged in captures.items() for node in tagged]
+    else:
+        nodes = list(captures)
+    lines = {node.start_point[0] for node, tag in nodes if tag.startswith("name.definition.")}
+    if not lines:
+        return None
+    if not text.endswith("\n"):
+        text += "\n"
+    context = TreeContext(
+        rel_path,
+        text,
+        color=False,
+        line_number=False,
+        child_context=False,
+        last_line=False,
+        margin=0,
+        mark_lois=False,
+        loi_pad=0,
+        show_top_of_file_parent_scope=False,
+    )
+    context.add_lines_of_interest(lines)
+    context.add_context()
+    return context.format()
+
+
+def relevance(prompt: str, prompt_terms: FrozenSet[str], rel_path: str, text: str) -> float:
+    """
+    Score how relevant a file looks to a prompt.
+
+    Args:
+        prompt: The prompt
+        prompt_terms: The prompt's terms, from ``_terms``
+        rel_path: The file's relative path
+        text: The file's content
+
+    Returns:
+        The score; higher is more relevant
+    """
+    score = 0.0
+    if rel_path in prompt or os.path.basename(rel_path) in prompt:
+        score += PATH_MENTION_SCORE
+    score += PATH_TERM_SCORE * len(prompt_terms & _terms(rel_path))
+    if prompt_terms:
+        score += CONTENT_SCORE * len(prompt_terms & _terms(text)) / math.sqrt(len(prompt_terms))
+    return score
+
+
+def plan_context(model, prompt: str, editable: Dict[str, str], readonly: Dict[str, str],
+                 budget: Optional[int] = None,
+                 read: Callable[[str], Optional[str]] = read_file) -> Optional[ContextPlan]:
+    """
+    Decide which read-only files to send in full, as outlines or not at all.
+
+    Args:
+        model: The Aider Model the session sends its requests to
+        prompt: The session's prompt
+        editable: Mapping of relative path to absolute path of the editable files
+        readonly: Mapping of relative path to absolute path of the read-only files
+        budget: Tokens the prompt and all files may take (a share of the
+            model's input window when None, no limit when 0)
+        read: Returns a file's text, or None when it cannot be read; the
+            files are only read when their token counts are not cached, or
+            to rank them when they do not fit
+
+    Returns:
+        The plan, or None when there is nothing to plan or no budget is known
+    """
+    if budget is None:
+        window = (getattr(model, "info", None) or {}).get("max_input_tokens")
+        budget = int(window * DEFAULT_WINDOW_SHARE) if window else 0
+    if not budget or not readonly:
+        return None
+    fixed = model.token_count(prompt) or 0
+    for abs_path in editable.values():
+        fixed += file_cache.tokens(model, abs_path, read) or 0
+    plan = ContextPlan(budget=budget, available=max(0, budget - fixed))
+
+    for rel_path, abs_path in readonly.items():
+        # Aider reports missing files itself
+        tokens = file_cache.tokens(model, abs_path, read)
+        plan.files.append(FileBudget(rel_path, tokens or 0, sent_tokens=tokens or 0))
+    if plan.readonly_tokens <= plan.available:
+        return plan
+
+    prompt_terms = _terms(prompt)
+    texts = {}
+    for entry in plan.files:
+        text = read(readonly[entry.file]) if entry.tokens else None
+        if text is not None:
+            texts[entry.file] = text
+    ranked = [entry for entry in plan.files if entry.file in texts]
+    for entry in ranked:
+        entry.score = relevance(prompt, prompt_terms, entry.file, texts[entry.file])
+    ranked.sort(key=lambda entry: (-entry.score, entry.tokens))
+
+    # The most relevant files are kept whole while they fit; the others
+    # then share what is left as outlines
+    remaining = plan.available
+    for entry in ranked:
+        if entry.tokens <= remaining:
+            remaining -= entry.tokens
+        else:
+            entry.action = "dropped"
+            entry.sent_tokens = 0
+    for entry in ranked:
+        if entry.action != "dropped":
+            continue
+        text = outline(readonly[entry.file], entry.file, texts[entry.file])
+        tokens = (model.token_count(text) or 0) if text else None
+        if tokens is not None and tokens <= remaining:
+            remaining -= tokens
+            entry.action = "outline"
+            entry.sent_tokens = tokens
+            plan.outlines[readonly[entry.file]] = text
+        metrics.context_trimmed.inc(action=entry.action)
+    return plan
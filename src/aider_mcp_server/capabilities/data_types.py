@@ -15,4 +15,80 @@ class AICodeParams(BaseModel):
     editable_context: List[str]
     readonly_context: List[str] = []
     settings: Optional[Dict] = None
-    use_git: bool = True
\ No newline at end of file
+    use_git: bool = True
+    current_working_dir: str = "."
+
+
+class AICodeTask(BaseModel):
+    """A single task of a batch AI coding request."""
+    ai_coding_prompt: str
+    relative_editable_files: List[str]
+    relative_readonly_files: Optional[List[str]] = None
+    settings: Optional[Dict] = None
+
+
+class AICodeUsage(BaseModel):
+    """Token usage and cost of an AI coding session."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    thinking_tokens: int = 0
+    cache_hit_tokens: int = 0
+    cache_write_tokens: int = 0
+    cost: float = 0.0
+    llm_calls: int = 0
+
+
+class AICodeTimings(BaseModel):
+    """Wall-clock time spent in each phase of an AI coding session, in seconds."""
+    setup_seconds: float = 0.0
+    llm_seconds: float = 0.0
+    apply_seconds: float = 0.0
+    total_seconds: float = 0.0
+
+
+class AICodeWorktree(BaseModel):
+    """Where the edits of a session run in worktree mode were published."""
+    branch: str
+    commit: str
+    base_commit: str
+
+
+class AICodeTrimmedFile(BaseModel):
+    """A read-only file sent as an outline or left out to fit the context budget."""
+    file: str
+    action: str
+    tokens: int
+    sent_tokens: int = 0
+
+
+class AICodeContext(BaseModel):
+    """How the read-only files of an AI coding session were fitted into its context budget."""
+    budget: int
+    readonly_tokens: int
+    sent_tokens: int
+    trimmed: List[AICodeTrimmedFile] = []
+
+
+class AICodeRouting(BaseModel):
+    """How an AI coding session was routed between the fast model and the main models."""
+    fast_model: str
+    accepted: bool
+    reason: Optional[str] = None
+    detail: Optional[str] = None
+    fast_seconds: float = 0.0
+    # What the fast model's attempt used; included in the session's usage
+    fast_usage: Optional[AICodeUsage] = None
+
+
+class AICodeResult(BaseModel):
+    """Result of an AI coding session."""
+    status: str
+    modified_files: List[str] = []
+    diffs: Dict[str, str] = {}
+    rolled_back_files: List[str] = []
+    usage: AICodeUsage = AICodeUsage()
+    timings: AICodeTimings = AICodeTimings()
+    worktree: Optional[AICodeWorktree] = None
+    context: Optional[AICodeContext] = None
+    routing: Optional[AICodeRouting] = None
+    error: Optional[str] = None
@@ -0,0 +1,256 @@
+"""
+File locking scheduler for running Aider sessions concurrently.
+
+Each session claims the files it edits (write) and the files it only reads.
+Sessions whose claims do not overlap run in parallel; conflicting sessions run
+one after another in the order they arrived. Git-enabled sessions claim the
+whole repository, since Aider may commit or inspect any file in it.
+
+When several server processes share the files, a granted claim is also held
+as advisory file locks under the repository's ``.aider-mcp/locks`` directory,
+so sessions in different processes exclude each other the same way.
+"""
+
+import asyncio
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from typing import IO, FrozenSet, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Directory under the repository root holding the cross-process lock files
+LOCK_DIR = os.path.join(".aider-mcp", "locks")
+# Bounds in seconds of the wait between attempts to take cross-process locks
+LOCK_RETRY_MIN = 0.01
+LOCK_RETRY_MAX = 0.25
+
+
+def find_repo_root(path: str) -> str:
+    """
+    Find the git repository containing ``path``.
+
+    Args:
+        path: Directory to start searching from
+
+    Returns:
+        The repository root, or the resolved ``path`` if it is not in a git repository
+    """
+    start = os.path.realpath(path)
+    current = start
+    while True:
+        if os.path.exists(os.path.join(current, ".git")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return start
+        current = parent
+
+
+@dataclass(eq=False)
+class FileClaim:
+    """The set of files a single session needs access to."""
+    repo: str
+    writes: FrozenSet[str]
+    reads: FrozenSet[str]
+    repo_lock: bool = False
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def conflicts_with(self, other: "FileClaim") -> bool:
+        """Return True if this claim and ``other`` cannot run at the same time."""
+        if self.repo == other.repo and (self.repo_lock or other.repo_lock):
+            return True
+        if self.writes & (other.writes | other.reads):
+            return True
+        return bool(self.reads & other.writes)
+
+
+class FileLockScheduler:
+    """
+    Grants file claims in FIFO order.
+
+    A claim is granted once no earlier claim, running or still waiting,
+    conflicts with it. Checking waiting claims too keeps conflicting sessions
+    strictly ordered, so a stream of small sessions cannot starve a large one.
+    """
+
+    def __init__(self, cross_process: bool = False):
+        """
+        Create the scheduler.
+
+        Args:
+            cross_process: Also hold granted claims as advisory file locks,
+                for servers running in several processes
+        """
+        self.cross_process = cross_process and fcntl is not None
+        self._claims: List[FileClaim] = []
+
+    @property
+    def active(self) -> int:
+        """Number of claims currently granted."""
+        return sum(1 for claim in self._claims if claim.ready.is_set())
+
+    @property
+    def waiting(self) -> int:
+        """Number of claims waiting on a conflicting claim."""
+        return sum(1 for claim in self._claims if not claim.ready.is_set())
+
+    def make_claim(self, current_working_dir: str, relative_editable_files: List[str],
+                   relative_readonly_files: Optional[List[str]] = None,
+                   use_git: bool = False) -> FileClaim:
+        """
+        Build a claim for an Aider session.
+
+        Args:
+            current_working_dir: Directory the relative paths are resolved against
+            relative_editable_files: Files the session may edit
+            relative_readonly_files: Files the session only reads
+            use_git: Whether the session uses git and needs the whole repository
+
+        Returns:
+            The FileClaim describing the session
+        """
+        def resolve(files: Optional[List[str]]) -> FrozenSet[str]:
+            return frozenset(
+                os.path.realpath(os.path.join(current_working_dir, f)) for f in files or []
+            )
+
+        writes = resolve(relative_editable_files)
+        return FileClaim(
+            repo=find_repo_root(current_working_dir),
+            writes=writes,
+            reads=resolve(relative_readonly_files) - writes,
+            repo_lock=use_git,
+        )
+
+    @asynccontextmanager
+    async def hold(self, claim: FileClaim) -> AsyncIterator[FileClaim]:
+        """
+        Wait until ``claim`` can be granted and hold it for the duration of the block.
+
+        Args:
+            claim: The claim to acquire
+
+        Yields:
+            The granted claim
+        """
+        self._claims.append(claim)
+        self._grant()
+        lock_files: List[IO] = []
+        try:
+            await claim.ready.wait()
+            if self.cross_process:
+                lock_files = await _lock_across_processes(claim)
+            yield claim
+        finally:
+            for lock_file in lock_files:
+                lock_file.close()
+            self._claims.remove(claim)
+            self._grant()
+
+    def lock(self, current_working_dir: str, relative_editable_files: List[str],
+             relative_readonly_files: Optional[List[str]] = None, use_git: bool = False):
+        """
+        Claim the files of an Aider session for the duration of an ``async with`` block.
+
+        Args:
+            current_working_dir: Directory the relative paths are resolved against
+            relative_editable_files: Files the session may edit
+            relative_readonly_files: Files the session only reads
+            use_git: Whether the session uses git and needs the whole repository
+        """
+        claim = self.make_claim(
+            current_working_dir, relative_editable_files, relative_readonly_files, use_git
+        )
+        return self.hold(claim)
+
+    def _grant(self) -> None:
+        for index, claim in enumerate(self._claims):
+            if claim.ready.is_set():
+                continue
+            earlier = self._claims[:index]
+            if not any(claim.conflicts_with(other) for other in earlier):
+                claim.ready.set()
+
+
+def _lock_requests(claim: FileClaim) -> List[Tuple[str, bool]]:
+    """Return the (lock file, exclusive) pairs of a claim, in the order they are taken."""
+    directory = os.path.join(claim.repo, LOCK_DIR)
+
+    def lock_path(path: str) -> str:
+        return os.path.join(directory, hashlib.sha1(path.encode()).hexdigest() + ".lock")
+
+    # The repository lock comes first and the files follow in a fixed order,
+    # so two processes never wait on each other's locks in a cycle
+    requests = [(os.path.join(directory, "repo.lock"), claim.repo_lock)]
+    files = [(lock_path(path), True) for path in claim.writes]
+    files += [(lock_path(path), False) for path in claim.reads]
+    return requests + sorted(files)
+
+
+async def _lock_across_processes(claim: FileClaim) -> List[IO]:
+    """
+    Take the advisory file locks of a granted claim, waiting while another process holds them.
+
+    Locks are taken all at once or not at all, so a waiting claim never
+    blocks other processes' claims.
+
+    Args:
+        claim: The granted claim
+
+    Returns:
+        The open lock files; closing them releases the locks
+    """
+    requests = _lock_requests(claim)
+    os.makedirs(os.path.dirname(requests[0][0]), exist_ok=True)
+    delay = LOCK_RETRY_MIN
+    while True:
+        held: List[IO] = []
+        try:
+            for path, exclusive in requests:
+                lock_file = open(path, "a")
+                held.append(lock_file)
+                mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+                fcntl.flock(lock_file, mode | fcntl.LOCK_NB)
+            return held
+        except BlockingIOError:
+            pass
+        except BaseException:
+            for lock_file in held:
+                lock_file.close()
+            raise
+        for lock_file in held:
+            lock_file.close()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LOCK_RETRY_MAX)
+
+
+def group_claims(claims: List[FileClaim]) -> List[List[int]]:
+    """
+    Partition claims into groups of mutually non-conflicting claims.
+
+    Each claim is placed in the first group after every group holding a
+    claim it conflicts with. Every group can therefore run fully in parallel,
+    and conflicting claims still run in their original order.
+
+    Args:
+        claims: The claims to partition
+
+    Returns:
+        Groups of indexes into ``claims``, in the order they should be started
+    """
+    groups: List[List[int]] = []
+    for index, claim in enumerate(claims):
+        target = 0
+        for position, group in enumerate(groups):
+            if any(claim.conflicts_with(claims[other]) for other in group):
+                target = position + 1
+        if target == len(groups):
+            groups.append([])
+        groups[target].append(index)
+    return groups
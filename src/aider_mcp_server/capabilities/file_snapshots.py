@@ -0,0 +1,409 @@
+"""
+Per-session snapshots of the files an Aider session works on.
+
+``SessionFiles`` reads each editable file once before the session, keeping
+its bytes, stat signature and content hash. While the session runs, the
+hooks installed here answer Aider's repeated ``read_text`` calls for the
+session's editable and read-only files from that one read, as long as the
+file's stat signature is unchanged and Aider has not written it since.
+
+Files outside the editable set that Aider creates or writes, such as new
+files its edits add, are snapshotted just before their first write, so they
+can be restored or removed too.
+
+After the session, a file whose stat signature is unchanged and that Aider
+did not write is known to be unchanged without reading it. Any other file is
+hashed, through a memory map when it is large, and only read again when its
+hash differs; diffs are then built from the two in-memory versions.
+"""
+
+import difflib
+import hashlib
+import mmap
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from collections.abc import Iterator
+from typing import Dict, List, Optional, Set, Tuple
+
+import aider.utils
+from aider.io import InputOutput
+from aider.utils import is_image_file
+
+# Files at least this large are hashed through a memory map
+MMAP_THRESHOLD = 1024 * 1024
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+@dataclass
+class FileState:
+    """A file's content and signature at one point in time."""
+    exists: bool
+    size: int = 0
+    mtime_ns: int = 0
+    digest: str = ""
+    data: Optional[bytes] = None
+
+    @property
+    def signature(self) -> Tuple[bool, int, int]:
+        """What stat() reports about the file."""
+        return (self.exists, self.size, self.mtime_ns)
+
+
+def _signature(path: str) -> Tuple[bool, int, int]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (False, 0, 0)
+    return (True, stat.st_size, stat.st_mtime_ns)
+
+
+def file_digest(path: str) -> Optional[str]:
+    """
+    Hash a file's content, through a memory map when it is large.
+
+    Args:
+        path: The file to hash
+
+    Returns:
+        The hex BLAKE2b digest, or None if the file cannot be read
+    """
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return hashlib.blake2b(mapped).hexdigest()
+            return hashlib.blake2b(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def read_state(path: str) -> FileState:
+    """
+    Read a file once, keeping its content, signature and hash.
+
+    Args:
+        path: The file to read
+
+    Returns:
+        The file's FileState; ``exists`` is False if it cannot be read
+    """
+    try:
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+    except OSError:
+        return FileState(exists=False)
+    return FileState(
+        exists=True,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        digest=hashlib.blake2b(data).hexdigest(),
+        data=data,
+    )
+
+
+def _decode(state: FileState) -> Optional[str]:
+    if not state.exists:
+        return None
+    return state.data.decode("utf-8", errors="replace")
+
+
+def diff_snapshots(before: Dict[str, Optional[str]], after: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """
+    Build unified diffs for the files whose content changed.
+
+    Args:
+        before: Mapping of relative path to content before the session, or None if missing
+        after: Mapping of relative path to content after the session, or None if missing
+
+    Returns:
+        Mapping of relative path to unified diff, for changed files only
+    """
+    diffs = {}
+    for rel_path, new in after.items():
+        old = before.get(rel_path)
+        if old == new:
+            continue
+        diff = difflib.unified_diff(
+            (old or "").splitlines(keepends=True),
+            (new or "").splitlines(keepends=True),
+            fromfile=f"a/{rel_path}" if old is not None else "/dev/null",
+            tofile=f"b/{rel_path}" if new is not None else "/dev/null",
+        )
+        diffs[rel_path] = "".join(diff)
+    return diffs
+
+
+class SessionFiles:
+    """The editable and read-only files of one session."""
+
+    def __init__(self, editable: Dict[str, str], readonly: Optional[Dict[str, str]] = None,
+                 replaced: Optional[Dict[str, str]] = None):
+        """
+        Snapshot the editable files.
+
+        Args:
+            editable: Mapping of relative path to absolute path of the files the session may edit
+            readonly: Mapping of relative path to absolute path of the files it only reads;
+                they are read on Aider's first request for them
+            replaced: Mapping of absolute path to the text Aider is given
+                instead of a read-only file's content, such as its outline
+        """
+        self.editable = dict(editable)
+        self.replaced = {os.path.abspath(path): text for path, text in (replaced or {}).items()}
+        self.before: Dict[str, FileState] = {
+            rel_path: read_state(abs_path) for rel_path, abs_path in self.editable.items()
+        }
+        self._tracked = {
+            os.path.abspath(abs_path) for abs_path in list(self.editable.values()) + list((readonly or {}).values())
+        }
+        self._states: Dict[str, FileState] = {
+            os.path.abspath(self.editable[rel_path]): state for rel_path, state in self.before.items()
+        }
+        self._written: Set[str] = set()
+        self._editable_paths = {os.path.abspath(abs_path) for abs_path in self.editable.values()}
+        # Files outside the editable set, by absolute path, as they were before their first write
+        self.outside: Dict[str, FileState] = {}
+        self._created_dirs: List[str] = []
+        self._lock = threading.Lock()
+        self.reads_served = 0
+
+    @contextmanager
+    def track(self) -> Iterator["SessionFiles"]:
+        """Serve the reads and watch the writes of every InputOutput used on this thread inside the block."""
+        _install_hooks()
+        previous = getattr(_local, "files", None)
+        _local.files = self
+        try:
+            yield self
+        finally:
+            _local.files = previous
+
+    def read_text(self, path: str, encoding: str) -> Optional[str]:
+        """
+        Return a tracked file's text as Aider would read it, or None to let Aider read it.
+
+        Args:
+            path: The file Aider is reading
+            encoding: The InputOutput's encoding
+        """
+        path = os.path.abspath(path)
+        if path in self.replaced:
+            return self.replaced[path]
+        if path not in self._tracked:
+            return None
+        with self._lock:
+            state = self._states.get(path)
+            if path in self._written or state is None or state.signature != _signature(path):
+                state = read_state(path)
+                self._written.discard(path)
+                self._states[path] = state
+            else:
+                self.reads_served += 1
+        if not state.exists:
+            return None
+        try:
+            text = state.data.decode(encoding)
+        except (UnicodeError, LookupError):
+            # Let Aider report the error its own way
+            return None
+        # Text mode reads translate line endings
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+
+    def replace(self, texts: Dict[str, str]) -> None:
+        """
+        Give Aider other text in place of some read-only files' content.
+
+        Args:
+            texts: Mapping of absolute path to the text Aider is given instead,
+                such as the file's outline
+        """
+        self.replaced.update({os.path.abspath(path): text for path, text in texts.items()})
+
+    def writing(self, path: str) -> None:
+        """Snapshot a file Aider is about to create or write, if it is not editable and not yet snapshotted."""
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._editable_paths or path in self.outside:
+                return
+            self.outside[path] = state = read_state(path)
+            if not state.exists:
+                # Remember the directories creating the file will add
+                parent = os.path.dirname(path)
+                while parent and not os.path.exists(parent):
+                    self._created_dirs.append(parent)
+                    parent = os.path.dirname(parent)
+
+    def wrote(self, path: str) -> None:
+        """Record that Aider wrote a file, so its snapshot is no longer current."""
+        with self._lock:
+            self._written.add(os.path.abspath(path))
+
+    def changed(self) -> Dict[str, FileState]:
+        """
+        Find the editable files whose content changed.
+
+        Returns:
+            Mapping of relative path to the new FileState, for changed files only
+        """
+        with self._lock:
+            written = set(self._written)
+        changes = {}
+        for rel_path, abs_path in self.editable.items():
+            before = self.before[rel_path]
+            if os.path.abspath(abs_path) not in written and _signature(abs_path) == before.signature:
+                continue
+            if before.exists and file_digest(abs_path) == before.digest:
+                continue
+            after = read_state(abs_path)
+            if after.exists != before.exists or after.digest != before.digest:
+                changes[rel_path] = after
+        return changes
+
+    def diffs(self, changes: Optional[Dict[str, FileState]] = None) -> Dict[str, str]:
+        """
+        Build unified diffs of the changed editable files.
+
+        Args:
+            changes: Result of ``changed``, computed when not given
+
+        Returns:
+            Mapping of relative path to unified diff, for changed files only
+        """
+        return diff_snapshots(*self.texts(changes))
+
+    def texts(self, changes: Optional[Dict[str, FileState]] = None
+              ) -> Tuple[Dict[str, Optional[str]], Dict[str, Optional[str]]]:
+        """
+        Return the text of the changed editable files before and after the session.
+
+        Args:
+            changes: Result of ``changed``, computed when not given
+
+        Returns:
+            Mappings of relative path to content before and after, or None if missing
+        """
+        if changes is None:
+            changes = self.changed()
+        return (
+            {rel_path: _decode(self.before[rel_path]) for rel_path in changes},
+            {rel_path: _decode(after) for rel_path, after in changes.items()},
+        )
+
+    def restore(self, rel_paths: List[str]) -> List[str]:
+        """
+        Put editable files back to their content before the session, byte for byte.
+
+        Args:
+            rel_paths: Relative paths of the files to restore
+
+        Returns:
+            The relative paths that were restored
+        """
+        restored = []
+        for rel_path in rel_paths:
+            abs_path = self.editable[rel_path]
+            before = self.before[rel_path]
+            try:
+                if not before.exists:
+                    if os.path.exists(abs_path):
+                        os.remove(abs_path)
+                else:
+                    with open(abs_path, "wb") as f:
+                        f.write(before.data)
+                restored.append(rel_path)
+            except OSError as e:
+                print(f"Error restoring {rel_path}: {str(e)}", file=sys.stderr)
+        return restored
+
+    def restore_outside(self) -> List[str]:
+        """
+        Put the files Aider wrote outside the editable set back, removing the ones it created.
+
+        Returns:
+            The absolute paths that were restored or removed
+        """
+        with self._lock:
+            outside = dict(self.outside)
+            created_dirs = list(self._created_dirs)
+        restored = []
+        for path, before in outside.items():
+            try:
+                if not before.exists:
+                    if os.path.exists(path):
+                        os.remove(path)
+                elif _signature(path) != before.signature:
+                    with open(path, "wb") as f:
+                        f.write(before.data)
+                restored.append(path)
+            except OSError as e:
+                print(f"Error restoring {path}: {str(e)}", file=sys.stderr)
+        # Deepest first; directories that are not empty are kept
+        for directory in sorted(created_dirs, key=len, reverse=True):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        return restored
+
+
+def current_files() -> Optional[SessionFiles]:
+    """Return the SessionFiles tracked on this thread, if any."""
+    return getattr(_local, "files", None)
+
+
+def _install_hooks() -> None:
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        _patch_input_output()
+        _patch_touch_file()
+        _installed = True
+
+
+def _patch_input_output() -> None:
+    original_read = InputOutput.read_text
+    original_write = InputOutput.write_text
+
+    def read_text(self, filename, silent=False):
+        files = current_files()
+        if files is not None and not is_image_file(filename):
+            text = files.read_text(str(filename), self.encoding)
+            if text is not None:
+                return text
+        return original_read(self, filename, silent)
+
+    def write_text(self, filename, content, *args, **kwargs):
+        files = current_files()
+        if files is not None:
+            files.writing(str(filename))
+        try:
+            return original_write(self, filename, content, *args, **kwargs)
+        finally:
+            files = current_files()
+            if files is not None:
+                files.wrote(str(filename))
+
+    InputOutput.read_text = read_text
+    InputOutput.write_text = write_text
+
+
+def _patch_touch_file() -> None:
+    # Aider creates the new files its edits add with touch_file, before writing them
+    original_touch = aider.utils.touch_file
+
+    def touch_file(fname):
+        files = current_files()
+        if files is not None:
+            files.writing(str(fname))
+        return original_touch(fname)
+
+    aider.utils.touch_file = touch_file
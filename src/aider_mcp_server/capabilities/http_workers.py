@@ -0,0 +1,326 @@
+"""
+Serving SSE from several worker processes behind one port.
+
+The supervisor binds the listening socket once and starts ``workers``
+processes that each run a complete server on it, so the kernel spreads new
+connections over every process and core. An SSE session lives in the
+process that accepted its stream, but the client's POSTed messages may be
+accepted by any process. Each worker therefore advertises a message path
+holding its own index, listens on a private Unix socket as well, and relays
+messages for another worker's sessions to that worker's socket. A metrics
+scrape is likewise answered by whichever worker accepts it, so that worker
+collects the other workers' metrics over their sockets and serves them all,
+each sample labelled with its worker.
+
+On SIGTERM or SIGINT the supervisor stops its workers with one SIGTERM. The
+workers run in their own process group, so a Ctrl+C in the terminal reaches
+only the supervisor rather than counting as a first signal in every worker.
+Each worker, like a single-process server, stops accepting connections and
+gives running tool requests up to ``drain_timeout`` seconds to finish before
+it closes the SSE streams. A worker that exits on its own is restarted.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple
+
+import uvicorn
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from aider_mcp_server.capabilities import metrics
+
+# Seconds running requests get to finish when the server stops
+DEFAULT_DRAIN_TIMEOUT = 30.0
+# Seconds a worker gets after draining to release its resources and exit
+SHUTDOWN_GRACE = 10.0
+# Prefix of the SSE message paths; a worker's own path adds its index
+MESSAGE_PREFIX = "/messages/"
+# Seconds between checks of the workers' health
+SUPERVISE_INTERVAL = 0.5
+# Seconds between checks for running requests while draining
+DRAIN_POLL_INTERVAL = 0.1
+# Request headers not passed on when relaying a message
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "host", "content-length"}
+# Path serving one worker's own metrics, for the worker answering a scrape
+WORKER_METRICS_PATH = "/metrics/worker"
+
+
+@dataclass
+class HttpWorker:
+    """Identity of one HTTP worker process."""
+    index: int
+    count: int
+    socket_dir: str
+
+    @property
+    def message_path(self) -> str:
+        """Path this worker's SSE sessions POST their messages to."""
+        return f"{MESSAGE_PREFIX}{self.index}/"
+
+    def socket_path(self, index: Optional[int] = None) -> str:
+        """Path of the Unix socket of worker ``index`` (this worker by default)."""
+        return os.path.join(self.socket_dir, f"worker-{self.index if index is None else index}.sock")
+
+
+_current: Optional[HttpWorker] = None
+_listener: Optional[socket.socket] = None
+
+
+def current_worker() -> Optional[HttpWorker]:
+    """Return this process's HttpWorker, or None outside a multi-worker server."""
+    return _current
+
+
+def worker_sockets(worker: HttpWorker) -> List[socket.socket]:
+    """
+    Return the sockets a worker serves on: the shared listener and its private Unix socket.
+
+    Args:
+        worker: The current worker
+    """
+    path = worker.socket_path()
+    if os.path.exists(path):
+        os.remove(path)
+    private = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    private.bind(path)
+    private.listen(128)
+    return [_listener, private]
+
+
+def _worker_clients(worker: HttpWorker) -> Callable[[int], Any]:
+    """Return a function giving the HTTP client of another worker's private socket."""
+    import httpx
+
+    clients = {}
+
+    def client_for(index: int) -> "httpx.AsyncClient":
+        client = clients.get(index)
+        if client is None:
+            transport = httpx.AsyncHTTPTransport(uds=worker.socket_path(index))
+            client = clients[index] = httpx.AsyncClient(transport=transport, base_url="http://worker")
+        return client
+
+    return client_for
+
+
+def message_relay(worker: HttpWorker) -> Callable:
+    """
+    Build the endpoint relaying SSE messages to the worker that owns their session.
+
+    Args:
+        worker: The current worker
+
+    Returns:
+        A Starlette endpoint for the message prefix
+    """
+    import httpx
+
+    client_for = _worker_clients(worker)
+
+    async def relay(request: Request) -> Response:
+        owner = request.url.path[len(MESSAGE_PREFIX):].split("/", 1)[0]
+        if not owner.isdigit() or int(owner) >= worker.count or int(owner) == worker.index:
+            return Response("Could not find session", status_code=404)
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+        try:
+            response = await client_for(int(owner)).request(
+                request.method,
+                request.url.path,
+                params=request.query_params,
+                headers=headers,
+                content=await request.body(),
+            )
+        except httpx.HTTPError as e:
+            print(f"Error relaying to HTTP worker {owner}: {str(e)}", file=sys.stderr)
+            return Response("Session worker unavailable", status_code=503)
+        return Response(response.content, status_code=response.status_code,
+                        media_type=response.headers.get("content-type"))
+
+    return relay
+
+
+def metrics_endpoints(worker: HttpWorker) -> Tuple[Callable, Callable]:
+    """
+    Build the endpoints serving the metrics of every worker.
+
+    Args:
+        worker: The current worker
+
+    Returns:
+        The endpoint for ``/metrics``, which combines the metrics of all
+        workers, and the one for ``WORKER_METRICS_PATH``, which serves this
+        worker's own
+    """
+    import httpx
+
+    client_for = _worker_clients(worker)
+
+    async def fetch(index: int) -> Optional[metrics.Snapshot]:
+        try:
+            response = await client_for(index).get(WORKER_METRICS_PATH)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"Error collecting metrics of HTTP worker {index}: {str(e)}", file=sys.stderr)
+            return None
+
+    async def combined(request: Request) -> Response:
+        others = await asyncio.gather(*(fetch(index) for index in range(worker.count) if index != worker.index))
+        snapshots = [metrics.snapshot(worker=str(worker.index))]
+        snapshots += [snapshot for snapshot in others if snapshot is not None]
+        return Response(metrics.render(snapshots), media_type=metrics.CONTENT_TYPE)
+
+    async def own(request: Request) -> Response:
+        return JSONResponse(metrics.snapshot(worker=str(worker.index)))
+
+    return combined, own
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    Uvicorn server that lets running tool requests finish before shutting down.
+
+    SSE streams are closed as soon as uvicorn starts shutting down, which
+    would drop the responses of running tool calls. On the first SIGTERM or
+    SIGINT this server only stops accepting connections and waits, up to
+    ``drain_timeout`` seconds, for ``in_flight`` to reach zero; then it shuts
+    down. A second signal shuts it down at once.
+    """
+
+    def __init__(self, config: uvicorn.Config, in_flight: Callable[[], int],
+                 drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+                 on_drain: Optional[Callable[[], None]] = None):
+        """
+        Create the server.
+
+        Args:
+            config: The uvicorn configuration
+            in_flight: Returns the number of requests still running
+            drain_timeout: Seconds to wait for running requests
+            on_drain: Called when draining starts, to stop other sources of work
+        """
+        super().__init__(config)
+        self.in_flight = in_flight
+        self.drain_timeout = drain_timeout
+        self.on_drain = on_drain
+        self.draining = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def serve(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        self._loop = asyncio.get_running_loop()
+        await super().serve(sockets=sockets)
+
+    def handle_exit(self, sig: int, frame) -> None:
+        if self.draining or self._loop is None:
+            super().handle_exit(sig, frame)
+            return
+        self.draining = True
+        self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self._drain(sig, frame)))
+
+    async def _drain(self, sig: int, frame) -> None:
+        for server in self.servers:
+            server.close()
+        if self.on_drain is not None:
+            self.on_drain()
+        deadline = self._loop.time() + self.drain_timeout
+        if self.in_flight():
+            print(f"Draining {self.in_flight()} running requests", file=sys.stderr)
+        while self.in_flight() and self._loop.time() < deadline:
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        super().handle_exit(sig, frame)
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(2048)
+    listener.set_inheritable(True)
+    return listener
+
+
+def _worker_main(target: Callable[[], None], worker: HttpWorker, listener: socket.socket) -> None:
+    global _current, _listener
+    _current, _listener = worker, listener
+    # Leave the terminal's process group; the supervisor forwards its signals
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    target()
+
+
+def run_http_workers(target: Callable[[], None], workers: int, host: str, port: int,
+                     drain_timeout: float = DEFAULT_DRAIN_TIMEOUT) -> None:
+    """
+    Run ``target`` in ``workers`` processes sharing one listening socket, until stopped.
+
+    Args:
+        target: Picklable callable running one server; it finds its worker
+            identity and sockets through ``current_worker`` and ``worker_sockets``
+        workers: Number of worker processes
+        host: Interface to listen on
+        port: Port to listen on
+        drain_timeout: Seconds the workers get to drain before they are killed
+    """
+    listener = _bind(host, port)
+    socket_dir = tempfile.mkdtemp(prefix="aider-mcp-http-")
+    # Workers start from a fresh interpreter, not a copy of this process's threads
+    context = multiprocessing.get_context("spawn")
+    processes: List[Optional[multiprocessing.process.BaseProcess]] = [None] * workers
+    stopping = False
+
+    def start(index: int) -> None:
+        process = context.Process(
+            target=_worker_main,
+            args=(target, HttpWorker(index, workers, socket_dir), listener),
+            name=f"aider-mcp-http-{index}",
+        )
+        process.start()
+        processes[index] = process
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        if stopping:
+            # A second signal makes the draining workers shut down at once
+            for process in processes:
+                if process is not None and process.is_alive():
+                    process.terminate()
+        stopping = True
+
+    previous = {sig: signal.signal(sig, stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        for index in range(workers):
+            start(index)
+        print(f"Started {workers} HTTP workers on {host}:{port}", file=sys.stderr)
+        while not stopping:
+            time.sleep(SUPERVISE_INTERVAL)
+            for index, process in enumerate(processes):
+                if not stopping and not process.is_alive():
+                    print(f"HTTP worker {index} exited with code {process.exitcode}, restarting",
+                          file=sys.stderr)
+                    start(index)
+    finally:
+        # Each worker drains its own requests when told to stop
+        for process in processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + drain_timeout + SHUTDOWN_GRACE
+        for process in processes:
+            if process is not None:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        listener.close()
+        shutil.rmtree(socket_dir, ignore_errors=True)
@@ -0,0 +1,445 @@
+"""
+Durable queue of ai_code jobs, persisted in SQLite.
+
+``submit_ai_code`` stores the request as a job and returns at once. A
+``JobRunner`` on the server's event loop claims queued jobs, highest priority
+first and then in submission order, runs them like ai_code requests and
+stores their results for ``get_job_result``. Clients only need a connection
+while they submit or poll.
+
+Jobs survive restarts. A runner holds a lease on every job it runs and
+renews it while the job runs; a job whose lease expires, or whose runner
+process on this host is gone, is queued again, up to ``MAX_ATTEMPTS`` runs.
+When the server shuts down, its running jobs are stopped, their edits rolled
+back, and they are queued again without using up an attempt. Several
+processes may share one database.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+# Default location of the database, relative to the server's working directory
+DEFAULT_JOB_DB = os.path.join(".aider-mcp", "jobs.db")
+# Seconds a claimed job stays reserved without its lease being renewed
+LEASE_SECONDS = 60.0
+# Runs of a job interrupted by crashes before it is marked failed
+MAX_ATTEMPTS = 3
+# Seconds between checks for jobs submitted by other processes and expired leases
+POLL_INTERVAL = 2.0
+# Seconds before a job the worker pool rejected as busy is tried again
+BUSY_RETRY_DELAY = 1.0
+# Seconds finished and failed jobs are kept
+DEFAULT_RETENTION = 7 * 24 * 60 * 60.0
+
+JOB_STATUSES = ("queued", "running", "finished", "failed")
+
+
+class JobError(ValueError):
+    """Raised for unknown job ids."""
+
+
+@dataclass
+class Job:
+    """A stored ai_code job."""
+    id: str
+    status: str
+    priority: int
+    request: Dict[str, Any]
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+    attempts: int
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+    def info(self) -> Dict[str, Any]:
+        """Return the job's status, without its request and result."""
+        info = {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.result is not None:
+            info["result_status"] = self.result.get("status")
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+def _owner() -> str:
+    # The random part tells a restarted server apart from one with a reused pid
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _owner_alive(owner: str) -> bool:
+    # Only processes on this host can be checked; others are trusted to renew
+    host, _, rest = owner.partition(":")
+    pid = rest.partition(":")[0]
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class JobQueue:
+    """
+    SQLite-backed job store.
+
+    The database is created on the first submission, so a server that is
+    never sent a job leaves nothing behind. Methods block on SQLite, which
+    waits up to 10 seconds for a lock held by another process sharing the
+    database, so the event loop calls them with ``asyncio.to_thread``.
+    """
+
+    def __init__(self, path: str, retention: float = DEFAULT_RETENTION):
+        """
+        Create the queue.
+
+        Args:
+            path: Path of the SQLite database
+            retention: Seconds finished and failed jobs are kept
+        """
+        self.path = os.path.abspath(path)
+        self.retention = retention
+        self.owner = _owner()
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self, create: bool = True) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            if not create and not os.path.exists(self.path):
+                return None
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=10.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE, status TEXT, "
+                "priority INTEGER, request TEXT, result TEXT, error TEXT, "
+                "attempts INTEGER DEFAULT 0, owner TEXT, lease_until REAL, "
+                "not_before REAL DEFAULT 0, created_at REAL, started_at REAL, finished_at REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, seq)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def submit(self, request: Dict[str, Any], priority: int = 0) -> Job:
+        """
+        Store a new queued job.
+
+        Args:
+            request: The keyword arguments of the ai_code session
+            priority: Jobs with a higher priority run first
+
+        Returns:
+            The queued Job
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT INTO jobs (id, status, priority, request, created_at) "
+                "VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, priority, json.dumps(request), time.time()),
+            )
+            db.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Job:
+        """
+        Look up a job.
+
+        Args:
+            job_id: The id returned by ``submit``
+
+        Returns:
+            The Job
+        """
+        with self._lock:
+            db = self._connect(create=False)
+            row = None
+            if db is not None:
+                row = db.execute(
+                    "SELECT id, status, priority, request, result, error, attempts, "
+                    "created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                    (job_id,),
+                ).fetchone()
+        if row is None:
+            raise JobError(f"Unknown job: {job_id}")
+        return Job(
+            id=row[0],
+            status=row[1],
+            priority=row[2],
+            request=json.loads(row[3]),
+            result=json.loads(row[4]) if row[4] else None,
+            error=row[5],
+            attempts=row[6],
+            created_at=row[7],
+            started_at=row[8],
+            finished_at=row[9],
+        )
+
+    def position(self, job_id: str) -> Optional[int]:
+        """
+        Return how many queued jobs will run before a queued job.
+
+        Args:
+            job_id: The job's id
+
+        Returns:
+            The number of jobs ahead of it, or None if it is not queued
+        """
+        with self._lock:
+            db = self._connect(create=False)
+            if db is None:
+                return None
+            row = db.execute(
+                "SELECT priority, seq FROM jobs WHERE id = ? AND status = 'queued'", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' "
+                "AND (priority > ? OR (priority = ? AND seq < ?))",
+                (row[0], row[0], row[1]),
+            ).fetchone()[0]
+
+    def claim(self) -> Optional[Job]:
+        """
+        Reserve the next queued job for this process.
+
+        Returns:
+            The claimed Job, now running, or None if no job is ready
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connect(create=False)
+            if db is None:
+                return None
+            row = db.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, "
+                "started_at = ?, attempts = attempts + 1 "
+                "WHERE seq = (SELECT seq FROM jobs WHERE status = 'queued' AND not_before <= ? "
+                "ORDER BY priority DESC, seq LIMIT 1) RETURNING id",
+                (self.owner, now + LEASE_SECONDS, now, now),
+            ).fetchone()
+            db.commit()
+        return self.get(row[0]) if row else None
+
+    def renew(self, job_ids: List[str]) -> None:
+        """Extend the leases of this process's running jobs."""
+        if not job_ids:
+            return
+        with self._lock:
+            db = self._connect()
+            db.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                [(time.time() + LEASE_SECONDS, job_id, self.owner) for job_id in job_ids],
+            )
+            db.commit()
+
+    def finish(self, job_id: str, result: Dict[str, Any]) -> None:
+        """Store the result of a job."""
+        self._complete(job_id, "finished", json.dumps(result), None)
+
+    def fail(self, job_id: str, error: str) -> None:
+        """Mark a job failed without a result."""
+        self._complete(job_id, "failed", None, error)
+
+    def _complete(self, job_id: str, status: str, result: Optional[str], error: Optional[str]) -> None:
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, "
+                "owner = NULL, lease_until = NULL WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+            db.commit()
+
+    def requeue(self, job_id: str, delay: float = 0.0) -> None:
+        """
+        Queue a claimed job again without counting the interrupted run.
+
+        Args:
+            job_id: The job's id
+            delay: Seconds before the job may be claimed again
+        """
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(0, attempts - 1), owner = NULL, "
+                "lease_until = NULL, started_at = NULL, not_before = ? WHERE id = ?",
+                (time.time() + delay, job_id),
+            )
+            db.commit()
+
+    def recover(self) -> int:
+        """
+        Queue again the running jobs whose runner is gone, and purge old jobs.
+
+        Returns:
+            The number of jobs queued again or, out of attempts, failed
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connect(create=False)
+            if db is None:
+                return 0
+            rows = db.execute(
+                "SELECT id, owner, lease_until, attempts FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            orphans = [
+                (job_id, attempts) for job_id, owner, lease_until, attempts in rows
+                if owner != self.owner and ((lease_until or 0) < now or not _owner_alive(owner or ""))
+            ]
+            for job_id, attempts in orphans:
+                if attempts >= MAX_ATTEMPTS:
+                    db.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, "
+                        "owner = NULL, lease_until = NULL WHERE id = ?",
+                        (f"Job interrupted {attempts} times", now, job_id),
+                    )
+                else:
+                    db.execute(
+                        "UPDATE jobs SET status = 'queued', owner = NULL, lease_until = NULL, "
+                        "started_at = NULL WHERE id = ?",
+                        (job_id,),
+                    )
+            db.execute(
+                "DELETE FROM jobs WHERE status IN ('finished', 'failed') AND finished_at < ?",
+                (now - self.retention,),
+            )
+            db.commit()
+        return len(orphans)
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of jobs in each status."""
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        with self._lock:
+            db = self._connect(create=False)
+            if db is not None:
+                counts.update(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return counts
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class JobRunner:
+    """Runs queued jobs on the event loop, at most ``concurrency`` at a time."""
+
+    def __init__(self, queue: JobQueue, concurrency: int):
+        """
+        Create the runner; ``start`` begins claiming jobs.
+
+        Args:
+            queue: The JobQueue
+            concurrency: Maximum number of jobs running at once
+        """
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self._run: Optional[Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._claiming = True
+
+    @property
+    def running(self) -> Set[str]:
+        """Ids of the jobs this runner is running."""
+        return set(self._running)
+
+    def start(self, run: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]) -> None:
+        """
+        Start claiming jobs on the running event loop, unless already started.
+
+        Args:
+            run: Coroutine function running a job's request and returning its result
+        """
+        if self._task is None or self._task.done():
+            self._run = run
+            self._claiming = True
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+
+    def wake(self) -> None:
+        """Look for queued jobs now instead of at the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def drain(self) -> None:
+        """Stop claiming jobs, letting the running ones finish."""
+        self._claiming = False
+
+    async def stop(self) -> None:
+        """Stop claiming jobs and queue the running ones again."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _dispatch(self) -> None:
+        last_recovery = 0.0
+        try:
+            while True:
+                if time.monotonic() - last_recovery > POLL_INTERVAL:
+                    await asyncio.to_thread(self.queue.recover)
+                    await asyncio.to_thread(self.queue.renew, list(self._running))
+                    last_recovery = time.monotonic()
+                while self._claiming and len(self._running) < self.concurrency:
+                    job = await asyncio.to_thread(self.queue.claim)
+                    if job is None:
+                        break
+                    self._running[job.id] = asyncio.create_task(self._execute(job))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            tasks = list(self._running.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _execute(self, job: Job) -> None:
+        try:
+            result = await self._run(job.request)
+        except asyncio.CancelledError:
+            # Shutting down; the session rolled its edits back
+            await asyncio.to_thread(self.queue.requeue, job.id)
+            raise
+        except Exception as e:
+            print(f"Error in job {job.id}: {str(e)}", file=sys.stderr)
+            await asyncio.to_thread(self.queue.fail, job.id, str(e))
+        else:
+            if result.get("status") == "busy":
+                await asyncio.to_thread(self.queue.requeue, job.id, BUSY_RETRY_DELAY)
+            else:
+                await asyncio.to_thread(self.queue.finish, job.id, result)
+        finally:
+            self._running.pop(job.id, None)
+            self.wake()
@@ -0,0 +1,481 @@
+"""
+Request, session and cache metrics in the Prometheus text format.
+
+The tools record request counts and latencies, and ai_code sessions their
+queue wait, phase timings, token usage and cost. Gauges and cache hit counts
+are read from the live objects when the metrics are collected, so the hot
+path only pays for a few dictionary updates. ``render`` produces the text
+served on ``/metrics``.
+
+Sessions run in worker processes in process mode, so each worker measures
+how its counters changed during a task with ``counter_changes`` and sends
+that along with the result; the server adds it with ``add_counter_changes``.
+Several HTTP workers each keep their own metrics; ``snapshot`` labels them
+with the worker, and ``render`` combines the snapshots of every worker.
+"""
+
+import asyncio
+import math
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from collections.abc import AsyncIterator
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Histogram buckets in seconds, from a cached get_models query to a long session
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0
+)
+PREFIX = "aider_mcp_"
+# Content type of the text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Labels and value of one sample
+Sample = Tuple[Dict[str, str], float]
+# Samples of every metric by metric name, as (sample name, labels, value)
+Snapshot = Dict[str, List[Tuple[str, Dict[str, str], float]]]
+# Changes of the counters by metric name and label values
+CounterChanges = Dict[str, Dict[Tuple[str, ...], float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metric:
+    """A named metric whose samples are keyed by label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        """
+        Create the metric.
+
+        Args:
+            name: Metric name, without the ``aider_mcp_`` prefix
+            documentation: Help text
+            labelnames: Names of the metric's labels
+        """
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        self._function: Optional[Callable[[], Iterable[Sample]]] = None
+        # Amounts counted in worker processes, added to the samples
+        self._forwarded: Dict[Tuple[str, ...], float] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def set_function(self, function: Callable[[], Iterable[Sample]]) -> None:
+        """
+        Read the metric's samples from ``function`` at collection time.
+
+        Args:
+            function: Callable returning (labels, value) pairs
+        """
+        self._function = function
+
+    def forward(self, key: Tuple[str, ...], amount: float) -> None:
+        """
+        Add an amount counted in a worker process.
+
+        Args:
+            key: The sample's label values, in the order of ``labelnames``
+            amount: Amount to add
+        """
+        with self._lock:
+            self._forwarded[key] = self._forwarded.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Return the (name, labels, value) samples to expose."""
+        if self._function is not None:
+            values: Dict[Tuple[str, ...], float] = {}
+            for labels, value in self._function():
+                values[self._key(labels)] = value
+        else:
+            with self._lock:
+                values = dict(self._values)
+        with self._lock:
+            for key, amount in self._forwarded.items():
+                values[key] = values.get(key, 0.0) + amount
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in sorted(values.items())]
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add ``amount`` to the sample with the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the sample with the given labels."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add ``amount`` to the sample with the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """Subtract ``amount`` from the sample with the given labels."""
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        """Return the sample with the given labels."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(Metric):
+    """Counts of observations in cumulative buckets, with their sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Create the histogram.
+
+        Args:
+            name: Metric name, without the ``aider_mcp_`` prefix
+            documentation: Help text
+            labelnames: Names of the metric's labels
+            buckets: Upper bounds of the buckets, in increasing order
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one observation in the series with the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_count", labels, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+        return samples
+
+
+class MetricsRegistry:
+    """The set of metrics exposed together."""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric and return it."""
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self, **labels: str) -> Snapshot:
+        """
+        Return the current samples of every metric.
+
+        Args:
+            **labels: Labels added to every sample, such as the HTTP worker
+        """
+        return {
+            metric.name: [(name, {**labels, **sample_labels}, value)
+                          for name, sample_labels, value in metric.samples()]
+            for metric in self._metrics
+        }
+
+    def render(self, snapshots: Optional[List[Snapshot]] = None) -> str:
+        """
+        Return every metric in the Prometheus text exposition format.
+
+        Args:
+            snapshots: Snapshots to render together, such as one per HTTP
+                worker (this process's current samples by default)
+        """
+        if snapshots is None:
+            snapshots = [self.snapshot()]
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for snapshot in snapshots:
+                for name, labels, value in snapshot.get(metric.name, []):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def counter_values(self) -> CounterChanges:
+        """Return the current value of every counter sample."""
+        return {
+            metric.name: {metric._key(labels): value for _, labels, value in metric.samples()}
+            for metric in self._metrics if isinstance(metric, Counter)
+        }
+
+    def add_counter_changes(self, changes: CounterChanges) -> None:
+        """Add counter changes measured in another process."""
+        for metric in self._metrics:
+            for key, amount in changes.get(metric.name, {}).items():
+                metric.forward(key, amount)
+
+
+registry = MetricsRegistry()
+
+requests_total = registry.register(Counter(
+    "requests_total", "Tool requests by tool and outcome.", ("tool", "status")))
+request_seconds = registry.register(Histogram(
+    "request_duration_seconds", "Tool request latency.", ("tool",)))
+requests_in_flight = registry.register(Gauge(
+    "requests_in_flight", "Tool requests being handled."))
+session_phase_seconds = registry.register(Histogram(
+    "session_phase_seconds",
+    "Time ai_code sessions spend queued for workers and files, building the Coder, "
+    "waiting on the LLM and applying edits.",
+    ("phase",)))
+sessions_in_flight = registry.register(Gauge(
+    "sessions_in_flight", "ai_code sessions admitted to the worker pool, running or queued."))
+queue_depth = registry.register(Gauge(
+    "queue_depth", "ai_code sessions waiting for a free worker."))
+tokens_total = registry.register(Counter(
+    "tokens_total", "LLM tokens used by ai_code sessions.", ("model", "kind")))
+cost_total = registry.register(Counter(
+    "cost_dollars_total", "LLM cost of ai_code sessions in dollars.", ("model",)))
+cache_hits = registry.register(Counter(
+    "cache_hits_total", "Cache lookups answered from the cache.", ("cache",)))
+cache_misses = registry.register(Counter(
+    "cache_misses_total", "Cache lookups that missed.", ("cache",)))
+context_trimmed = registry.register(Counter(
+    "context_trimmed_files_total",
+    "Read-only files sent as outlines or dropped to fit the context budget.", ("action",)))
+upstream_concurrency = registry.register(Gauge(
+    "upstream_concurrency_limit", "Adaptive limit of concurrent LLM requests per model.", ("model",)))
+upstream_waiting = registry.register(Gauge(
+    "upstream_waiting", "LLM requests waiting for their model's rate limits.", ("model",)))
+upstream_throttled = registry.register(Counter(
+    "upstream_throttled_total", "LLM requests the provider rejected with 429.", ("model",)))
+routed_sessions = registry.register(Counter(
+    "routed_sessions_total",
+    "ai_code sessions tried with the fast model, by whether its result was accepted "
+    "and why it was escalated otherwise.",
+    ("outcome", "reason")))
+worker_recycles = registry.register(Counter(
+    "worker_recycles_total",
+    "Worker processes replaced after their task limit, for using too much memory, or after crashing.",
+    ("reason",)))
+
+# Worker pools whose load the gauges report; one per server lifespan
+_worker_pools: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+
+def watch_worker_pool(pool: Any) -> None:
+    """
+    Report a worker pool's load in the in-flight and queue depth gauges.
+
+    Args:
+        pool: The WorkerPool
+    """
+    _worker_pools.add(pool)
+
+
+def _pool_load(attribute: str) -> Callable[[], Iterable[Sample]]:
+    return lambda: [({}, sum(getattr(pool, attribute) for pool in list(_worker_pools)))]
+
+
+def _caches() -> Dict[str, Any]:
+    from aider_mcp_server.capabilities.coder_cache import coder_pool, model_cache
+    from aider_mcp_server.capabilities.context_budget import file_cache
+    from aider_mcp_server.capabilities.tools.aider_ask import get_response_cache
+
+    caches = {"model": model_cache, "coder": coder_pool, "token_count": file_cache}
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        caches["ask_response"] = response_cache
+    return caches
+
+
+sessions_in_flight.set_function(_pool_load("pending"))
+queue_depth.set_function(_pool_load("queue_depth"))
+cache_hits.set_function(lambda: [({"cache": name}, c.hits) for name, c in _caches().items()])
+cache_misses.set_function(lambda: [({"cache": name}, c.misses) for name, c in _caches().items()])
+
+
+class RequestTimer:
+    """Outcome of a tool request, recorded when its ``track_request`` block exits."""
+
+    def __init__(self):
+        self.status = "success"
+
+
+@asynccontextmanager
+async def track_request(tool: str) -> AsyncIterator[RequestTimer]:
+    """
+    Count a tool request and time it.
+
+    The request counts as "cancelled" if the block is cancelled, as "error"
+    if it raises, and otherwise with the status set on the yielded
+    RequestTimer ("success" by default).
+
+    Args:
+        tool: Name of the tool
+    """
+    timer = RequestTimer()
+    started = time.perf_counter()
+    requests_in_flight.inc()
+    try:
+        yield timer
+    except asyncio.CancelledError:
+        timer.status = "cancelled"
+        raise
+    except BaseException:
+        timer.status = "error"
+        raise
+    finally:
+        requests_in_flight.dec()
+        request_seconds.observe(time.perf_counter() - started, tool=tool)
+        requests_total.inc(tool=tool, status=timer.status)
+
+
+def record_session(result: Dict[str, Any], model: str, queue_seconds: Optional[float] = None) -> None:
+    """
+    Record the phase timings, token usage and cost of an ai_code session.
+
+    Args:
+        result: The session's AICodeResult dict
+        model: The main model of the session; the usage of a fast model's
+            attempt is recorded under the fast model
+        queue_seconds: Time the session waited for workers and files, if it ran
+    """
+    usage = result.get("usage") or {}
+    routing = result.get("routing")
+    if routing:
+        fast_usage = routing.get("fast_usage")
+        if fast_usage:
+            _record_usage(fast_usage, routing["fast_model"])
+            # The rest was used by the main models after the escalation
+            usage = {name: value - fast_usage.get(name, 0) for name, value in usage.items()}
+        if routing["accepted"]:
+            model = routing["fast_model"]
+            routed_sessions.inc(outcome="accepted", reason="")
+        elif result.get("status") in ("cancelled", "timeout"):
+            routed_sessions.inc(outcome="stopped", reason=routing.get("reason") or "")
+        else:
+            routed_sessions.inc(outcome="escalated", reason=routing.get("reason") or "")
+    if queue_seconds is not None:
+        session_phase_seconds.observe(max(0.0, queue_seconds), phase="queue")
+    timings = result.get("timings") or {}
+    if timings.get("total_seconds"):
+        for phase in ("setup", "llm", "apply"):
+            session_phase_seconds.observe(timings.get(f"{phase}_seconds", 0.0), phase=phase)
+    _record_usage(usage, model)
+
+
+def _record_usage(usage: Dict[str, Any], model: str) -> None:
+    for kind in ("prompt", "completion", "thinking", "cache_hit", "cache_write"):
+        count = usage.get(f"{kind}_tokens", 0)
+        if count > 0:
+            tokens_total.inc(count, model=model, kind=kind)
+    # Rounding can leave a tiny remainder when the fast attempt's cost is subtracted
+    if usage.get("cost", 0) > 1e-12:
+        cost_total.inc(usage["cost"], model=model)
+
+
+def in_flight() -> int:
+    """Return the number of tool requests being handled."""
+    return int(requests_in_flight.get())
+
+
+def snapshot(**labels: str) -> Snapshot:
+    """
+    Return the current samples of every metric, for combining with other processes' samples.
+
+    Args:
+        **labels: Labels added to every sample, such as the HTTP worker
+    """
+    return registry.snapshot(**labels)
+
+
+def render(snapshots: Optional[List[Snapshot]] = None) -> str:
+    """
+    Return the current metrics in the Prometheus text exposition format.
+
+    Args:
+        snapshots: Snapshots of several processes to render together
+            (this process's current samples by default)
+    """
+    return registry.render(snapshots)
+
+
+def counter_values() -> CounterChanges:
+    """Return the current value of every counter sample, for ``counter_changes``."""
+    return registry.counter_values()
+
+
+def counter_changes(before: CounterChanges) -> CounterChanges:
+    """
+    Return how the counters changed since ``counter_values`` returned ``before``.
+
+    Args:
+        before: The earlier counter values
+
+    Returns:
+        The non-zero changes, for ``add_counter_changes`` in another process
+    """
+    changes: CounterChanges = {}
+    for name, values in registry.counter_values().items():
+        previous = before.get(name, {})
+        for key, value in values.items():
+            amount = value - previous.get(key, 0.0)
+            if amount > 0:
+                changes.setdefault(name, {})[key] = amount
+    return changes
+
+
+def add_counter_changes(changes: CounterChanges) -> None:
+    """
+    Add the counter changes a worker process measured during a task.
+
+    Args:
+        changes: The result of ``counter_changes`` in the worker
+    """
+    registry.add_counter_changes(changes)
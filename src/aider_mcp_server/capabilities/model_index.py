@@ -0,0 +1,242 @@
+"""
+Precomputed index of the chat model names known to Aider.
+
+The index is built once from litellm's model registry and Aider's local model
+metadata, the same sources ``aider.models.fuzzy_match_models`` scans on every
+call. Substring queries are answered from a trigram index, and misspelled
+names fall back to a fuzzy match over the names of a similar length. The index is rebuilt in a background thread once it is older than
+its refresh interval, while queries keep being answered from the previous one.
+"""
+
+import difflib
+import heapq
+import math
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Optional, Set
+
+# Rebuild the index in the background once it is older than this
+DEFAULT_REFRESH_INTERVAL = 24 * 60 * 60.0
+# Fuzzy fallback settings, matching fuzzy_match_models
+FUZZY_MATCHES = 3
+FUZZY_CUTOFF = 0.8
+
+# Metadata fields reported for each model
+METADATA_FIELDS = (
+    "max_input_tokens",
+    "max_output_tokens",
+    "input_cost_per_token",
+    "output_cost_per_token",
+)
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+@dataclass
+class _Snapshot:
+    """An immutable build of the index."""
+    names: List[str] = field(default_factory=list)
+    lowered: List[str] = field(default_factory=list)
+    short: List[str] = field(default_factory=list)
+    trigrams: Dict[str, FrozenSet[int]] = field(default_factory=dict)
+    by_length: Dict[int, List[int]] = field(default_factory=dict)
+    metadata: List[Dict[str, Any]] = field(default_factory=list)
+    built_at: float = 0.0
+
+
+def load_chat_models() -> Dict[str, Dict[str, Any]]:
+    """
+    Collect the chat models known to litellm and Aider.
+
+    Like ``fuzzy_match_models``, every model is listed both under its own
+    name and prefixed with its provider.
+
+    Returns:
+        A dict mapping each model name to its metadata
+    """
+    from aider.llm import litellm
+    from aider.models import model_info_manager
+
+    model_metadata = list(litellm.model_cost.items())
+    model_metadata += list(model_info_manager.local_model_metadata.items())
+
+    models: Dict[str, Dict[str, Any]] = {}
+    for orig_model, attrs in model_metadata:
+        if attrs.get("mode") != "chat":
+            continue
+        provider = attrs.get("litellm_provider", "").lower()
+        if not provider:
+            continue
+        info = {"provider": provider}
+        info.update({key: attrs[key] for key in METADATA_FIELDS if key in attrs})
+
+        provider += "/"
+        if orig_model.lower().startswith(provider):
+            fq_model = orig_model
+        else:
+            fq_model = provider + orig_model
+        models[fq_model] = info
+        models[orig_model] = info
+    return models
+
+
+class ModelIndex:
+    """Trigram index over model names with ranked, paginated search."""
+
+    def __init__(self, refresh_interval: float = DEFAULT_REFRESH_INTERVAL, loader=load_chat_models):
+        """
+        Create an empty index; it is built on first use or by ``refresh``.
+
+        Args:
+            refresh_interval: Seconds after which the index is rebuilt in the background
+            loader: Callable returning a dict of model name to metadata
+        """
+        self.refresh_interval = refresh_interval
+        self._loader = loader
+        self._snapshot: Optional[_Snapshot] = None
+        self._build_lock = threading.RLock()
+        self._refreshing = False
+
+    def build(self) -> None:
+        """Rebuild the index from the model registry, replacing the current one."""
+        with self._build_lock:
+            models = self._loader()
+            names = sorted(models)
+            lowered = [name.lower() for name in names]
+            postings: Dict[str, Set[int]] = {}
+            by_length: Dict[int, List[int]] = {}
+            for position, name in enumerate(lowered):
+                by_length.setdefault(len(name), []).append(position)
+                for gram in _trigrams(name):
+                    postings.setdefault(gram, set()).add(position)
+            self._snapshot = _Snapshot(
+                names=names,
+                lowered=lowered,
+                short=[name.rsplit("/", 1)[-1] for name in lowered],
+                trigrams={gram: frozenset(ids) for gram, ids in postings.items()},
+                by_length=by_length,
+                metadata=[models[name] for name in names],
+                built_at=time.monotonic(),
+            )
+
+    def warm(self) -> None:
+        """Build the index unless it has been built already."""
+        with self._build_lock:
+            if self._snapshot is None:
+                self.build()
+
+    def refresh(self) -> None:
+        """Rebuild the index in a background thread unless a rebuild is already running."""
+        with self._build_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run() -> None:
+            try:
+                self.build()
+            except Exception as e:
+                print(f"Error refreshing model index: {str(e)}", file=sys.stderr)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="model-index-refresh", daemon=True).start()
+
+    def _current(self) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.warm()
+            return self._snapshot
+        if time.monotonic() - snapshot.built_at > self.refresh_interval:
+            self.refresh()
+        return snapshot
+
+    def search(self, query: str, limit: Optional[int] = None, offset: int = 0,
+               include_metadata: bool = False) -> List[Any]:
+        """
+        Find the model names containing ``query``, or close to it when none do.
+
+        Substring matches are ranked exact match first, then names where the
+        query starts the name or the part after the provider prefix, then by
+        match position, length and name.
+
+        Args:
+            query: Case-insensitive substring to search for
+            limit: Maximum number of results to return (all when None)
+            offset: Number of ranked results to skip
+            include_metadata: Return dicts with the model's provider, context
+                window and prices instead of plain names
+
+        Returns:
+            The matching model names, or metadata dicts when requested
+        """
+        snapshot = self._current()
+        query = query.lower()
+        end = None if limit is None else offset + max(limit, 0)
+        positions = self._substring_matches(snapshot, query)
+        if positions:
+            def rank(p: int) -> tuple:
+                name, short = snapshot.lowered[p], snapshot.short[p]
+                return (
+                    name != query and short != query,
+                    not (name.startswith(query) or short.startswith(query)),
+                    name.find(query),
+                    len(name),
+                    snapshot.names[p],
+                )
+
+            if end is None:
+                positions.sort(key=rank)
+            else:
+                positions = heapq.nsmallest(end, positions, key=rank)
+        else:
+            positions = self._fuzzy_matches(snapshot, query)
+
+        positions = positions[offset:end]
+        if include_metadata:
+            return [{"name": snapshot.names[p], **snapshot.metadata[p]} for p in positions]
+        return [snapshot.names[p] for p in positions]
+
+    @staticmethod
+    def _substring_matches(snapshot: _Snapshot, query: str) -> List[int]:
+        grams = _trigrams(query)
+        if not grams:
+            # Too short for the trigram index; the scan is still cheap
+            return [p for p, name in enumerate(snapshot.lowered) if query in name]
+        postings = sorted((snapshot.trigrams.get(gram, frozenset()) for gram in grams), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return [p for p in candidates if query in snapshot.lowered[p]]
+
+    @staticmethod
+    def _fuzzy_matches(snapshot: _Snapshot, query: str) -> List[int]:
+        # A ratio of at least the cutoff is only possible between similar lengths
+        shortest = math.ceil(round(len(query) * FUZZY_CUTOFF / (2 - FUZZY_CUTOFF), 6))
+        longest = math.floor(round(len(query) * (2 - FUZZY_CUTOFF) / FUZZY_CUTOFF, 6))
+        candidates = [
+            position
+            for length in range(shortest, longest + 1)
+            for position in snapshot.by_length.get(length, ())
+        ]
+        scored = []
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        for position in candidates:
+            matcher.set_seq1(snapshot.lowered[position])
+            # Same cheap upper bounds get_close_matches checks before the full ratio
+            if (matcher.real_quick_ratio() >= FUZZY_CUTOFF
+                    and matcher.quick_ratio() >= FUZZY_CUTOFF
+                    and matcher.ratio() >= FUZZY_CUTOFF):
+                scored.append((-matcher.ratio(), snapshot.names[position], position))
+        return [position for _, _, position in sorted(scored)[:FUZZY_MATCHES]]
+
+
+_model_index = ModelIndex()
+
+
+def get_model_index() -> ModelIndex:
+    """Return the process-wide model index."""
+    return _model_index
@@ -0,0 +1,320 @@
+"""
+Pool of preforked, warm worker processes for Aider sessions.
+
+Aider keeps process-wide state and spends much of a session on CPU-bound
+work that the GIL would otherwise serialize, so in process mode each session
+runs in a worker process. Workers are forked from a forkserver that has
+already imported the tool modules, then run an initializer that resolves the
+server's models, so a session never pays for imports. Each worker is fed
+over its own pipe by a manager thread in the server, and is replaced after
+``max_tasks`` sessions or as soon as its resident memory passes the limit,
+so that memory leaked by one session does not accumulate. The replacement is
+started as soon as the old worker retires, and warms up while it waits for
+its first task.
+
+The pipe stays readable while a session runs, so ``interrupt`` can cancel a
+running session's CancelToken inside its worker, which then stops and rolls
+back as it would in thread mode, and ``broadcast`` can drop the warm state
+of every worker. What a session counted in its worker, such
+as cache hits, is sent back with its result and added to the server's
+metrics.
+"""
+
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from aider_mcp_server.capabilities import metrics
+
+# Sessions a worker runs before it is replaced (0 for no limit)
+DEFAULT_MAX_TASKS_PER_WORKER = 100
+# Resident memory in MiB above which a worker is replaced (0 for no limit)
+DEFAULT_MAX_WORKER_MEMORY_MB = 2048
+# Seconds a retiring worker gets to exit before it is terminated
+RETIRE_TIMEOUT = 5.0
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised for a task whose worker process died while running it."""
+
+
+def _rss_bytes() -> int:
+    """Return this process's resident memory in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes everywhere but macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _read_messages(conn, tasks: "queue.SimpleQueue") -> None:
+    """Queue the tasks received on ``conn`` and handle interrupts as soon as they arrive."""
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            tasks.put(None)
+            return
+        except Exception as e:
+            # The task could not be unpickled; the pipe is still in step
+            tasks.put(RuntimeError(f"Worker could not receive task: {str(e)}"))
+            continue
+        if message is None:
+            tasks.put(None)
+            return
+        if message[0] == "interrupt":
+            from aider_mcp_server.capabilities.cancellation import cancel_received
+
+            cancel_received(*message[1:])
+        elif message[0] == "call":
+            fn, args = message[1:]
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Error in worker broadcast: {str(e)}", file=sys.stderr)
+        else:
+            tasks.put(message[1:])
+
+
+def _worker_main(conn, initializer: Optional[Callable[..., None]], initargs: Tuple) -> None:
+    """Run tasks received on ``conn`` until told to stop."""
+    if initializer is not None:
+        try:
+            initializer(*initargs)
+        except Exception as e:
+            print(f"Error initializing worker: {str(e)}", file=sys.stderr)
+    tasks: "queue.SimpleQueue" = queue.SimpleQueue()
+    threading.Thread(target=_read_messages, args=(conn, tasks), name="aider-worker-pipe", daemon=True).start()
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        counters = metrics.counter_values()
+        if isinstance(task, BaseException):
+            reply = (False, task)
+        else:
+            fn, args, kwargs = task
+            try:
+                reply = (True, fn(*args, **kwargs))
+            except BaseException as e:
+                reply = (False, e)
+        # The server reports what this worker counted, such as cache hits
+        changes = metrics.counter_changes(counters)
+        try:
+            conn.send((*reply, _rss_bytes(), changes))
+        except Exception as e:
+            # The result or exception could not be pickled
+            conn.send((False, RuntimeError(f"Worker result could not be sent: {str(e)}"), _rss_bytes(), changes))
+
+
+@dataclass
+class _Worker:
+    process: Any
+    conn: Any
+    tasks: int = 0
+    # Serializes the manager's tasks with interrupts sent from other threads
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def send(self, message: Any) -> None:
+        with self.lock:
+            self.conn.send(message)
+
+
+class PreforkPool(Executor):
+    """
+    Executor running callables in recycled worker processes.
+
+    Callables, their arguments and results must be picklable.
+    """
+
+    def __init__(self, max_workers: int, max_tasks: int = DEFAULT_MAX_TASKS_PER_WORKER,
+                 max_memory_mb: int = DEFAULT_MAX_WORKER_MEMORY_MB,
+                 initializer: Optional[Callable[..., None]] = None, initargs: Tuple = (),
+                 preload: Sequence[str] = ()):
+        """
+        Start the workers.
+
+        Args:
+            max_workers: Number of worker processes
+            max_tasks: Tasks a worker runs before it is replaced (0 for no limit)
+            max_memory_mb: Resident memory in MiB above which a worker is
+                replaced after its task (0 for no limit)
+            initializer: Called in each new worker before its first task
+            initargs: Arguments of ``initializer``
+            preload: Modules the forkserver imports once, so that every
+                worker starts with them loaded
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self.max_tasks = max_tasks
+        self.max_memory = max_memory_mb * 1024 * 1024
+        self.initializer = initializer
+        self.initargs = initargs
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload(list(preload))
+        else:  # pragma: no cover - Windows
+            self._context = multiprocessing.get_context("spawn")
+        self._tasks: "queue.SimpleQueue[Optional[Tuple[Future, Callable, Tuple, dict]]]" = queue.SimpleQueue()
+        self._shutdown = False
+        self._shutdown_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._workers: List[_Worker] = []
+        for index in range(max_workers):
+            # Workers are started here, so they are warm before the first session
+            self._workers.append(self._spawn())
+            thread = threading.Thread(
+                target=self._manage, args=(index,), name=f"aider-process-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.initializer, self.initargs),
+            name="aider-worker",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    @staticmethod
+    def _retire(worker: _Worker) -> None:
+        try:
+            worker.send(None)
+        except OSError:
+            pass
+        worker.process.join(RETIRE_TIMEOUT)
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join()
+        worker.conn.close()
+
+    def _recycle_reason(self, worker: _Worker, rss: int) -> Optional[str]:
+        if self.max_tasks and worker.tasks >= self.max_tasks:
+            return "tasks"
+        if self.max_memory and rss > self.max_memory:
+            return "memory"
+        return None
+
+    def _manage(self, slot: int) -> None:
+        """Feed tasks to one worker slot, replacing its worker as needed."""
+        worker = self._workers[slot]
+        while True:
+            item = self._tasks.get()
+            if item is None:
+                break
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                worker.send(("task", fn, args, kwargs))
+            except Exception as e:
+                # Pickling fails before anything is written, so the worker is still usable
+                future.set_exception(e)
+                continue
+            try:
+                ok, value, rss, changes = worker.conn.recv()
+            except (EOFError, OSError):
+                code = worker.process.exitcode
+                future.set_exception(WorkerCrashedError(f"Worker process died (exit code {code})"))
+                self._retire(worker)
+                metrics.worker_recycles.inc(reason="crash")
+                worker = self._workers[slot] = self._spawn()
+                continue
+
+            worker.tasks += 1
+            metrics.add_counter_changes(changes)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+            reason = self._recycle_reason(worker, rss)
+            if reason is not None:
+                # Start the replacement first, so it warms up while the old worker exits
+                retired, worker = worker, self._spawn()
+                self._workers[slot] = worker
+                self._retire(retired)
+                metrics.worker_recycles.inc(reason=reason)
+        self._retire(worker)
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        """Schedule ``fn(*args, **kwargs)`` on a worker and return its Future."""
+        with self._shutdown_lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            future: Future = Future()
+            self._tasks.put((future, fn, args, kwargs))
+            return future
+
+    def interrupt(self, token_id: str, reason: str = "cancelled") -> None:
+        """
+        Cancel the CancelToken a running task received, in whichever worker runs it.
+
+        Args:
+            token_id: Id of the CancelToken passed to the task
+            reason: "cancelled" or "timeout"
+        """
+        for worker in list(self._workers):
+            try:
+                worker.send(("interrupt", token_id, reason))
+            except OSError:
+                # A worker being replaced; the task it ran has already ended
+                pass
+
+    def broadcast(self, fn: Callable[..., Any], *args: Any) -> None:
+        """
+        Run ``fn(*args)`` in every worker, beside the task it may be running.
+
+        Workers started later do not run it.
+
+        Args:
+            fn: Picklable callable
+            *args: Its picklable arguments
+        """
+        for worker in list(self._workers):
+            try:
+                worker.send(("call", fn, args))
+            except OSError:
+                # A worker being replaced starts without the old worker's state
+                pass
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        """
+        Stop the workers once the tasks already scheduled are done.
+
+        Args:
+            wait: Block until every worker has exited
+            cancel_futures: Cancel the tasks that have not started yet
+        """
+        with self._shutdown_lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            if cancel_futures:
+                pending = []
+                while True:
+                    try:
+                        pending.append(self._tasks.get_nowait())
+                    except queue.Empty:
+                        break
+                for item in pending:
+                    if item is not None:
+                        item[0].cancel()
+            for _ in self._threads:
+                self._tasks.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
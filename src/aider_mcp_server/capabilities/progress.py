@@ -0,0 +1,181 @@
+"""
+Progress streaming for Aider sessions.
+
+``ProgressIO`` replaces Aider's terminal InputOutput and turns everything the
+Coder would print (streamed LLM tokens, applied edits, warnings and errors)
+into small event dicts. ``ProgressReporter`` carries those events from the
+worker thread to the event loop and forwards them to the MCP client as
+progress and log notifications, while keeping a summary for the final result.
+"""
+
+import asyncio
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from aider.io import InputOutput
+from fastmcp import Context
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+_APPLIED_EDIT = re.compile(r"^Applied edit to (?P<path>.+)$")
+_DONE = object()
+
+
+class _TokenStream:
+    """Stand-in for Aider's MarkdownStream that emits only the new text."""
+
+    def __init__(self, io: "ProgressIO"):
+        self.io = io
+        self.sent = 0
+
+    def update(self, text: str, final: bool = False) -> None:
+        if len(text) > self.sent:
+            self.io.emit("token", text=text[self.sent:])
+            self.sent = len(text)
+
+
+class ProgressIO(InputOutput):
+    """InputOutput that reports Aider's output through a callback instead of the terminal."""
+
+    def __init__(self, callback: ProgressCallback, **kwargs: Any):
+        """
+        Create the IO adapter.
+
+        Args:
+            callback: Called with each event dict; must be safe to call from a worker thread
+            **kwargs: Passed through to InputOutput
+        """
+        kwargs.setdefault("yes", True)
+        # Aider only streams through the assistant mdstream when pretty is on
+        kwargs.setdefault("pretty", True)
+        super().__init__(**kwargs)
+        self.callback = callback
+
+    def emit(self, event_type: str, **data: Any) -> None:
+        """Send an event to the callback, ignoring callback failures."""
+        try:
+            self.callback({"type": event_type, **data})
+        except Exception:
+            pass
+
+    def tool_output(self, *messages, log_only=False, bold=False):
+        if messages:
+            self.append_chat_history(" ".join(messages).strip(), linebreak=True, blockquote=True)
+        message = " ".join(str(m) for m in messages).strip()
+        if not message or log_only:
+            return
+        match = _APPLIED_EDIT.match(message)
+        if match:
+            self.emit("edit", path=match.group("path"), status="applied")
+        else:
+            self.emit("log", level="info", message=message)
+
+    def tool_warning(self, message="", strip=True):
+        if str(message).strip():
+            self.emit("log", level="warning", message=str(message).strip())
+
+    def tool_error(self, message="", strip=True):
+        self.num_error_outputs += 1
+        if str(message).strip():
+            self.emit("log", level="error", message=str(message).strip())
+
+    def get_assistant_mdstream(self):
+        return _TokenStream(self)
+
+    def assistant_output(self, message, pretty=None):
+        if message:
+            self.emit("token", text=message)
+
+    def print(self, message=""):
+        pass
+
+
+class ProgressReporter:
+    """
+    Forwards progress events from a worker thread to an MCP client.
+
+    ``callback`` may be called from any thread. ``pump`` runs on the event
+    loop, coalesces queued tokens into a single log notification and reports
+    one unit of progress per forwarded batch.
+    """
+
+    def __init__(self, ctx: Optional[Context], loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        Create the reporter.
+
+        Args:
+            ctx: The MCP context to notify, or None to only collect the summary
+            loop: The event loop running ``pump``; defaults to the running loop
+        """
+        self.ctx = ctx
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.progress = 0
+        self.token_chars = 0
+        self.warnings: List[str] = []
+        self.errors: List[str] = []
+
+    def callback(self, event: Dict[str, Any]) -> None:
+        """Queue an event; safe to call from any thread."""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    def close(self) -> None:
+        """Tell ``pump`` that no more events will arrive."""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, _DONE)
+
+    def _record(self, event: Dict[str, Any]) -> None:
+        if event["type"] == "token":
+            self.token_chars += len(event["text"])
+        elif event["type"] == "log" and event["level"] == "warning":
+            self.warnings.append(event["message"])
+        elif event["type"] == "log" and event["level"] == "error":
+            self.errors.append(event["message"])
+
+    async def _notify(self, batch: List[Dict[str, Any]]) -> None:
+        if self.ctx is None:
+            return
+        tokens = "".join(event["text"] for event in batch if event["type"] == "token")
+        if tokens:
+            await self.ctx.log("debug", tokens, logger_name="aider.tokens")
+        for event in batch:
+            if event["type"] == "edit":
+                await self.ctx.info(f"Applied edit to {event['path']}")
+            elif event["type"] == "log":
+                await self.ctx.log(event["level"], event["message"], logger_name="aider")
+        self.progress += 1
+        await self.ctx.report_progress(self.progress)
+
+    async def pump(self) -> None:
+        """Forward events to the client until ``close`` is called."""
+        done = False
+        while not done:
+            batch = [await self.queue.get()]
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if batch[-1] is _DONE:
+                batch.pop()
+                done = True
+            for event in batch:
+                self._record(event)
+            try:
+                await self._notify(batch)
+            except Exception:
+                # A client that went away must not fail the session
+                self.ctx = None
+
+    def summary(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add the streamed output summary to a session result.
+
+        Args:
+            result: The AICodeResult dict returned by the session
+
+        Returns:
+            The result with the response size and collected warnings and errors
+        """
+        return {
+            **result,
+            "response_chars": self.token_chars,
+            "warnings": list(self.warnings),
+            "errors": list(self.errors),
+        }
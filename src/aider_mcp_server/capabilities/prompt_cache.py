@@ -0,0 +1,56 @@
+"""
+Stable prompt prefixes for provider prompt caching.
+
+Aider lays out a request as the system prompt and examples, the read-only
+files, the repo map, the chat history, the editable files and the new
+message. Providers cache the longest previously seen prefix of a request,
+either automatically (OpenAI, DeepSeek) or up to the ``cache_control``
+breakpoints Aider adds when ``cache_prompts`` is on and the model supports it
+(Anthropic). Two things keep that prefix from repeating between sessions
+that read the same specs and interfaces:
+
+- the read-only files are kept in a set, so their order depends on how the
+  set was built; they are rendered sorted by path here
+- Aider puts one breakpoint after the repo map, which covers the read-only
+  files too but changes whenever the repo map does; a breakpoint is added
+  right after the read-only files, using Anthropic's fourth
+"""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from aider.coders import Coder
+
+
+def stabilize_prompt_prefix(coder: "Coder") -> "Coder":
+    """
+    Make a Coder's read-only context a stable, separately cached prefix.
+
+    The change is made on the instance, so it lasts while the Coder is reused.
+
+    Args:
+        coder: The Coder to change
+
+    Returns:
+        The same Coder
+    """
+    get_read_only_files_content = coder.get_read_only_files_content
+    format_messages = coder.format_messages
+
+    def sorted_read_only_files_content():
+        fnames = coder.abs_read_only_fnames
+        coder.abs_read_only_fnames = sorted(fnames)
+        try:
+            return get_read_only_files_content()
+        finally:
+            coder.abs_read_only_fnames = fnames
+
+    def format_messages_with_read_only_breakpoint():
+        chunks = format_messages()
+        if coder.add_cache_headers and chunks.repo and chunks.readonly_files:
+            chunks.add_cache_control(chunks.readonly_files)
+        return chunks
+
+    coder.get_read_only_files_content = sorted_read_only_files_content
+    coder.format_messages = format_messages_with_read_only_breakpoint
+    return coder
@@ -0,0 +1,617 @@
+"""
+Shared rate limits and adaptive concurrency for upstream LLM requests.
+
+Every LLM request the server sends, whether from an Aider session or from
+``ask_question``, first takes a permit from the limiter of its model. A
+permit needs a free concurrency slot and, where limits are configured, one
+request and the estimated prompt tokens from token buckets refilled at the
+configured requests and tokens per minute. A limit can name a model, a
+provider (shared by all its models) or ``*``; every matching limit applies.
+Requests waiting for a permit are served first come, first served, so under
+load they queue instead of all retrying against the provider.
+
+The concurrency limit of each model adapts, AIMD style: it grows by one
+request per limit's worth of successful requests, halves when the provider
+answers 429, and shrinks gently while requests stay much slower per output
+token than usual. Latency is smoothed over requests, and completions too
+short to say anything about it, whose time is mostly the wait for the first
+token, are left out. Estimated prompt tokens are corrected with the reported
+usage once a request is done.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from aider_mcp_server.capabilities import metrics
+
+# Concurrent upstream requests per model that the adaptive limit starts at and never exceeds
+DEFAULT_UPSTREAM_CONCURRENCY = 16
+# Limit key applying to every model
+ANY_MODEL = "*"
+# Factor the concurrency limit is multiplied by when the provider answers 429
+THROTTLE_BACKOFF = 0.5
+# Factor the concurrency limit is multiplied by when requests become slow
+LATENCY_BACKOFF = 0.9
+# Smoothed latency per output token above this multiple of the baseline counts as slow
+LATENCY_TOLERANCE = 3.0
+# Weight of each request's latency in the smoothed latency
+LATENCY_SMOOTHING = 0.2
+# Multiple of the baseline a single request's latency is capped at, so one outlier cannot cause a backoff
+LATENCY_CAP = 2 * LATENCY_TOLERANCE
+# Fraction of the distance to the smoothed latency by which the baseline rises
+BASELINE_DRIFT = 0.05
+# Completions with fewer output tokens do not count towards the latency
+MIN_LATENCY_TOKENS = 64
+# Longest wait in seconds between checks of the queue and for cancellation
+WAIT_CHECK_INTERVAL = 0.5
+# Characters per token when estimating the size of a prompt
+CHARS_PER_TOKEN = 4
+# Tokens added per message for the role and formatting
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Requests and tokens per minute allowed for a model or provider (0 for no limit)."""
+    requests_per_minute: float = 0.0
+    tokens_per_minute: float = 0.0
+
+
+def parse_rate_limit(spec: str) -> Tuple[str, RateLimit]:
+    """
+    Parse a ``KEY=RPM[:TPM]`` rate limit specification.
+
+    Args:
+        spec: The specification; KEY is a model, a provider or ``*``
+
+    Returns:
+        The key and its limit
+
+    Raises:
+        ValueError: If the specification is malformed
+    """
+    key, sep, values = spec.partition("=")
+    requests, _, tokens = values.partition(":")
+    try:
+        limit = RateLimit(float(requests or 0), float(tokens or 0))
+    except ValueError:
+        limit = None
+    if not key or not sep or limit is None or limit.requests_per_minute < 0 or limit.tokens_per_minute < 0:
+        raise ValueError(f"rate limit must be KEY=RPM[:TPM], got {spec!r}")
+    return key, limit
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """
+    Estimate the prompt tokens of chat messages from their length.
+
+    Args:
+        messages: The chat messages
+
+    Returns:
+        The estimated number of tokens
+    """
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        total += len(content or "") // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+    return total
+
+
+def is_throttled(error: BaseException) -> bool:
+    """Return whether ``error`` is a provider's rate limit (HTTP 429) response."""
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+class TokenBucket:
+    """A bucket holding up to one minute's allowance, refilled continuously."""
+
+    def __init__(self, per_minute: float):
+        """
+        Create a full bucket.
+
+        Args:
+            per_minute: Allowance per minute
+        """
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Return the seconds until ``amount`` can be taken; larger amounts wait for a full bucket."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        """Take ``amount``, possibly leaving a debt that later refills pay back."""
+        self.level -= amount
+
+
+class AdaptiveLimit:
+    """Additive-increase, multiplicative-decrease concurrency limit."""
+
+    def __init__(self, maximum: int):
+        """
+        Create the limit at its maximum.
+
+        Args:
+            maximum: Highest value the limit may reach
+        """
+        self.maximum = max(1, maximum)
+        self.limit = float(self.maximum)
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+
+    @property
+    def value(self) -> int:
+        """The number of requests currently allowed at once."""
+        return max(1, int(self.limit))
+
+    def succeeded(self, seconds: float, completion_tokens: int) -> None:
+        """
+        Adapt to a successful request.
+
+        Args:
+            seconds: Time the request took
+            completion_tokens: Tokens of its completion
+        """
+        if completion_tokens >= MIN_LATENCY_TOKENS:
+            latency = seconds / completion_tokens
+            if self.latency is None or self.baseline is None:
+                self.latency = latency
+            else:
+                latency = min(latency, self.baseline * LATENCY_CAP)
+                self.latency += (latency - self.latency) * LATENCY_SMOOTHING
+            if self.baseline is None or self.latency < self.baseline:
+                self.baseline = self.latency
+            else:
+                self.baseline += (self.latency - self.baseline) * BASELINE_DRIFT
+            if self.latency > self.baseline * LATENCY_TOLERANCE:
+                self.limit = max(1.0, self.limit * LATENCY_BACKOFF)
+                return
+        self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+    def throttled(self) -> None:
+        """Adapt to a request the provider rejected with 429."""
+        self.limit = max(1.0, self.limit * THROTTLE_BACKOFF)
+
+
+class _Waiter:
+    """A request queued for a permit, woken from any thread."""
+
+    def __init__(self, tokens: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.tokens = tokens
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def grant(self) -> None:
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class Permit:
+    """Permission to send one upstream request, released when the request is done."""
+
+    def __init__(self, limiter: "ModelLimiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.started = time.monotonic()
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens = 0
+        self.released = False
+
+    def record(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """
+        Record the usage the provider reported for the request.
+
+        Args:
+            prompt_tokens: Tokens of the prompt
+            completion_tokens: Tokens of the completion
+        """
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    def release(self, error: Optional[BaseException] = None) -> None:
+        """
+        Give the permit back and adapt the model's limit to the outcome.
+
+        Args:
+            error: The exception the request failed with, if any
+        """
+        if not self.released:
+            self.released = True
+            self.limiter._release(self, error)
+
+
+class ModelLimiter:
+    """The limits and queue of upstream requests to one model."""
+
+    def __init__(self, model: str, buckets: List[Tuple[TokenBucket, TokenBucket]],
+                 max_concurrency: int, lock: threading.Lock):
+        """
+        Create the limiter.
+
+        Args:
+            model: The model name
+            buckets: (requests, tokens) bucket pairs of the limits that apply;
+                either bucket may be None
+            max_concurrency: Highest concurrency limit
+            lock: Lock shared with every limiter that may share a bucket
+        """
+        self.model = model
+        self.buckets = buckets
+        self.concurrency = AdaptiveLimit(max_concurrency)
+        self.active = 0
+        self._lock = lock
+        self._waiters: Deque[_Waiter] = deque()
+        metrics.upstream_concurrency.set(self.concurrency.value, model=model)
+
+    def _dispatch(self) -> Optional[float]:
+        """
+        Grant permits to waiters in order while the limits allow.
+
+        Must be called with the lock held.
+
+        Returns:
+            Seconds until the first waiter's tokens refill, or None when it
+            waits for a slot or nobody waits
+        """
+        while self._waiters:
+            if self.active >= self.concurrency.value:
+                return None
+            waiter = self._waiters[0]
+            now = time.monotonic()
+            delay = 0.0
+            for requests, tokens in self.buckets:
+                if requests is not None:
+                    delay = max(delay, requests.wait_time(1, now))
+                if tokens is not None:
+                    delay = max(delay, tokens.wait_time(waiter.tokens, now))
+            if delay > 0:
+                return delay
+            for requests, tokens in self.buckets:
+                if requests is not None:
+                    requests.take(1)
+                if tokens is not None:
+                    tokens.take(waiter.tokens)
+            self._waiters.popleft()
+            self.active += 1
+            metrics.upstream_waiting.dec(model=self.model)
+            waiter.grant()
+        return None
+
+    def _enqueue(self, waiter: _Waiter) -> Optional[float]:
+        with self._lock:
+            self._waiters.append(waiter)
+            metrics.upstream_waiting.inc(model=self.model)
+            return self._dispatch()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Withdraw a waiter that stopped waiting, returning its permit if it was just granted."""
+        with self._lock:
+            if waiter.granted:
+                self.active -= 1
+                for requests, tokens in self.buckets:
+                    if requests is not None:
+                        requests.take(-1)
+                    if tokens is not None:
+                        tokens.take(-waiter.tokens)
+            else:
+                self._waiters.remove(waiter)
+                metrics.upstream_waiting.dec(model=self.model)
+            self._dispatch()
+
+    def acquire(self, tokens: int, check: Optional[Callable[[], None]] = None) -> Permit:
+        """
+        Wait for a permit on this thread.
+
+        Args:
+            tokens: Estimated prompt tokens of the request
+            check: Called periodically while waiting; raise from it to stop waiting
+
+        Returns:
+            The permit
+        """
+        waiter = _Waiter(tokens)
+        delay = self._enqueue(waiter)
+        try:
+            while not waiter.granted:
+                waiter.event.wait(min(delay or WAIT_CHECK_INTERVAL, WAIT_CHECK_INTERVAL))
+                if check is not None:
+                    check()
+                with self._lock:
+                    delay = self._dispatch()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        return Permit(self, tokens)
+
+    async def acquire_async(self, tokens: int) -> Permit:
+        """
+        Wait for a permit on the event loop.
+
+        Args:
+            tokens: Estimated prompt tokens of the request
+
+        Returns:
+            The permit
+        """
+        waiter = _Waiter(tokens, asyncio.get_running_loop())
+        delay = self._enqueue(waiter)
+        try:
+            while not waiter.granted:
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future),
+                                           min(delay or WAIT_CHECK_INTERVAL, WAIT_CHECK_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+                with self._lock:
+                    delay = self._dispatch()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        return Permit(self, tokens)
+
+    def _release(self, permit: Permit, error: Optional[BaseException]) -> None:
+        with self._lock:
+            self.active -= 1
+            if permit.prompt_tokens is not None:
+                correction = permit.prompt_tokens + permit.completion_tokens - permit.tokens
+                for _, tokens in self.buckets:
+                    if tokens is not None:
+                        tokens.take(correction)
+            if error is None:
+                self.concurrency.succeeded(time.monotonic() - permit.started, permit.completion_tokens)
+            elif is_throttled(error):
+                self.concurrency.throttled()
+                metrics.upstream_throttled.inc(model=self.model)
+            metrics.upstream_concurrency.set(self.concurrency.value, model=self.model)
+            self._dispatch()
+
+
+class RateLimiter:
+    """The limiters of every model, sharing the buckets of provider-wide limits."""
+
+    def __init__(self, limits: Optional[Dict[str, RateLimit]] = None,
+                 max_concurrency: int = DEFAULT_UPSTREAM_CONCURRENCY, share: float = 1.0):
+        """
+        Create the limiter.
+
+        Args:
+            limits: Limits by model, provider or ``*``
+            max_concurrency: Highest concurrent requests per model
+            share: Fraction of each limit this process may use, when several
+                processes send requests with the same API keys
+        """
+        self.limits = dict(limits or {})
+        self.max_concurrency = max_concurrency
+        self.share = share
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._models: Dict[str, ModelLimiter] = {}
+
+    def _bucket_pair(self, key: str) -> Tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        pair = self._buckets.get(key)
+        if pair is None:
+            limit = self.limits[key]
+            pair = self._buckets[key] = (
+                TokenBucket(limit.requests_per_minute * self.share) if limit.requests_per_minute else None,
+                TokenBucket(limit.tokens_per_minute * self.share) if limit.tokens_per_minute else None,
+            )
+        return pair
+
+    def limiter(self, model: str, provider: Optional[str] = None) -> ModelLimiter:
+        """
+        Return the limiter of a model, creating it on first use.
+
+        Args:
+            model: The model name, possibly prefixed with its provider
+            provider: The model's provider (taken from the model's prefix when None)
+
+        Returns:
+            The model's limiter
+        """
+        with self._lock:
+            limiter = self._models.get(model)
+            if limiter is None:
+                if provider is None and "/" in model:
+                    provider = model.split("/", 1)[0]
+                keys = [key for key in (model, provider, ANY_MODEL) if key and key in self.limits]
+                buckets = [self._bucket_pair(key) for key in dict.fromkeys(keys)]
+                limiter = self._models[model] = ModelLimiter(
+                    model, buckets, self.max_concurrency, self._lock
+                )
+            return limiter
+
+
+_limiter = RateLimiter()
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+def configure_rate_limits(limits: Optional[Dict[str, RateLimit]] = None,
+                          max_concurrency: int = DEFAULT_UPSTREAM_CONCURRENCY,
+                          share: float = 1.0) -> RateLimiter:
+    """
+    Replace the process's rate limiter.
+
+    Args:
+        limits: Limits by model, provider or ``*``
+        max_concurrency: Highest concurrent requests per model
+        share: Fraction of each limit this process may use
+
+    Returns:
+        The new rate limiter
+    """
+    global _limiter
+    _limiter = RateLimiter(limits, max_concurrency, share)
+    return _limiter
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process's rate limiter."""
+    return _limiter
+
+
+@contextmanager
+def limited(model: str, messages: List[Dict[str, Any]], provider: Optional[str] = None,
+            check: Optional[Callable[[], None]] = None) -> Iterator[Permit]:
+    """
+    Hold a permit for an upstream request sent from this thread during the block.
+
+    Args:
+        model: The model the request is sent to
+        messages: The request's chat messages
+        provider: The model's provider, if known
+        check: Called periodically while waiting; raise from it to stop waiting
+
+    Yields:
+        The permit, on which the block records the reported usage
+    """
+    permit = _limiter.limiter(model, provider).acquire(estimate_tokens(messages), check)
+    try:
+        yield permit
+    except BaseException as e:
+        permit.release(e)
+        raise
+    permit.release()
+
+
+@asynccontextmanager
+async def limited_async(model: str, messages: List[Dict[str, Any]],
+                        provider: Optional[str] = None) -> AsyncIterator[Permit]:
+    """
+    Hold a permit for an upstream request sent from the event loop during the block.
+
+    Args:
+        model: The model the request is sent to
+        messages: The request's chat messages
+        provider: The model's provider, if known
+
+    Yields:
+        The permit, on which the block records the reported usage
+    """
+    permit = await _limiter.limiter(model, provider).acquire_async(estimate_tokens(messages))
+    try:
+        yield permit
+    except BaseException as e:
+        permit.release(e)
+        raise
+    permit.release()
+
+
+class LimitedStream:
+    """A streamed response that gives its permit back once consumed, closed or dropped."""
+
+    def __init__(self, response: Any, permit: Permit):
+        """
+        Wrap a streamed response.
+
+        Args:
+            response: The provider's stream
+            permit: The permit held while the stream is read
+        """
+        self.response = response
+        self.permit = permit
+
+    def __iter__(self) -> Iterator[Any]:
+        try:
+            yield from self.response
+        except BaseException as e:
+            self.permit.release(e)
+            raise
+        self.permit.release()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.response, name)
+
+    def __del__(self):
+        self.permit.release()
+
+
+def install_aider_hooks() -> None:
+    """
+    Send every LLM request of Aider through the rate limiter.
+
+    Coder.send covers a session's requests until their stream is consumed.
+    Other requests, such as commit messages and chat summaries, are limited
+    where the Model sends them; a streamed one holds its permit until its
+    stream is consumed or closed.
+    """
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        _patch_aider()
+        _installed = True
+
+
+def _patch_aider() -> None:
+    from aider.coders import Coder
+    from aider.models import Model
+    from aider_mcp_server.capabilities.cancellation import current_token
+
+    original_send = Coder.send
+    original_completion = Model.send_completion
+
+    def provider_of(model) -> Optional[str]:
+        return (getattr(model, "info", None) or {}).get("litellm_provider")
+
+    def send(self, messages, model=None, functions=None):
+        model = model or self.main_model
+        token = current_token()
+        with limited(model.name, messages, provider_of(model),
+                     token.check if token is not None else None) as permit:
+            sent, received = self.message_tokens_sent, self.message_tokens_received
+            _local.sending = True
+            try:
+                result = yield from original_send(self, messages, model, functions)
+            finally:
+                _local.sending = False
+            permit.record(self.message_tokens_sent - sent, self.message_tokens_received - received)
+            return result
+
+    def send_completion(self, messages, functions, stream, temperature=None):
+        if getattr(_local, "sending", False):
+            return original_completion(self, messages, functions, stream, temperature)
+        if stream:
+            permit = _limiter.limiter(self.name, provider_of(self)).acquire(estimate_tokens(messages))
+            try:
+                hash_object, response = original_completion(self, messages, functions, stream, temperature)
+            except BaseException as e:
+                permit.release(e)
+                raise
+            return hash_object, LimitedStream(response, permit)
+        with limited(self.name, messages, provider_of(self)) as permit:
+            hash_object, response = original_completion(self, messages, functions, stream, temperature)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                permit.record(getattr(usage, "prompt_tokens", 0) or 0,
+                              getattr(usage, "completion_tokens", 0) or 0)
+            return hash_object, response
+
+    Coder.send = send
+    Model.send_completion = send_completion
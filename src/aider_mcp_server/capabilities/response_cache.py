@@ -0,0 +1,239 @@
+"""
+Content-addressed cache for LLM responses.
+
+Responses are keyed by a hash of the model, messages and request parameters.
+Entries live in an in-memory LRU tier and, optionally, in a SQLite tier on
+disk that survives restarts and is shared between processes. Every entry has
+a time to live, and both tiers are bounded in size. The disk tier is pruned
+every ``PRUNE_INTERVAL`` writes rather than on each one, and the async
+methods run its queries on a worker thread.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Default limits for the response cache
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_CACHE_TTL = 3600.0
+DEFAULT_DISK_CACHE_SIZE = 10000
+# Writes to the disk tier between removals of expired and least recently used entries
+PRUNE_INTERVAL = 100
+
+
+def response_cache_key(model: str, messages: List[Dict[str, Any]],
+                       params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build the cache key for a completion request.
+
+    Args:
+        model: The model name
+        messages: The chat messages sent to the model
+        params: Any other request parameters that affect the response
+
+    Returns:
+        A hex SHA-256 digest identifying the request
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params or {}},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier LRU cache of response text with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE, ttl_seconds: float = DEFAULT_CACHE_TTL,
+                 disk_path: Optional[str] = None, max_disk_entries: int = DEFAULT_DISK_CACHE_SIZE):
+        """
+        Create the cache.
+
+        Args:
+            max_entries: Maximum number of entries kept in memory
+            ttl_seconds: Default time to live of an entry
+            disk_path: Path of the SQLite database for the disk tier (optional)
+            max_disk_entries: Maximum number of entries kept on disk
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+        if disk_path:
+            directory = os.path.dirname(os.path.abspath(disk_path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._prune(time.time())
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._memory)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a response.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached response, or None on a miss or an expired entry
+        """
+        value = self._get_memory(key)
+        return value if value is not None else self._get_disk(key)
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """
+        Look up a response without blocking the event loop on the disk tier.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached response, or None on a miss or an expired entry
+        """
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        if self._db is None:
+            return self._get_disk(key)
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def put(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Store a response.
+
+        Args:
+            key: The cache key
+            value: The response text
+            ttl_seconds: Time to live of this entry (defaults to the cache TTL)
+        """
+        now, expires_at = self._remember_new(key, value, ttl_seconds)
+        self._put_disk(key, value, now, expires_at)
+
+    async def put_async(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Store a response without blocking the event loop on the disk tier.
+
+        Args:
+            key: The cache key
+            value: The response text
+            ttl_seconds: Time to live of this entry (defaults to the cache TTL)
+        """
+        now, expires_at = self._remember_new(key, value, ttl_seconds)
+        if self._db is not None:
+            await asyncio.to_thread(self._put_disk, key, value, now, expires_at)
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._memory[key]
+            return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._db.execute(
+                        "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                    )
+                    self._db.commit()
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def _remember_new(self, key: str, value: str, ttl_seconds: Optional[float]) -> Tuple[float, float]:
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._remember(key, expires_at, value)
+        return now, expires_at
+
+    def _put_disk(self, key: str, value: str, now: float, expires_at: float) -> None:
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            self._writes += 1
+            if self._writes >= PRUNE_INTERVAL:
+                self._prune(now)
+            self._db.commit()
+
+    def _prune(self, now: float) -> None:
+        # Both deletes walk an index; the disk tier may exceed its size by
+        # up to PRUNE_INTERVAL entries in between
+        self._writes = 0
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM responses WHERE accessed_at < ("
+            "SELECT accessed_at FROM responses ORDER BY accessed_at DESC LIMIT 1 OFFSET ?)",
+            (self.max_disk_entries - 1,),
+        )
+
+    def _remember(self, key: str, expires_at: float, value: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the hit and miss counters and the current memory tier size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+            }
+
+    def close(self) -> None:
+        """Close the disk tier."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,162 @@
+"""
+Checking whether a fast model's ai_code session can stand on its own.
+
+With a fast model configured, a session is first run with that model alone.
+Its result is accepted only if it passes local checks: the session
+succeeded, every edit Aider proposed was applied, it changed at least one
+file unless the model proposed no edits at all, each changed file still
+parses if it parsed before, and the server's validation command, when one
+is configured, succeeds on the changed files. Otherwise the edits are undone
+and the session runs again with the main models.
+"""
+
+import os
+import shlex
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Seconds the validation command may run before the attempt is rejected
+VALIDATE_TIMEOUT = 120.0
+# Characters of a failed validation command's output kept in the reason
+VALIDATE_OUTPUT_CHARS = 500
+
+
+@dataclass
+class Rejection:
+    """Why a fast model's session was not accepted."""
+    # One of "failed", "unapplied", "no_edits", "syntax" or "validation"
+    kind: str
+    message: str
+
+
+def parses(path: str, text: Optional[str]) -> Optional[bool]:
+    """
+    Check whether a file's text parses in its language.
+
+    Python is compiled; other languages are parsed with tree-sitter.
+
+    Args:
+        path: The file's path, which selects the language
+        text: The file's content, or None if the file does not exist
+
+    Returns:
+        Whether the text parses, or None when the language is not supported
+    """
+    if text is None:
+        return None
+    if path.endswith(".py"):
+        try:
+            compile(text, path, "exec", dont_inherit=True)
+            return True
+        except (SyntaxError, ValueError):
+            return False
+    from grep_ast import filename_to_lang
+    from grep_ast.tsl import get_parser
+
+    lang = filename_to_lang(path)
+    if not lang:
+        return None
+    try:
+        tree = get_parser(lang).parse(bytes(text, "utf-8"))
+    except Exception as e:
+        print(f"Error parsing {path}: {str(e)}", file=sys.stderr)
+        return None
+    return not tree.root_node.has_error
+
+
+def syntax_errors(before: Dict[str, Optional[str]], after: Dict[str, Optional[str]]) -> List[str]:
+    """
+    Find the changed files that no longer parse.
+
+    Files that did not parse before the session, or did not exist, are only
+    reported when they did not exist and do not parse now.
+
+    Args:
+        before: Mapping of relative path to content before the session, or None if missing
+        after: Mapping of relative path to content after the session, or None if missing
+
+    Returns:
+        Relative paths of the files the session broke
+    """
+    broken = []
+    for rel_path, text in after.items():
+        if parses(rel_path, text) is not False:
+            continue
+        old = before.get(rel_path)
+        if old is None or parses(rel_path, old) is not False:
+            broken.append(rel_path)
+    return broken
+
+
+def run_validate_cmd(command: str, cwd: str, rel_paths: List[str]) -> Optional[str]:
+    """
+    Run the validation command on the changed files.
+
+    Args:
+        command: The command; the changed files' paths are appended to it
+        cwd: Directory the command runs in, which the paths are relative to
+        rel_paths: The changed files that still exist
+
+    Returns:
+        Why the validation failed, or None when the command succeeded
+    """
+    try:
+        completed = subprocess.run(
+            shlex.split(command) + rel_paths,
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            timeout=VALIDATE_TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        return f"{command} timed out after {VALIDATE_TIMEOUT:g} seconds"
+    except (OSError, ValueError) as e:
+        return f"{command} could not run: {str(e)}"
+    if completed.returncode == 0:
+        return None
+    output = (completed.stdout + completed.stderr).strip()
+    if len(output) > VALIDATE_OUTPUT_CHARS:
+        output = "..." + output[-VALIDATE_OUTPUT_CHARS:]
+    message = f"{command} exited with status {completed.returncode}"
+    return f"{message}: {output}" if output else message
+
+
+def check_attempt(status: str, error: Optional[str], unapplied: bool,
+                  before: Dict[str, Optional[str]], after: Dict[str, Optional[str]],
+                  cwd: str, validate_cmd: Optional[str] = None,
+                  proposed: bool = True) -> Optional[Rejection]:
+    """
+    Decide whether a fast model's session can be accepted.
+
+    Args:
+        status: The session's status
+        error: The session's error, if any
+        unapplied: Whether Aider gave up on edits it could not apply
+        before: Mapping of relative path to content before the session, for the changed files
+        after: Mapping of relative path to content after the session, for the changed files
+        cwd: The session's working directory
+        validate_cmd: Command that must succeed on the changed files (optional)
+        proposed: Whether the model proposed any edits; a session that
+            changed nothing is accepted when it did not, such as one that
+            answered a question or found the change already made
+
+    Returns:
+        Why the session was rejected, or None when it is accepted
+    """
+    if status != "success":
+        return Rejection("failed", f"session ended with {status}: {error}")
+    if unapplied:
+        return Rejection("unapplied", "some edits could not be applied")
+    if not after:
+        return Rejection("no_edits", "no files were changed") if proposed else None
+    broken = syntax_errors(before, after)
+    if broken:
+        return Rejection("syntax", f"no longer parses: {', '.join(sorted(broken))}")
+    if validate_cmd:
+        existing = [rel_path for rel_path, text in after.items() if text is not None]
+        failure = run_validate_cmd(validate_cmd, os.path.abspath(cwd), existing)
+        if failure is not None:
+            return Rejection("validation", failure)
+    return None
@@ -0,0 +1,129 @@
+"""
+Token, cost and timing accounting for Aider sessions.
+
+Aider only reports usage as formatted text and resets its per-message
+counters after every LLM call. The hooks installed here wrap the Coder's
+LLM call, usage accounting and edit application, and add their figures to
+the ``SessionStats`` active on the current thread. Because the hooks are
+class-level, the editor Coder that architect mode creates internally is
+counted as part of the same session.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from collections.abc import Iterator
+from typing import Any, Dict, Optional
+
+from aider.coders import Coder
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+@dataclass
+class SessionStats:
+    """Usage and timing figures collected while a session runs."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    thinking_tokens: int = 0
+    cache_hit_tokens: int = 0
+    cache_write_tokens: int = 0
+    cost: float = 0.0
+    llm_calls: int = 0
+    llm_seconds: float = 0.0
+    apply_seconds: float = 0.0
+
+    def usage(self) -> Dict[str, Any]:
+        """Return the token and cost figures."""
+        stats = asdict(self)
+        del stats["llm_seconds"], stats["apply_seconds"]
+        return stats
+
+    @contextmanager
+    def track(self) -> Iterator["SessionStats"]:
+        """Collect figures from every Coder used on this thread inside the block."""
+        _install_hooks()
+        previous = getattr(_local, "stats", None)
+        _local.stats = self
+        try:
+            yield self
+        finally:
+            _local.stats = previous
+
+
+def current_stats() -> Optional[SessionStats]:
+    """Return the SessionStats being collected on this thread, if any."""
+    return getattr(_local, "stats", None)
+
+
+def _usage_detail(usage: Any, *path: str) -> int:
+    value = usage
+    for name in path:
+        value = getattr(value, name, None)
+        if value is None:
+            return 0
+    return value or 0
+
+
+def _install_hooks() -> None:
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        _patch_coder()
+        _installed = True
+
+
+def _patch_coder() -> None:
+    original_send = Coder.send
+    original_calculate = Coder.calculate_and_show_tokens_and_cost
+    original_apply = Coder.apply_updates
+
+    def send(self, *args, **kwargs):
+        stats = current_stats()
+        if stats is None:
+            return (yield from original_send(self, *args, **kwargs))
+        stats.llm_calls += 1
+        start = time.perf_counter()
+        try:
+            return (yield from original_send(self, *args, **kwargs))
+        finally:
+            stats.llm_seconds += time.perf_counter() - start
+
+    def calculate_and_show_tokens_and_cost(self, messages, completion=None):
+        stats = current_stats()
+        if stats is None:
+            return original_calculate(self, messages, completion)
+        sent, received, cost = self.message_tokens_sent, self.message_tokens_received, self.total_cost
+        result = original_calculate(self, messages, completion)
+        stats.prompt_tokens += self.message_tokens_sent - sent
+        stats.completion_tokens += self.message_tokens_received - received
+        stats.cost += self.total_cost - cost
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            stats.thinking_tokens += _usage_detail(usage, "completion_tokens_details", "reasoning_tokens")
+            # DeepSeek, Anthropic and OpenAI report cache reads differently
+            stats.cache_hit_tokens += (
+                _usage_detail(usage, "prompt_cache_hit_tokens")
+                or _usage_detail(usage, "cache_read_input_tokens")
+                or _usage_detail(usage, "prompt_tokens_details", "cached_tokens")
+            )
+            stats.cache_write_tokens += _usage_detail(usage, "cache_creation_input_tokens")
+        return result
+
+    def apply_updates(self):
+        stats = current_stats()
+        if stats is None:
+            return original_apply(self)
+        start = time.perf_counter()
+        try:
+            return original_apply(self)
+        finally:
+            stats.apply_seconds += time.perf_counter() - start
+
+    Coder.send = send
+    Coder.calculate_and_show_tokens_and_cost = calculate_and_show_tokens_and_cost
+    Coder.apply_updates = apply_updates
@@ -0,0 +1,234 @@
+"""
+Persistent index of repo map tags shared by every Aider session.
+
+Aider's repo map parses each source file with tree-sitter to extract the
+definitions and references it ranks. This module keeps those tags in a SQLite
+database under the working directory, keyed by path and validated by mtime,
+size and content hash, so a file is only parsed again when its content
+actually changes. The tags a repo map pass extracts are written in one
+transaction at the end of the pass, and only the most recently used entries
+are kept in memory. One index is shared per repository root by every session
+in the process, and the database is shared between processes.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from aider.repomap import RepoMap, Tag
+
+# Directory, relative to the repository root, holding the index database
+TAG_INDEX_DIR = ".aider-mcp"
+TAG_INDEX_FILE = "tags.db"
+# Number of files whose tags are kept in memory per index
+TAG_CACHE_SIZE = 10000
+
+
+class _Entry(NamedTuple):
+    mtime: float
+    size: int
+    digest: str
+    tags: List[Tag]
+
+
+def _file_digest(fname: str) -> str:
+    digest = hashlib.sha1()
+    with open(fname, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TagIndex:
+    """Tags for the files of one repository, cached in memory and on disk."""
+
+    def __init__(self, root: str, path: Optional[str] = None, max_entries: int = TAG_CACHE_SIZE):
+        """
+        Open or create the index for a repository.
+
+        Args:
+            root: The repository root
+            path: The database file (defaults to ``.aider-mcp/tags.db`` under ``root``)
+            max_entries: Files whose tags are kept in memory; the least
+                recently used are evicted and read back from the database
+        """
+        self.root = os.path.realpath(root)
+        self.path = path or os.path.join(self.root, TAG_INDEX_DIR, TAG_INDEX_FILE)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Entries not yet written to the database
+        self._pending: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tags ("
+            "path TEXT PRIMARY KEY, mtime REAL, size INTEGER, digest TEXT, data TEXT)"
+        )
+        self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _load(self, fname: str) -> Optional[_Entry]:
+        entry = self._pending.get(fname) or self._entries.get(fname)
+        if entry is not None:
+            self._remember(fname, entry)
+            return entry
+        row = self._db.execute(
+            "SELECT mtime, size, digest, data FROM tags WHERE path = ?", (fname,)
+        ).fetchone()
+        if row is None:
+            return None
+        mtime, size, digest, data = row
+        entry = _Entry(mtime, size, digest, [Tag(*tag) for tag in json.loads(data)])
+        self._remember(fname, entry)
+        return entry
+
+    def _remember(self, fname: str, entry: _Entry) -> None:
+        self._entries[fname] = entry
+        self._entries.move_to_end(fname)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _store(self, fname: str, entry: _Entry) -> None:
+        self._remember(fname, entry)
+        self._pending[fname] = entry
+
+    def flush(self) -> None:
+        """Write the entries added since the last flush to the database in one transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            rows = [
+                (fname, entry.mtime, entry.size, entry.digest, json.dumps(entry.tags))
+                for fname, entry in self._pending.items()
+            ]
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO tags (path, mtime, size, digest, data) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            self._pending.clear()
+
+    def get_tags(self, fname: str, parse: Callable[[], List[Tag]]) -> List[Tag]:
+        """
+        Return the tags for ``fname``, parsing it only if its content changed.
+
+        Args:
+            fname: Absolute path of the file
+            parse: Called to extract the tags when the index has no valid entry
+
+        Returns:
+            The list of tags for the file
+        """
+        try:
+            stat = os.stat(fname)
+        except OSError:
+            return []
+
+        with self._lock:
+            entry = self._load(fname)
+            if entry is not None and entry.mtime == stat.st_mtime and entry.size == stat.st_size:
+                self.hits += 1
+                return entry.tags
+
+            digest = _file_digest(fname)
+            if entry is not None and entry.digest == digest:
+                # Touched but unchanged, e.g. by a checkout; just refresh the stat
+                self.hits += 1
+                self._store(fname, entry._replace(mtime=stat.st_mtime, size=stat.st_size))
+                return entry.tags
+
+        # Parse outside the lock so sessions can index different files at once
+        tags = list(parse())
+        with self._lock:
+            self.misses += 1
+            self._store(fname, _Entry(stat.st_mtime, stat.st_size, digest, tags))
+        return tags
+
+    def attach(self, repo_map: RepoMap) -> RepoMap:
+        """
+        Route a RepoMap's tag lookups through this index.
+
+        The tags a ranking pass extracted are written when the pass ends.
+
+        Args:
+            repo_map: The RepoMap of a Coder working in this repository
+
+        Returns:
+            The same RepoMap
+        """
+        def get_tags(fname: str, rel_fname: str) -> List[Tag]:
+            return self.get_tags(fname, lambda: repo_map.get_tags_raw(fname, rel_fname))
+
+        original_ranked_tags = repo_map.get_ranked_tags
+
+        def get_ranked_tags(*args, **kwargs):
+            try:
+                return original_ranked_tags(*args, **kwargs)
+            finally:
+                self.flush()
+
+        repo_map.get_tags = get_tags
+        repo_map.get_ranked_tags = get_ranked_tags
+        return repo_map
+
+    def close(self) -> None:
+        """Write the pending entries and close the database connection."""
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+
+_indexes: Dict[str, TagIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_tag_index(root: str) -> TagIndex:
+    """
+    Get the shared TagIndex for a repository, opening it on first use.
+
+    Args:
+        root: The repository root
+
+    Returns:
+        The TagIndex shared by every session working in ``root``
+    """
+    root = os.path.realpath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = TagIndex(root)
+        return index
+
+
+def discard_tag_indexes(directory: str, predicate: Optional[Callable[[str], bool]] = None) -> int:
+    """
+    Close and forget the indexes of the repositories inside ``directory``.
+
+    Args:
+        directory: Directory whose repositories are no longer in use
+        predicate: Called with each repository root inside ``directory``;
+            only the indexes it returns True for are closed (optional)
+
+    Returns:
+        The number of indexes closed
+    """
+    directory = os.path.realpath(directory)
+    with _indexes_lock:
+        roots = [root for root in _indexes
+                 if (root == directory or root.startswith(directory + os.sep))
+                 and (predicate is None or predicate(root))]
+        indexes = [_indexes.pop(root) for root in roots]
+    for index in indexes:
+        index.close()
+    return len(indexes)
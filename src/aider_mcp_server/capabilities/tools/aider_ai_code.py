@@ -2,14 +2,40 @@
 Tool for running Aider AI coding tasks.
 """
 
+import json
 import os
-from typing import List, Optional, Dict
+import sys
+import time
+from typing import Any, List, Optional, Dict, Tuple
 from aider.models import Model
 from aider.io import InputOutput
 from aider.coders import Coder
 from dotenv import load_dotenv
 
-from aider_mcp_server.capabilities.data_types import AICodeParams
+from aider_mcp_server.capabilities.data_types import (
+    AICodeContext,
+    AICodeParams,
+    AICodeResult,
+    AICodeRouting,
+    AICodeTimings,
+    AICodeTrimmedFile,
+    AICodeUsage,
+)
+from aider_mcp_server.capabilities.session_stats import SessionStats
+from aider_mcp_server.capabilities.cancellation import CancelToken, SessionCancelled
+from aider_mcp_server.capabilities.file_snapshots import SessionFiles
+from aider_mcp_server.capabilities.context_budget import ContextPlan, plan_context
+from aider_mcp_server.capabilities.rate_limits import install_aider_hooks
+from aider_mcp_server.capabilities.routing import check_attempt
+from aider_mcp_server.capabilities.prompt_cache import stabilize_prompt_prefix
+from aider_mcp_server.capabilities.tag_index import get_tag_index
+from aider_mcp_server.capabilities.progress import ProgressIO, ProgressCallback
+from aider_mcp_server.capabilities.coder_cache import (
+    CoderKey,
+    reset_coder,
+    model_cache as _model_cache,
+    coder_pool as _coder_pool,
+)
 
 
 def add_thinking_budget_to_params(params: Dict, budget_tokens: int) -> Dict:
@@ -28,71 +54,200 @@ def add_thinking_budget_to_params(params: Dict, budget_tokens: int) -> Dict:
     return updated_params
 
 
-def build_ai_coding_assistant(params: AICodeParams) -> Coder:
+def build_model_extra_params(settings: Dict) -> Dict:
+    """
+    Build the extra model parameters requested by the session settings.
+    
+    Args:
+        settings: Settings for the Aider session
+        
+    Returns:
+        Extra parameters to set on the Model
+    """
+    extra_params = {}
+
+    # Add reasoning_effort if available
+    if settings.get("reasoning_effort"):
+        extra_params["reasoning_effort"] = settings["reasoning_effort"]
+
+    # Add thinking budget if specified
+    budget_tokens = settings.get("budget_tokens")
+    if budget_tokens is not None:
+        extra_params = add_thinking_budget_to_params(extra_params, budget_tokens)
+
+    return extra_params
+
+
+def coder_cache_key(params: AICodeParams) -> CoderKey:
+    """
+    Build the key identifying interchangeable Coder instances.
+    
+    Args:
+        params: Parameters for configuring the AI coding assistant
+        
+    Returns:
+        A hashable key covering everything fixed at Coder construction time
+    """
+    settings = params.settings or {}
+    use_architect = bool(params.architect and params.editor_model)
+    return CoderKey(
+        model=params.model,
+        editor_model=params.editor_model if use_architect else None,
+        edit_format="architect" if use_architect else None,
+        cwd=os.path.realpath(params.current_working_dir),
+        use_git=params.use_git,
+        auto_commits=settings.get("auto_commits", False),
+        suggest_shell_commands=settings.get("suggest_shell_commands", False),
+        detect_urls=settings.get("detect_urls", False),
+        tag_index=settings.get("tag_index", True),
+        cache_prompts=settings.get("cache_prompts", True),
+        model_extra_params=json.dumps(build_model_extra_params(settings), sort_keys=True),
+    )
+
+
+def get_model(params: AICodeParams) -> Model:
+    """
+    Get a configured Model, reusing a cached instance when possible.
+    
+    Args:
+        params: Parameters for configuring the AI coding assistant
+        
+    Returns:
+        Model configured for the session
+    """
+    use_architect = bool(params.architect and params.editor_model)
+    extra_params = build_model_extra_params(params.settings or {})
+
+    def create_model() -> Model:
+        if use_architect:
+            model = Model(model=params.model, editor_model=params.editor_model)
+        else:
+            model = Model(params.model)
+        model.extra_params = extra_params
+        return model
+
+    key = (
+        params.model,
+        params.editor_model if use_architect else None,
+        json.dumps(extra_params, sort_keys=True),
+    )
+    return _model_cache.get_or_create(key, create_model)
+
+
+def build_ai_coding_assistant(params: AICodeParams, io: Optional[InputOutput] = None) -> Coder:
     """
     Create and configure a Coder instance based on provided parameters.
     
+    An idle Coder with the same configuration is reused when available,
+    unless the ``reuse_coder`` setting is False. The repo map, when present,
+    reads tags from the shared persistent index unless ``tag_index`` is False.
+    Prompt caching is enabled for models that support it unless
+    ``cache_prompts`` is False, and the read-only files always form a stable
+    prefix of the prompt.
+    
     Args:
         params: Parameters for configuring the AI coding assistant
+        io: InputOutput for the session (defaults to a non-interactive terminal IO)
         
     Returns:
         Configured Coder instance
     """
     settings = params.settings or {}
-    auto_commits = settings.get("auto_commits", False)
-    suggest_shell_commands = settings.get("suggest_shell_commands", False)
-    detect_urls = settings.get("detect_urls", False)
+    if io is None:
+        io = InputOutput(yes=True)
 
-    # Extract budget_tokens setting once for both models
-    budget_tokens = settings.get("budget_tokens")
+    if settings.get("reuse_coder", True):
+        coder = _coder_pool.acquire(coder_cache_key(params))
+        if coder is not None:
+            return reset_coder(coder, io, params.editable_context, params.readonly_context)
 
-    if params.architect and params.editor_model:
-        model = Model(model=params.model, editor_model=params.editor_model)
-        extra_params = {}
+    model = get_model(params)
+    edit_format = "architect" if params.architect and params.editor_model else None
+    coder = Coder.create(
+        main_model=model,
+        edit_format=edit_format,
+        io=io,
+        fnames=params.editable_context,
+        read_only_fnames=params.readonly_context,
+        auto_commits=settings.get("auto_commits", False),
+        suggest_shell_commands=settings.get("suggest_shell_commands", False),
+        detect_urls=settings.get("detect_urls", False),
+        use_git=params.use_git,
+        cache_prompts=settings.get("cache_prompts", True),
+    )
+    stabilize_prompt_prefix(coder)
 
-        # Add reasoning_effort if available
-        if settings.get("reasoning_effort"):
-            extra_params["reasoning_effort"] = settings["reasoning_effort"]
+    # Share one persistent tag index per repository instead of re-parsing
+    if getattr(coder, "repo_map", None) and settings.get("tag_index", True):
+        get_tag_index(coder.root).attach(coder.repo_map)
 
-        # Add thinking budget if specified
-        if budget_tokens is not None:
-            extra_params = add_thinking_budget_to_params(extra_params, budget_tokens)
+    return coder
 
-        model.extra_params = extra_params
-        return Coder.create(
-            main_model=model,
-            edit_format="architect",
-            io=InputOutput(yes=True),
-            fnames=params.editable_context,
-            read_only_fnames=params.readonly_context,
-            auto_commits=auto_commits,
-            suggest_shell_commands=suggest_shell_commands,
-            detect_urls=detect_urls,
-            use_git=params.use_git,
-        )
-    else:
-        model = Model(params.model)
-        extra_params = {}
 
-        # Add reasoning_effort if available
-        if settings.get("reasoning_effort"):
-            extra_params["reasoning_effort"] = settings["reasoning_effort"]
+def release_ai_coding_assistant(coder: Coder, params: AICodeParams) -> None:
+    """
+    Return a Coder to the warm pool after a successful session.
+    
+    Args:
+        coder: The Coder used for the session
+        params: Parameters the Coder was built with
+    """
+    if (params.settings or {}).get("reuse_coder", True):
+        _coder_pool.release(coder_cache_key(params), coder)
 
-        # Add thinking budget if specified
-        if budget_tokens is not None:
-            extra_params = add_thinking_budget_to_params(extra_params, budget_tokens)
 
-        model.extra_params = extra_params
-        return Coder.create(
-            main_model=model,
-            io=InputOutput(yes=True),
-            fnames=params.editable_context,
-            read_only_fnames=params.readonly_context,
-            auto_commits=auto_commits,
-            suggest_shell_commands=suggest_shell_commands,
-            detect_urls=detect_urls,
-            use_git=params.use_git,
+def fit_context_budget(params: AICodeParams, files: SessionFiles, editable: Dict[str, str],
+                       readonly: Dict[str, str]) -> Optional[ContextPlan]:
+    """
+    Plan how the read-only files of a session fit its context budget.
+    
+    The budget is the ``context_budget`` setting, in tokens for the prompt
+    and all files; 0 turns planning off. By default it is a share of the
+    model's input window.
+    
+    Args:
+        params: Parameters of the session
+        files: The session's files, which the planner reads through their snapshots
+        editable: Mapping of relative path to absolute path of the editable files
+        readonly: Mapping of relative path to absolute path of the read-only files
+        
+    Returns:
+        The plan, or None when the files are sent as they are
+    """
+    try:
+        return plan_context(
+            get_model(params), params.prompt, editable, readonly,
+            (params.settings or {}).get("context_budget"),
+            lambda path: files.read_text(path, "utf-8"),
         )
+    except Exception as e:
+        print(f"Error planning the context budget: {str(e)}", file=sys.stderr)
+        return None
+
+
+def context_report(plan: Optional[ContextPlan]) -> Optional[AICodeContext]:
+    """
+    Describe the read-only files a plan trimmed, for the session result.
+    
+    Args:
+        plan: The session's plan, if any
+        
+    Returns:
+        The report, or None when every read-only file was sent in full
+    """
+    if plan is None or not plan.trimmed:
+        return None
+    return AICodeContext(
+        budget=plan.budget,
+        readonly_tokens=plan.readonly_tokens,
+        sent_tokens=plan.sent_tokens,
+        trimmed=[
+            AICodeTrimmedFile(
+                file=entry.file, action=entry.action, tokens=entry.tokens, sent_tokens=entry.sent_tokens
+            )
+            for entry in plan.trimmed
+        ],
+    )
 
 
 def ai_code(coder: Coder, params: AICodeParams) -> None:
@@ -107,6 +262,127 @@ def ai_code(coder: Coder, params: AICodeParams) -> None:
     coder.run(params.prompt)
 
 
+def speculates(params: AICodeParams, fast_model: Optional[str]) -> bool:
+    """
+    Decide whether a session is tried with the fast model before the main models.
+    
+    Args:
+        params: Parameters of the session with the main models
+        fast_model: The fast model, if one is configured
+        
+    Returns:
+        True unless there is no distinct fast model, the ``speculative``
+        setting is False, or edits are committed, as commits cannot be undone
+    """
+    settings = params.settings or {}
+    if not fast_model or not settings.get("speculative", True) or settings.get("auto_commits", False):
+        return False
+    return params.architect or fast_model != params.model
+
+
+def run_session(
+    params: AICodeParams,
+    editable_paths: Dict[str, str],
+    readonly_paths: Dict[str, str],
+    progress_callback: Optional[ProgressCallback],
+    token: CancelToken,
+    started: float
+) -> Tuple[AICodeResult, SessionFiles, bool, bool]:
+    """
+    Run one Aider session and describe its outcome.
+    
+    Args:
+        params: Parameters of the session
+        editable_paths: Mapping of relative path to absolute path of the editable files
+        readonly_paths: Mapping of relative path to absolute path of the read-only files
+        progress_callback: Optional callback receiving the session's events
+        token: Token the session is cancelled with
+        started: When the session started, for its timings
+        
+    Returns:
+        The result, the session's files, whether Aider gave up on edits it
+        could not apply, and whether the model proposed any edits
+    """
+    files = SessionFiles(editable_paths, readonly_paths)
+    plan = fit_context_budget(params, files, editable_paths, readonly_paths)
+    if plan is not None:
+        readonly_paths = {rel_path: readonly_paths[rel_path] for rel_path in plan.kept}
+        params.readonly_context = list(readonly_paths.values())
+        files.replace(plan.outlines)
+        warning = plan.warning()
+        if warning:
+            # The default budget applies to every session, so say what it left out
+            print(f"Warning: {warning}", file=sys.stderr)
+            if progress_callback:
+                progress_callback({"type": "log", "level": "warning", "message": warning})
+    stats = SessionStats()
+    status = "success"
+    error = None
+    setup_seconds = 0.0
+    rolled_back = []
+    unapplied = False
+    proposed = False
+    
+    try:
+        with stats.track(), token.activate(), files.track():
+            # Installed after the accounting hooks, so time spent waiting for
+            # the rate limiter is not counted as LLM time
+            install_aider_hooks()
+            token.check()
+            # Create coder instance
+            io = ProgressIO(progress_callback) if progress_callback else None
+            coder = build_ai_coding_assistant(params, io=io)
+            setup_seconds = time.perf_counter() - started
+            
+            # Run AI coding
+            ai_code(coder, params)
+            # Aider swallows the read error of a stream closed by cancel()
+            if token.reason is not None:
+                raise SessionCancelled(token.reason)
+            # Left set when Aider ran out of reflections on failed edits
+            unapplied = bool(coder.reflected_message)
+            proposed = bool(coder.aider_edited_files)
+        
+        # Keep the Coder warm for the next session with the same configuration
+        release_ai_coding_assistant(coder, params)
+    except SessionCancelled as e:
+        status = e.reason
+        error = "Session timed out" if e.reason == "timeout" else "Session cancelled"
+        print(f"Stopped code_with_aider: {error}", file=sys.stderr)
+    except Exception as e:
+        print(f"Error in code_with_aider: {str(e)}", file=sys.stderr)
+        status = "failure"
+        error = str(e)
+    
+    diffs = files.diffs()
+    if status in ("cancelled", "timeout"):
+        # Do not leave a half-applied set of edits behind, including the
+        # files Aider created or wrote outside the editable set
+        if diffs:
+            rolled_back = files.restore(list(diffs))
+            diffs = files.diffs()
+        rolled_back += [
+            os.path.relpath(path, params.current_working_dir)
+            for path in files.restore_outside()
+        ]
+    result = AICodeResult(
+        status=status,
+        modified_files=list(diffs),
+        diffs=diffs,
+        rolled_back_files=rolled_back,
+        usage=AICodeUsage(**stats.usage()),
+        timings=AICodeTimings(
+            setup_seconds=setup_seconds,
+            llm_seconds=stats.llm_seconds,
+            apply_seconds=stats.apply_seconds,
+            total_seconds=time.perf_counter() - started,
+        ),
+        context=context_report(plan),
+        error=error,
+    )
+    return result, files, unapplied, proposed
+
+
 def code_with_aider(
     ai_coding_prompt: str, 
     relative_editable_files: List[str], 
@@ -114,11 +390,22 @@ def code_with_aider(
     settings: Optional[Dict] = None,
     editor_model: str = None,
     architect_model: Optional[str] = None,
-    current_working_dir: str = "."
-) -> str:
+    current_working_dir: str = ".",
+    progress_callback: Optional[ProgressCallback] = None,
+    timeout: Optional[float] = None,
+    cancel_token: Optional[CancelToken] = None,
+    fast_model: Optional[str] = None,
+    validate_cmd: Optional[str] = None
+) -> Dict[str, Any]:
     """
     Run one-shot Aider based AI coding task.
     
+    With a fast model, the task is first run with that model alone. Its
+    edits are kept if they pass the checks of ``routing.check_attempt``;
+    otherwise they are undone and the task runs again with the main models.
+    The ``fast_model`` setting overrides the fast model, and a
+    ``speculative`` setting of False skips it.
+    
     Args:
         ai_coding_prompt: The prompt for the AI coding task
         relative_editable_files: List of files that can be edited
@@ -127,10 +414,23 @@ def code_with_aider(
         editor_model: Model to use for editing
         architect_model: Model to use for architecture (optional)
         current_working_dir: Current working directory
+        progress_callback: Optional callback receiving streamed tokens, applied
+            edits and log messages as event dicts while the session runs
+        timeout: Seconds after which the session is stopped (optional)
+        cancel_token: Token another thread can cancel the session with; takes
+            the place of ``timeout``
+        fast_model: Model tried before the main models (optional)
+        validate_cmd: Command the fast model's changed files must pass, such
+            as a linter; the files' paths are appended to it (optional)
         
     Returns:
-        A string indicating success or failure
+        An AICodeResult dict with the status, modified files, per-file diffs,
+        token usage and cost, phase timings, and how the task was routed. A
+        cancelled or timed out session has its edits rolled back and lists
+        the restored files.
     """
+    started = time.perf_counter()
+
     # Load environment variables
     load_dotenv()
     
@@ -158,17 +458,62 @@ def code_with_aider(
         editable_context=editable_files,
         readonly_context=readonly_files,
         settings=settings,
-        use_git=settings.get("use_git", False) if settings else False
+        use_git=settings.get("use_git", False) if settings else False,
+        current_working_dir=current_working_dir
     )
     
-    try:
-        # Create coder instance
-        coder = build_ai_coding_assistant(params)
-        
-        # Run AI coding
-        ai_code(coder, params)
-        
-        return "success"
-    except Exception as e:
-        print(f"Error in code_with_aider: {str(e)}")
-        return "failure"
\ No newline at end of file
+    editable_paths = dict(zip(relative_editable_files, editable_files))
+    readonly_paths = dict(zip(relative_readonly_files or [], readonly_files))
+    token = cancel_token or CancelToken(timeout)
+    fast_model = (settings or {}).get("fast_model", fast_model)
+    routing = None
+    escalated = None
+    
+    if speculates(params, fast_model):
+        fast_params = params.model_copy(update={"architect": False, "model": fast_model, "editor_model": None})
+        result, files, unapplied, proposed = run_session(
+            fast_params, editable_paths, readonly_paths, progress_callback, token, started
+        )
+        changes = files.changed()
+        rejection = check_attempt(
+            result.status, result.error, unapplied, *files.texts(changes),
+            current_working_dir, validate_cmd, proposed
+        )
+        routing = AICodeRouting(
+            fast_model=fast_model,
+            accepted=rejection is None,
+            reason=rejection.kind if rejection else None,
+            detail=rejection.message if rejection else None,
+            fast_seconds=result.timings.total_seconds,
+            fast_usage=result.usage,
+        )
+        if rejection is None or result.status in ("cancelled", "timeout"):
+            result.routing = routing
+            return result.model_dump()
+        print(f"Escalating from {fast_model} to {model_to_use}: {rejection.message}", file=sys.stderr)
+        if progress_callback:
+            progress_callback({
+                "type": "log",
+                "level": "info",
+                "message": f"Escalating to {model_to_use}: {rejection.message}",
+            })
+        # The main models start from the files as they were, without the
+        # files the fast model created
+        files.restore(list(changes))
+        files.restore_outside()
+        escalated = result
+    
+    result, files, unapplied, proposed = run_session(
+        params, editable_paths, readonly_paths, progress_callback, token, time.perf_counter()
+    )
+    if escalated is not None:
+        result.usage = AICodeUsage(**{
+            name: getattr(escalated.usage, name) + getattr(result.usage, name)
+            for name in AICodeUsage.model_fields
+        })
+        result.timings.setup_seconds += escalated.timings.setup_seconds
+        result.timings.llm_seconds += escalated.timings.llm_seconds
+        result.timings.apply_seconds += escalated.timings.apply_seconds
+        result.timings.total_seconds = time.perf_counter() - started
+    result.routing = routing
+    return result.model_dump()
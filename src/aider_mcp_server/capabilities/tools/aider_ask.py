@@ -1,35 +1,197 @@
-"""Utility to ask a simple question using an LLM model."""
+"""Utility to ask a simple question using an LLM model.
+
+The openai package is imported on first use, since it takes a noticeable
+part of a second to import and is not needed to start the server.
+"""
 
 from __future__ import annotations
 
 import os
+from typing import TYPE_CHECKING, Awaitable, Callable
 from dotenv import load_dotenv
 
-try:
-    from openai import OpenAI
-except Exception:  # pragma: no cover - openai may not be installed
-    OpenAI = None  # type: ignore
+from aider_mcp_server.capabilities.rate_limits import CHARS_PER_TOKEN, limited, limited_async
+from aider_mcp_server.capabilities.response_cache import (
+    ResponseCache,
+    response_cache_key,
+    DEFAULT_CACHE_TTL,
+    DEFAULT_DISK_CACHE_SIZE,
+)
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Default size of the async client's connection pool
+DEFAULT_MAX_CONNECTIONS = 100
+
+# Async callback receiving each chunk of a streamed answer
+ChunkCallback = Callable[[str], Awaitable[None]]
+
+# Optional response cache, disabled until configure_response_cache is called
+_response_cache: ResponseCache | None = None
+
+
+def configure_response_cache(max_entries: int, ttl_seconds: float = DEFAULT_CACHE_TTL,
+                             disk_path: str | None = None,
+                             max_disk_entries: int = DEFAULT_DISK_CACHE_SIZE) -> ResponseCache | None:
+    """Enable the response cache, or disable it when both tiers are turned off."""
+
+    global _response_cache
+    if _response_cache is not None:
+        _response_cache.close()
+    if max_entries <= 0 and not disk_path:
+        _response_cache = None
+    else:
+        _response_cache = ResponseCache(
+            max_entries=max_entries,
+            ttl_seconds=ttl_seconds,
+            disk_path=disk_path,
+            max_disk_entries=max_disk_entries,
+        )
+    return _response_cache
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Return the configured response cache, if any."""
+
+    return _response_cache
+
+
+def create_async_client(max_connections: int = DEFAULT_MAX_CONNECTIONS) -> AsyncOpenAI | None:
+    """Create a long-lived AsyncOpenAI client with a keep-alive connection pool.
+
+    Returns None when no OpenAI API key is configured.
+    """
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+    try:
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    except ImportError:  # pragma: no cover - openai may not be installed
+        return None
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+    )
+    return AsyncOpenAI(api_key=api_key, http_client=http_client)
+
+
+def _default_model(model: str | None) -> str:
+    return model or os.getenv("OPENAI_DEFAULT_MODEL", "gpt-4o")
+
+
+async def ask_question_async(prompt: str, model: str | None = None, use_cache: bool = True,
+                             client: AsyncOpenAI | None = None,
+                             on_chunk: ChunkCallback | None = None) -> str:
+    """Send ``prompt`` to the model on the event loop using a shared async client.
+
+    ``client`` is normally the server's pooled client; it is required unless
+    the answer comes from the response cache. When ``on_chunk`` is given the
+    completion is streamed and each chunk is passed to it as it arrives; a
+    cached answer is passed as a single chunk. Cancelling the calling task
+    closes the upstream response and returns its connection to the pool.
+    """
+
+    model = _default_model(model)
+    messages = [{"role": "user", "content": prompt}]
+    cache = _response_cache if use_cache else None
+    key = response_cache_key(model, messages) if cache is not None else None
+    if cache is not None:
+        cached = await cache.get_async(key)
+        if cached is not None:
+            if on_chunk is not None:
+                await on_chunk(cached)
+            return cached
+
+    if client is None:
+        raise RuntimeError("OPENAI_API_KEY environment variable not set")
+
+    async with limited_async(model, messages, "openai") as permit:
+        if on_chunk is None:
+            resp = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+            )
+            _record_usage(permit, resp)
+            content = resp.choices[0].message.content
+        else:
+            content = await _stream_completion(client, model, messages, on_chunk)
+            # Streamed completions carry no usage unless asked for
+            permit.record(permit.tokens, len(content) // CHARS_PER_TOKEN)
+    answer = content.strip() if content else ""
+    if cache is not None and answer:
+        await cache.put_async(key, answer)
+    return answer
+
 
+def _record_usage(permit, resp) -> None:
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        permit.record(usage.prompt_tokens or 0, usage.completion_tokens or 0)
 
-def ask_question(prompt: str, model: str | None = None) -> str:
-    """Send ``prompt`` to the specified model and return the response text."""
+
+async def _stream_completion(client: AsyncOpenAI, model: str, messages: list,
+                             on_chunk: ChunkCallback) -> str:
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+    )
+    parts = []
+    # Leaving the block closes the response, including on cancellation
+    async with stream:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                parts.append(text)
+                await on_chunk(text)
+    return "".join(parts)
+
+
+def ask_question(prompt: str, model: str | None = None, use_cache: bool = True) -> str:
+    """Send ``prompt`` to the specified model and return the response text.
+
+    Identical questions are answered from the response cache when it is
+    configured and ``use_cache`` is true.
+    """
 
     load_dotenv()
-    if model is None:
-        model = os.getenv("OPENAI_DEFAULT_MODEL", "gpt-4o")
+    model = _default_model(model)
+
+    messages = [{"role": "user", "content": prompt}]
+    cache = _response_cache if use_cache else None
+    key = response_cache_key(model, messages) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
 
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY environment variable not set")
 
-    if OpenAI is None:
+    try:
+        from openai import OpenAI
+    except ImportError:
         raise RuntimeError("openai package is not available")
 
     client = OpenAI(api_key=api_key)
 
-    resp = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-    )
+    with limited(model, messages, "openai") as permit:
+        resp = client.chat.completions.create(
+            model=model,
+            messages=messages,
+        )
+        _record_usage(permit, resp)
     content = resp.choices[0].message.content
-    return content.strip() if content else ""
+    answer = content.strip() if content else ""
+    if cache is not None and answer:
+        cache.put(key, answer)
+    return answer
@@ -2,23 +2,28 @@
 Tool for listing available Aider models.
 """
 
-from typing import List
-from aider.models import fuzzy_match_models
+import sys
+from typing import Any, List, Optional
+from aider_mcp_server.capabilities.model_index import get_model_index
 
 
-def list_models(substring: str) -> List[str]:
+def list_models(substring: str, limit: Optional[int] = None, offset: int = 0,
+                include_metadata: bool = False) -> List[Any]:
     """
     List available Aider models filtered by substring.
-    
+
     Args:
         substring: Substring to filter models by
-        
+        limit: Maximum number of models to return (all when None)
+        offset: Number of ranked matches to skip
+        include_metadata: Return dicts with each model's provider, context
+            window and prices instead of plain names
+
     Returns:
-        List of matching model names
+        List of matching model names, best matches first
     """
     try:
-        matches = fuzzy_match_models(substring)
-        return matches
+        return get_model_index().search(substring, limit, offset, include_metadata)
     except Exception as e:
-        print(f"Error in list_models: {str(e)}")
-        return []
\ No newline at end of file
+        print(f"Error in list_models: {str(e)}", file=sys.stderr)
+        return []
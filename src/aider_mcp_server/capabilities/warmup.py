@@ -0,0 +1,119 @@
+"""
+Deferred loading of the tools' heavy dependencies.
+
+Aider, litellm and openai take seconds to import, and stdio clients start one
+server per editor window, so the server starts with only light modules
+loaded. The modules behind the tools are imported on first use, off the
+event loop, or ahead of time by a background pre-warm.
+"""
+
+import asyncio
+import importlib
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+from aider_mcp_server.capabilities.model_index import get_model_index
+
+# Modules that pull in aider, litellm or openai, imported on first use
+TOOL_MODULES = (
+    "aider_mcp_server.capabilities.tools.aider_ai_code",
+    "openai",
+)
+
+# Seconds to wait after startup before pre-warming, so the import work does
+# not compete with the initialize handshake for the GIL
+DEFAULT_PREWARM_DELAY = 0.5
+
+_loaded = threading.Event()
+_load_lock = threading.Lock()
+
+
+def tools_loaded() -> bool:
+    """Return True once the tool modules have been imported."""
+    return _loaded.is_set()
+
+
+def load_tools() -> None:
+    """Import the tool modules; safe to call from any thread and cheap once done."""
+    if _loaded.is_set():
+        return
+    with _load_lock:
+        if _loaded.is_set():
+            return
+        for name in TOOL_MODULES:
+            importlib.import_module(name)
+        _loaded.set()
+
+
+async def ensure_tools_loaded() -> None:
+    """Import the tool modules on a worker thread, without blocking the event loop."""
+    if not _loaded.is_set():
+        await asyncio.to_thread(load_tools)
+
+
+def prewarm() -> None:
+    """Build the model index and import the tool modules."""
+    try:
+        # The index imports aider.models and litellm, the bulk of the work,
+        # and is what the first get_models call waits on
+        get_model_index().warm()
+        load_tools()
+    except Exception as e:
+        print(f"Error pre-warming tools: {str(e)}", file=sys.stderr)
+
+
+def warm_worker(editor_model: str, architect_model: Optional[str] = None,
+                coder_cache_size: Optional[int] = None,
+                rate_limits: Optional[Dict[str, Any]] = None,
+                fast_model: Optional[str] = None) -> None:
+    """
+    Prepare a worker process for sessions: size its caches, set its rate limits and resolve the server's models.
+
+    Args:
+        editor_model: The server's editor model
+        architect_model: The server's architect model (optional)
+        coder_cache_size: Number of warm models and coders the worker keeps
+            (the default size when None)
+        rate_limits: Keyword arguments of ``configure_rate_limits`` for the
+            worker (the defaults when None)
+        fast_model: The server's fast model, resolved as well (optional)
+    """
+    from aider_mcp_server.capabilities.coder_cache import configure_coder_cache
+    from aider_mcp_server.capabilities.rate_limits import configure_rate_limits
+
+    if coder_cache_size is not None:
+        configure_coder_cache(coder_cache_size, coder_cache_size)
+    if rate_limits is not None:
+        configure_rate_limits(**rate_limits)
+    load_tools()
+    from aider_mcp_server.capabilities.data_types import AICodeParams
+    from aider_mcp_server.capabilities.tools.aider_ai_code import get_model
+
+    # The same Model cache key a session with default settings looks up
+    get_model(AICodeParams(
+        architect=architect_model is not None,
+        prompt="",
+        model=architect_model or editor_model,
+        editor_model=editor_model if architect_model else None,
+        editable_context=[],
+    ))
+    if fast_model:
+        get_model(AICodeParams(architect=False, prompt="", model=fast_model, editable_context=[]))
+
+
+def start_prewarm(delay: float = DEFAULT_PREWARM_DELAY) -> threading.Thread:
+    """
+    Pre-warm the tools on a background thread.
+
+    Args:
+        delay: Seconds to wait before starting
+
+    Returns:
+        The started daemon thread
+    """
+    thread = threading.Timer(delay, prewarm)
+    thread.name = "tool-prewarm"
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,166 @@
+"""
+Bounded worker pool for running blocking Aider sessions off the event loop.
+"""
+
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from collections.abc import AsyncIterator
+from functools import partial
+from typing import Any, Callable, Optional, Tuple
+
+from aider_mcp_server.capabilities.process_pool import (
+    DEFAULT_MAX_TASKS_PER_WORKER,
+    DEFAULT_MAX_WORKER_MEMORY_MB,
+    PreforkPool,
+)
+from aider_mcp_server.capabilities.warmup import TOOL_MODULES
+
+# Default limits for the ai_code worker pool
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUE = 16
+WORKER_MODES = ("thread", "process")
+
+
+class WorkerPoolBusyError(RuntimeError):
+    """Raised when the worker pool and its wait queue are both full."""
+
+
+class WorkerPool:
+    """
+    Runs blocking callables on a thread or process pool with admission control.
+
+    At most ``max_workers`` callables execute at once and at most ``max_queue``
+    more may wait for a free worker. Anything beyond that is rejected
+    immediately with ``WorkerPoolBusyError`` instead of queueing without bound.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS,
+                 max_queue: int = DEFAULT_MAX_QUEUE, mode: str = "thread",
+                 max_tasks_per_worker: int = DEFAULT_MAX_TASKS_PER_WORKER,
+                 max_worker_memory_mb: int = DEFAULT_MAX_WORKER_MEMORY_MB,
+                 initializer: Optional[Callable[..., None]] = None, initargs: Tuple = ()):
+        """
+        Create the worker pool.
+
+        Args:
+            max_workers: Maximum number of callables running concurrently
+            max_queue: Maximum number of admitted callables waiting for a worker
+            mode: Either "thread" or "process"
+            max_tasks_per_worker: In process mode, callables a worker process
+                runs before it is replaced (0 for no limit)
+            max_worker_memory_mb: In process mode, resident memory in MiB above
+                which a worker process is replaced (0 for no limit)
+            initializer: In process mode, called in each new worker process
+            initargs: Arguments of ``initializer``
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        if mode not in WORKER_MODES:
+            raise ValueError(f"mode must be one of {', '.join(WORKER_MODES)}")
+
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.mode = mode
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_worker_memory_mb = max_worker_memory_mb
+        self.initializer = initializer
+        self.initargs = initargs
+        self._pending = 0
+        self._executor = self._create_executor()
+
+    def _create_executor(self) -> Executor:
+        if self.mode == "process":
+            return PreforkPool(
+                self.max_workers,
+                max_tasks=self.max_tasks_per_worker,
+                max_memory_mb=self.max_worker_memory_mb,
+                initializer=self.initializer,
+                initargs=self.initargs,
+                preload=TOOL_MODULES,
+            )
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="aider-worker")
+
+    @property
+    def capacity(self) -> int:
+        """Total number of callables that may be admitted at once."""
+        return self.max_workers + self.max_queue
+
+    @property
+    def pending(self) -> int:
+        """Number of admitted callables, running or waiting."""
+        return self._pending
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of admitted callables waiting for a free worker."""
+        return max(0, self._pending - self.max_workers)
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        Reserve a slot in the pool for the duration of the block.
+
+        Raises:
+            WorkerPoolBusyError: If every worker and queue slot is taken
+        """
+        if self._pending >= self.capacity:
+            raise WorkerPoolBusyError(
+                f"Server busy: {self.max_workers} sessions running and "
+                f"{self.max_queue} queued"
+            )
+        self._pending += 1
+        try:
+            yield
+        finally:
+            self._pending -= 1
+
+    async def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run ``fn`` on the executor without admission control.
+
+        Callers are expected to hold a slot from ``admit()``.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Admit and run ``fn`` on the executor.
+
+        Raises:
+            WorkerPoolBusyError: If every worker and queue slot is taken
+        """
+        async with self.admit():
+            return await self.submit(fn, *args, **kwargs)
+
+    def interrupt(self, token: Any) -> None:
+        """
+        Pass a CancelToken's cancellation on to the worker process running its session.
+
+        In thread mode the session holds the token itself, so nothing is sent.
+
+        Args:
+            token: The cancelled CancelToken given to the session
+        """
+        if self.mode == "process" and token.reason is not None:
+            self._executor.interrupt(token.id, token.reason)
+
+    def broadcast(self, fn: Callable[..., Any], *args: Any) -> None:
+        """
+        Run ``fn(*args)`` in every worker process, to change their process-wide state.
+
+        In thread mode the workers share this process's state, so nothing is sent.
+
+        Args:
+            fn: Picklable callable, run beside the worker's current session
+            *args: Its picklable arguments
+        """
+        if self.mode == "process":
+            self._executor.broadcast(fn, *args)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down the underlying executor."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,248 @@
+"""
+Registry of the workspaces one server serves.
+
+A workspace is a named directory that ai_code requests run in. The server's
+``--cwd`` is registered as the "default" workspace, more can be registered
+at startup or, inside the configured workspace roots, by clients. Each
+workspace limits how many of its sessions run at once, so one busy
+repository cannot take every worker. Once a workspace has been idle for
+``idle_timeout`` seconds its warm Coders and tag indexes are dropped; the
+registration itself stays, and the next session warms it up again. In
+process mode the worker processes that hold the Coders drop them as well.
+"""
+
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from aider_mcp_server.capabilities.worktree_pool import checkout_path
+
+DEFAULT_WORKSPACE = "default"
+# Seconds without sessions after which a workspace's warm state is dropped
+DEFAULT_IDLE_TIMEOUT = 600.0
+WORKSPACE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+
+class WorkspaceError(ValueError):
+    """Raised for unknown workspaces and invalid registrations."""
+
+
+@dataclass
+class Workspace:
+    """A registered workspace and its session bookkeeping."""
+    name: str
+    path: str
+    max_sessions: int
+    active: int = 0
+    warm: bool = False
+    last_used: float = field(default_factory=time.monotonic)
+    quota: asyncio.Semaphore = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.quota = asyncio.Semaphore(self.max_sessions)
+
+    def info(self) -> Dict[str, Any]:
+        """Return the workspace's public description."""
+        return {
+            "name": self.name,
+            "path": self.path,
+            "max_sessions": self.max_sessions,
+            "active_sessions": self.active,
+            "warm": self.warm,
+        }
+
+
+class WorkspaceRegistry:
+    """
+    The workspaces of a server, shared by every client connection.
+
+    Registration may happen from any thread; sessions run on the event loop.
+    """
+
+    def __init__(self, default_path: str, max_sessions: int,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, roots: Optional[List[str]] = None):
+        """
+        Create the registry with the default workspace.
+
+        Args:
+            default_path: Directory of the "default" workspace
+            max_sessions: Default number of sessions a workspace may run at once
+            idle_timeout: Seconds without sessions after which a workspace's
+                warm state is dropped
+            roots: Directories inside which clients may register workspaces;
+                clients cannot register any when empty
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.roots = [os.path.realpath(root) for root in roots or []]
+        self._workspaces: Dict[str, Workspace] = {}
+        self._lock = threading.Lock()
+        self.register(DEFAULT_WORKSPACE, default_path)
+
+    def register(self, name: str, path: str, max_sessions: Optional[int] = None,
+                 from_client: bool = False) -> Workspace:
+        """
+        Register a workspace, or update the path and quota of an existing one.
+
+        Args:
+            name: Name requests use to select the workspace
+            path: The workspace directory
+            max_sessions: Number of its sessions that may run at once
+                (defaults to the registry's limit)
+            from_client: The request comes from a client, so ``path`` must be
+                inside one of the workspace roots and the default workspace
+                cannot be replaced
+
+        Returns:
+            The registered Workspace
+        """
+        if not WORKSPACE_NAME.match(name):
+            raise WorkspaceError(f"Invalid workspace name: {name!r}")
+        path = os.path.realpath(path)
+        if not os.path.isdir(path):
+            raise WorkspaceError(f"Workspace directory does not exist: {path}")
+        if from_client:
+            if name == DEFAULT_WORKSPACE:
+                raise WorkspaceError("The default workspace cannot be replaced")
+            if not any(path == root or path.startswith(root + os.sep) for root in self.roots):
+                raise WorkspaceError(f"Workspace directory is outside the workspace roots: {path}")
+        limit = max(1, max_sessions or self.max_sessions)
+
+        with self._lock:
+            workspace = self._workspaces.get(name)
+            if workspace is not None and workspace.path == path and workspace.max_sessions == limit:
+                return workspace
+            if workspace is not None and workspace.active:
+                raise WorkspaceError(f"Workspace {name} has sessions running")
+            workspace = self._workspaces[name] = Workspace(name, path, limit)
+            return workspace
+
+    def get(self, name: Optional[str] = None) -> Workspace:
+        """
+        Look up a workspace by name.
+
+        Args:
+            name: The workspace name (the default workspace when None)
+
+        Returns:
+            The Workspace
+        """
+        with self._lock:
+            workspace = self._workspaces.get(name or DEFAULT_WORKSPACE)
+        if workspace is None:
+            raise WorkspaceError(f"Unknown workspace: {name}")
+        return workspace
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Return the descriptions of every workspace, sorted by name."""
+        with self._lock:
+            workspaces = sorted(self._workspaces.values(), key=lambda w: w.name)
+        return [workspace.info() for workspace in workspaces]
+
+    @asynccontextmanager
+    async def session(self, name: Optional[str] = None) -> AsyncIterator[Workspace]:
+        """
+        Run a session in a workspace, waiting while its quota is used up.
+
+        Args:
+            name: The workspace name (the default workspace when None)
+
+        Yields:
+            The Workspace
+        """
+        workspace = self.get(name)
+        workspace.active += 1
+        try:
+            async with workspace.quota:
+                workspace.warm = True
+                yield workspace
+        finally:
+            workspace.active -= 1
+            workspace.last_used = time.monotonic()
+
+    def evict_idle(self, worker_pool: Any = None) -> List[str]:
+        """
+        Drop the warm state of the workspaces idle for longer than ``idle_timeout``.
+
+        Args:
+            worker_pool: The WorkerPool the sessions ran on; in process mode
+                its worker processes, which hold the Coders, drop theirs too
+
+        Returns:
+            The names of the evicted workspaces
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                workspace for workspace in self._workspaces.values()
+                if workspace.warm and not workspace.active
+                and now - workspace.last_used > self.idle_timeout
+            ]
+            for workspace in idle:
+                workspace.warm = False
+            in_use = [workspace.path for workspace in self._workspaces.values() if workspace.warm]
+        for workspace in idle:
+            drop_warm_state(workspace.path, in_use)
+            if worker_pool is not None:
+                worker_pool.broadcast(drop_warm_state, workspace.path, in_use)
+        return [workspace.name for workspace in idle]
+
+
+def _contains(directory: str, path: str) -> bool:
+    return path == directory or path.startswith(directory + os.sep)
+
+
+def drop_warm_state(path: str, in_use: Optional[List[str]] = None) -> None:
+    """
+    Drop the idle Coders and tag indexes of the sessions run in ``path``.
+
+    Workspaces may be nested, so state that a workspace still in use relies
+    on is kept: the Coders run inside it and the indexes of the repositories
+    that contain it or lie inside it. Coders and indexes of pooled worktrees
+    count as those of the main checkout.
+
+    Args:
+        path: A workspace directory
+        in_use: Directories of the workspaces that are still warm
+    """
+    from aider_mcp_server.capabilities.coder_cache import coder_pool
+
+    in_use = in_use or []
+
+    def evictable(key) -> bool:
+        cwd = checkout_path(key.cwd)
+        return _contains(path, cwd) and not any(_contains(kept, cwd) for kept in in_use)
+
+    def unused(root: str) -> bool:
+        root = checkout_path(root)
+        return not any(_contains(root, kept) or _contains(kept, root) for kept in in_use)
+
+    coders = coder_pool.discard(evictable)
+    indexes = 0
+    # Without Aider loaded, no index can have been opened
+    if "aider_mcp_server.capabilities.tag_index" in sys.modules:
+        from aider_mcp_server.capabilities.tag_index import discard_tag_indexes
+        indexes = discard_tag_indexes(path, unused)
+    print(f"Evicted idle workspace {path}: {coders} coders, {indexes} tag indexes",
+          file=sys.stderr)
+
+
+async def evict_idle_workspaces(registry: WorkspaceRegistry, worker_pool: Any = None) -> None:
+    """
+    Evict idle workspaces periodically until cancelled.
+
+    Args:
+        registry: The server's WorkspaceRegistry
+        worker_pool: The server's WorkerPool, whose worker processes evict too
+    """
+    interval = max(1.0, min(60.0, registry.idle_timeout / 4))
+    while True:
+        await asyncio.sleep(interval)
+        registry.evict_idle(worker_pool)
@@ -0,0 +1,328 @@
+"""
+Pool of git worktrees for running Aider sessions in isolation.
+
+Each session in worktree mode gets a private worktree of the repository,
+checked out at the requested base commit, so sessions never touch the main
+checkout or each other and need no file locks. The session's edits are
+committed in the worktree and published as a branch that can be merged.
+
+Worktrees are created once and reused: they live under the repository's git
+directory, are adopted again after a restart, and are reset to the next
+session's base commit with a forced checkout and clean, which is far cheaper
+than creating a new worktree. Every worktree a process owns is held with an
+advisory file lock, so several server processes can share a repository's
+worktree directory without handing out the same worktree twice.
+"""
+
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import IO, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Default number of worktrees kept ready per repository
+DEFAULT_WORKTREE_POOL_SIZE = 0
+# Directory under the git common dir holding the pooled worktrees
+WORKTREE_DIR = "aider-mcp-worktrees"
+# Prefix of the branches sessions are published on
+BRANCH_PREFIX = "aider-mcp/"
+# Untracked files kept when a worktree is cleaned, so Aider's caches stay warm
+KEEP_UNTRACKED = (".aider*", ".aider-mcp")
+
+
+class WorktreeError(RuntimeError):
+    """Raised when a git command managing a worktree fails."""
+
+
+def git(cwd: str, *args: str, config: Optional[Dict[str, str]] = None) -> str:
+    """
+    Run a git command and return its stripped output.
+
+    Args:
+        cwd: Directory to run the command in
+        *args: Arguments to git
+        config: Extra ``-c`` configuration values
+
+    Returns:
+        The command's standard output
+    """
+    command = ["git"]
+    for key, value in (config or {}).items():
+        command += ["-c", f"{key}={value}"]
+    result = subprocess.run(
+        command + list(args), cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise WorktreeError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+
+@dataclass
+class Worktree:
+    """A pooled worktree and the commit it was checked out at."""
+    path: str
+    base_commit: str = ""
+    lock_file: Optional[IO] = None
+
+
+def _claim(path: str) -> Optional[Worktree]:
+    """Lock a worktree for this process, or return None if another process holds it."""
+    lock_file = open(f"{path}.lock", "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+    return Worktree(path, lock_file=lock_file)
+
+
+@dataclass
+class WorktreeCommit:
+    """The published result of a worktree session."""
+    branch: str
+    commit: str
+    base_commit: str
+
+
+class WorktreePool:
+    """
+    Hands out clean worktrees of one repository and takes them back for reuse.
+
+    All methods block on git and are meant to run on a worker thread.
+    """
+
+    def __init__(self, repo_root: str, size: int = DEFAULT_WORKTREE_POOL_SIZE):
+        """
+        Create the pool and adopt the worktrees left by an earlier run.
+
+        Args:
+            repo_root: Root of the main checkout
+            size: Number of idle worktrees kept ready; with 0, worktrees are
+                removed after use
+        """
+        self.repo_root = os.path.realpath(repo_root)
+        self.size = size
+        common_dir = git(self.repo_root, "rev-parse", "--git-common-dir")
+        self.directory = os.path.join(os.path.join(self.repo_root, common_dir), WORKTREE_DIR)
+        self._idle: List[Worktree] = []
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+        self._adopt()
+
+    @property
+    def idle(self) -> int:
+        """Number of worktrees ready for a session."""
+        with self._lock:
+            return len(self._idle)
+
+    def _adopt(self) -> None:
+        git(self.repo_root, "worktree", "prune")
+        listing = git(self.repo_root, "worktree", "list", "--porcelain")
+        prefix = os.path.realpath(self.directory) + os.sep
+        for line in listing.splitlines():
+            if line.startswith("worktree "):
+                path = os.path.realpath(line[len("worktree "):])
+                if path.startswith(prefix):
+                    worktree = _claim(path)
+                    if worktree is not None:
+                        self._idle.append(worktree)
+
+    def _create(self) -> Worktree:
+        with self._create_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.realpath(os.path.join(self.directory, f"wt-{uuid.uuid4().hex[:8]}"))
+            # Lock the new worktree before git creates it, so no other process adopts it
+            worktree = _claim(path)
+            try:
+                git(self.repo_root, "worktree", "add", "--detach", path, "HEAD")
+            except BaseException:
+                worktree.lock_file.close()
+                try:
+                    os.remove(f"{path}.lock")
+                except OSError:
+                    pass
+                raise
+            return worktree
+
+    def prefill(self) -> None:
+        """Create worktrees until ``size`` are idle."""
+        while self.idle < self.size:
+            worktree = self._create()
+            with self._lock:
+                self._idle.append(worktree)
+
+    def acquire(self, base_ref: str = "HEAD") -> Worktree:
+        """
+        Check out a clean worktree at ``base_ref``.
+
+        Args:
+            base_ref: Commit, branch or tag of the main repository to start from
+
+        Returns:
+            The worktree, reserved until ``release`` is called
+        """
+        base_commit = git(self.repo_root, "rev-parse", "--verify", f"{base_ref}^{{commit}}")
+        while True:
+            with self._lock:
+                worktree = self._idle.pop() if self._idle else None
+            if worktree is None:
+                worktree = self._create()
+            elif not os.path.isdir(worktree.path):
+                # Removed behind our back; forget it and try the next one
+                worktree.lock_file.close()
+                git(self.repo_root, "worktree", "prune")
+                continue
+            break
+
+        git(worktree.path, "checkout", "--force", "--detach", base_commit)
+        git(worktree.path, "clean", "-fd", *(f"--exclude={p}" for p in KEEP_UNTRACKED))
+        worktree.base_commit = base_commit
+        return worktree
+
+    def release(self, worktree: Worktree) -> None:
+        """
+        Return a worktree to the pool, or remove it when the pool is full.
+
+        Args:
+            worktree: The worktree returned by ``acquire``
+        """
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(worktree)
+                return
+        try:
+            git(self.repo_root, "worktree", "remove", "--force", worktree.path)
+        except WorktreeError as e:
+            print(f"Error removing worktree: {str(e)}", file=sys.stderr)
+        finally:
+            worktree.lock_file.close()
+            try:
+                os.remove(f"{worktree.path}.lock")
+            except OSError:
+                pass
+
+    def commit(self, worktree: Worktree, files: List[str], message: str,
+               branch: Optional[str] = None) -> Optional[WorktreeCommit]:
+        """
+        Commit a session's edits and publish them on a branch.
+
+        Commits Aider already made in the worktree are included.
+
+        Args:
+            worktree: The worktree the session ran in
+            files: Paths of the edited files, relative to the worktree
+            message: Commit message
+            branch: Branch name (defaults to a unique ``aider-mcp/`` branch)
+
+        Returns:
+            The branch and commit, or None when the session changed nothing
+        """
+        if files:
+            git(worktree.path, "add", "--all", "--", *files)
+            staged = subprocess.run(
+                ["git", "diff", "--cached", "--quiet"], cwd=worktree.path
+            ).returncode != 0
+            if staged:
+                git(worktree.path, "commit", "--no-verify", "-m", message, config=self._identity(worktree))
+
+        commit = git(worktree.path, "rev-parse", "HEAD")
+        if commit == worktree.base_commit:
+            return None
+        # Identical sessions can produce identical commits, so the name is not derived from it
+        branch = branch or f"{BRANCH_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        git(self.repo_root, "branch", branch, commit)
+        return WorktreeCommit(branch=branch, commit=commit, base_commit=worktree.base_commit)
+
+    def _identity(self, worktree: Worktree) -> Dict[str, str]:
+        # Fall back to a fixed identity when the repository has none configured
+        try:
+            git(worktree.path, "config", "user.email")
+            return {}
+        except WorktreeError:
+            return {"user.name": "aider-mcp", "user.email": "aider-mcp@localhost"}
+
+
+def checkout_path(path: str) -> str:
+    """
+    Map a path inside a pooled worktree to the same path in the main checkout.
+
+    Args:
+        path: An absolute path
+
+    Returns:
+        The corresponding path in the main checkout, or ``path`` itself when
+        it is not inside a pooled worktree of a repository with a ``.git``
+        directory
+    """
+    marker = os.sep + WORKTREE_DIR + os.sep
+    if marker not in path:
+        return path
+    common_dir, inside = path.split(marker, 1)
+    if os.path.basename(common_dir) != ".git":
+        return path
+    # The first component is the worktree's own directory
+    rest = inside.split(os.sep, 1)[1] if os.sep in inside else ""
+    return os.path.join(os.path.dirname(common_dir), rest) if rest else os.path.dirname(common_dir)
+
+
+def commit_message(prompt: str) -> str:
+    """
+    Build a commit message from a session prompt.
+
+    Args:
+        prompt: The session's coding prompt
+
+    Returns:
+        The first line of the prompt, shortened, followed by the full prompt
+    """
+    first_line = re.sub(r"\s+", " ", prompt.strip().splitlines()[0] if prompt.strip() else "")
+    if len(first_line) > 72:
+        first_line = first_line[:69] + "..."
+    return f"aider: {first_line}\n\n{prompt.strip()}\n"
+
+
+_pools: Dict[str, WorktreePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_worktree_pool(repo_root: str, size: int = DEFAULT_WORKTREE_POOL_SIZE) -> WorktreePool:
+    """
+    Return the shared worktree pool of a repository, creating it on first use.
+
+    Args:
+        repo_root: Root of the main checkout
+        size: Number of idle worktrees kept ready, used when the pool is created
+
+    Returns:
+        The repository's WorktreePool
+    """
+    key = os.path.realpath(repo_root)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = WorktreePool(key, size)
+        return pool
+
+
+def prefill_worktree_pool(repo_root: str, size: int) -> None:
+    """
+    Create the pooled worktrees of a repository ahead of the first session.
+
+    Args:
+        repo_root: Root of the main checkout
+        size: Number of idle worktrees to keep ready
+    """
+    try:
+        get_worktree_pool(repo_root, size).prefill()
+    except Exception as e:
+        print(f"Error preparing worktrees: {str(e)}", file=sys.stderr)
@@ -1,23 +1,84 @@
 """
 Main server module for the Aider MCP server.
+
+Only light modules are imported here. Aider, litellm and openai are loaded on
+the first tool call or by the background pre-warm, see ``warmup``.
 """
 
 import os
 import sys
+import json
+import time
 import asyncio
-from typing import Optional, List, Dict, Any
+import anyio
+from typing import Optional, List, Dict, Any, Callable
 from fastmcp import FastMCP, Context
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, AsyncExitStack
+from functools import partial
 from collections.abc import AsyncIterator
 from dataclasses import dataclass
 from dotenv import load_dotenv
+import uvicorn
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
 
+from aider_mcp_server.capabilities import metrics
 from aider_mcp_server.capabilities.utils import DEFAULT_EDITOR_MODEL
+from aider_mcp_server.capabilities.file_scheduler import FileLockScheduler, find_repo_root, group_claims
+from aider_mcp_server.capabilities.data_types import AICodeResult, AICodeTask, AICodeWorktree
+from aider_mcp_server.capabilities.coder_cache import DEFAULT_CODER_POOL_SIZE, configure_coder_cache
+from aider_mcp_server.capabilities.response_cache import DEFAULT_CACHE_TTL
+from aider_mcp_server.capabilities.worker_pool import (
+    WorkerPool,
+    WorkerPoolBusyError,
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_MAX_QUEUE,
+)
+from aider_mcp_server.capabilities.process_pool import (
+    DEFAULT_MAX_TASKS_PER_WORKER,
+    DEFAULT_MAX_WORKER_MEMORY_MB,
+)
+from aider_mcp_server.capabilities.warmup import ensure_tools_loaded, start_prewarm, warm_worker
+from aider_mcp_server.capabilities.http_workers import (
+    DEFAULT_DRAIN_TIMEOUT,
+    MESSAGE_PREFIX,
+    WORKER_METRICS_PATH,
+    DrainingServer,
+    current_worker,
+    message_relay,
+    metrics_endpoints,
+    run_http_workers,
+    worker_sockets,
+)
+from aider_mcp_server.capabilities.rate_limits import (
+    DEFAULT_UPSTREAM_CONCURRENCY,
+    RateLimit,
+    configure_rate_limits,
+)
+from aider_mcp_server.capabilities.job_queue import JobError, JobQueue, JobRunner, DEFAULT_JOB_DB
+from aider_mcp_server.capabilities.workspaces import (
+    WorkspaceError,
+    WorkspaceRegistry,
+    evict_idle_workspaces,
+    DEFAULT_IDLE_TIMEOUT,
+)
+from aider_mcp_server.capabilities.worktree_pool import (
+    WorktreeError,
+    commit_message,
+    get_worktree_pool,
+    prefill_worktree_pool,
+    DEFAULT_WORKTREE_POOL_SIZE,
+)
 
-# Import tools
-from aider_mcp_server.capabilities.tools.aider_ai_code import code_with_aider
+# Import tools; these modules defer their heavy imports to first use
 from aider_mcp_server.capabilities.tools.aider_list_models import list_models
-from aider_mcp_server.capabilities.tools.aider_ask import ask_question as ask_question_sync
+from aider_mcp_server.capabilities.tools.aider_ask import (
+    ask_question_async,
+    configure_response_cache,
+    create_async_client,
+    DEFAULT_MAX_CONNECTIONS,
+)
 
 
 @dataclass
@@ -26,37 +87,448 @@ class AiderContext:
     editor_model: str
     architect_model: Optional[str]
     current_working_dir: str
+    worker_pool: WorkerPool
+    scheduler: FileLockScheduler
+    ask_max_connections: int = DEFAULT_MAX_CONNECTIONS
+    default_timeout: Optional[float] = None
+    worktree_pool_size: int = DEFAULT_WORKTREE_POOL_SIZE
+    openai_client: Optional["SharedOpenAIClient"] = None
+    workspaces: Optional[WorkspaceRegistry] = None
+    jobs: Optional[JobRunner] = None
+    fast_model: Optional[str] = None
+    validate_cmd: Optional[str] = None
+
+    def __post_init__(self):
+        if self.workspaces is None:
+            self.workspaces = WorkspaceRegistry(self.current_working_dir, self.worker_pool.max_workers)
+        if self.openai_client is None:
+            self.openai_client = SharedOpenAIClient(self.ask_max_connections)
+
+
+class SharedOpenAIClient:
+    """The keep-alive AsyncOpenAI client of the server, created on first use."""
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        """
+        Prepare the client without creating it.
+        
+        Args:
+            max_connections: Size of the client's HTTP connection pool
+        """
+        self.max_connections = max_connections
+        self.client: Optional[Any] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> Optional[Any]:
+        """
+        Return the client, creating it on first use.
+        
+        Returns:
+            The client, or None when no OpenAI API key is configured
+        """
+        async with self._lock:
+            if self.client is None:
+                # Creating the first client imports openai, so keep it off the loop
+                self.client = await asyncio.to_thread(create_async_client, self.max_connections)
+        return self.client
+
+    async def close(self) -> None:
+        """Close the client's connections, if it was created."""
+        async with self._lock:
+            client, self.client = self.client, None
+        if client is not None:
+            await client.close()
+
+
+async def get_openai_client(aider_ctx: AiderContext) -> Optional[Any]:
+    """
+    Return the server's shared AsyncOpenAI client, creating it on first use.
+    
+    Args:
+        aider_ctx: The connection's AiderContext
+        
+    Returns:
+        The client, or None when no OpenAI API key is configured
+    """
+    return await aider_ctx.openai_client.get()
+
+
+async def await_session(session: Any, token: Any,
+                        interrupt: Optional[Callable[[Any], None]] = None) -> Dict[str, Any]:
+    """
+    Wait for a session running on the worker pool, stopping it when needed.
+    
+    The token is cancelled when its deadline passes, which also aborts the
+    response being streamed, and when the waiting task is cancelled, for
+    example by a client cancellation notification. In the latter case the
+    worker is still awaited, so that the session's file locks are held until
+    it has stopped and rolled back its edits.
+    
+    Args:
+        session: Awaitable running the session
+        token: The session's CancelToken
+        interrupt: Passes the token's cancellation on to a session running
+            on a copy of the token in another process (optional)
+        
+    Returns:
+        The session result
+    """
+    def stop(reason: str) -> None:
+        token.cancel(reason)
+        if interrupt is not None:
+            interrupt(token)
+
+    task = asyncio.ensure_future(session)
+    timer = None
+    if token.deadline is not None:
+        timer = asyncio.get_running_loop().call_later(token.remaining(), stop, "timeout")
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        stop("cancelled")
+        with anyio.CancelScope(shield=True):
+            await asyncio.wait([task])
+        raise
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+
+async def run_ai_code_session(
+    aider_ctx: AiderContext,
+    ctx: Optional[Context],
+    ai_coding_prompt: str,
+    relative_editable_files: List[str],
+    relative_readonly_files: Optional[List[str]] = None,
+    settings: Optional[Dict[str, Any]] = None,
+    workspace: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Run one Aider session on the worker pool under the file lock scheduler.
+    
+    The session's deadline, from the ``timeout`` setting or the server
+    default, starts when the request arrives and covers waiting for workers
+    and files.
+    
+    With the ``worktree`` setting, the session runs in a pooled git worktree
+    checked out at ``base_ref`` (default HEAD) instead of the main checkout,
+    so it takes no file locks. A successful session's edits are committed
+    there and published on a branch (``branch`` setting or a generated name).
+    
+    The session waits for a slot in its workspace's quota after being
+    admitted to the worker pool.
+    
+    Args:
+        aider_ctx: The server's AiderContext
+        ctx: The MCP context to stream progress to, or None to not stream
+        ai_coding_prompt: The prompt for the AI coding task
+        relative_editable_files: List of files that can be edited
+        relative_readonly_files: List of files that should be read-only
+        settings: Optional settings for the Aider session
+        workspace: Name of the workspace to run in (the default workspace when None)
+        
+    Returns:
+        The AICodeResult dict with the streamed warnings and errors added
+    """
+    async with metrics.track_request("ai_code") as request:
+        result = await _run_ai_code_session(
+            aider_ctx, ctx, ai_coding_prompt, relative_editable_files,
+            relative_readonly_files, settings or {}, workspace
+        )
+        request.status = result["status"]
+        return result
+
+
+async def _run_ai_code_session(
+    aider_ctx: AiderContext,
+    ctx: Optional[Context],
+    ai_coding_prompt: str,
+    relative_editable_files: List[str],
+    relative_readonly_files: Optional[List[str]],
+    settings: Dict[str, Any],
+    workspace_name: Optional[str]
+) -> Dict[str, Any]:
+    arrived = time.perf_counter()
+    await ensure_tools_loaded()
+    from aider_mcp_server.capabilities.cancellation import CancelToken
+    from aider_mcp_server.capabilities.progress import ProgressReporter
+    from aider_mcp_server.capabilities.tools.aider_ai_code import code_with_aider
+
+    use_git = settings.get("use_git", False)
+    use_worktree = settings.get("worktree", False)
+    worktree_pool = worktree = None
+    token = CancelToken(settings.get("timeout", aider_ctx.default_timeout))
+    reporter = ProgressReporter(ctx)
+    # Callbacks cannot cross a process boundary, so in process mode there is
+    # no streaming; the worker gets a copy of the token, cancelled through the pool
+    thread_mode = aider_ctx.worker_pool.mode == "thread"
+    progress_callback = reporter.callback if thread_mode else None
+    try:
+        # Admission is checked before waiting on file locks so that the
+        # wait queue bound also covers sessions blocked on other sessions
+        async with aider_ctx.worker_pool.admit(), AsyncExitStack() as stack:
+            async with asyncio.timeout(token.remaining()):
+                workspace = await stack.enter_async_context(
+                    aider_ctx.workspaces.session(workspace_name)
+                )
+            session_dir = workspace.path
+            if use_worktree:
+                # A private worktree needs no file locks
+                worktree_pool = await asyncio.to_thread(
+                    get_worktree_pool,
+                    find_repo_root(workspace.path),
+                    aider_ctx.worktree_pool_size
+                )
+                worktree = await asyncio.to_thread(
+                    worktree_pool.acquire, settings.get("base_ref", "HEAD")
+                )
+                session_dir = os.path.join(
+                    worktree.path, os.path.relpath(workspace.path, worktree_pool.repo_root)
+                )
+                settings = {**settings, "use_git": True}
+            else:
+                async with asyncio.timeout(token.remaining()):
+                    await stack.enter_async_context(aider_ctx.scheduler.lock(
+                        workspace.path,
+                        relative_editable_files,
+                        relative_readonly_files,
+                        use_git=use_git
+                    ))
+            pump = asyncio.create_task(reporter.pump())
+            try:
+                result = await await_session(aider_ctx.worker_pool.submit(
+                    code_with_aider,
+                    ai_coding_prompt=ai_coding_prompt,
+                    relative_editable_files=relative_editable_files,
+                    relative_readonly_files=relative_readonly_files,
+                    settings=settings,
+                    editor_model=aider_ctx.editor_model,
+                    architect_model=aider_ctx.architect_model,
+                    current_working_dir=session_dir,
+                    progress_callback=progress_callback,
+                    timeout=token.remaining(),
+                    cancel_token=token,
+                    fast_model=aider_ctx.fast_model,
+                    validate_cmd=aider_ctx.validate_cmd
+                ), token, aider_ctx.worker_pool.interrupt)
+                # Whatever the session did not spend running was spent waiting
+                metrics.record_session(
+                    result,
+                    aider_ctx.architect_model or aider_ctx.editor_model,
+                    time.perf_counter() - arrived - result["timings"]["total_seconds"]
+                )
+                if worktree is not None and result["status"] == "success":
+                    published = await asyncio.to_thread(
+                        worktree_pool.commit,
+                        worktree,
+                        [os.path.relpath(os.path.join(session_dir, f), worktree.path)
+                         for f in result["modified_files"]],
+                        commit_message(ai_coding_prompt),
+                        settings.get("branch")
+                    )
+                    if published is not None:
+                        result["worktree"] = AICodeWorktree(
+                            branch=published.branch,
+                            commit=published.commit,
+                            base_commit=published.base_commit
+                        ).model_dump()
+            finally:
+                reporter.close()
+                with anyio.CancelScope(shield=True):
+                    await pump
+                    if worktree is not None:
+                        await asyncio.to_thread(worktree_pool.release, worktree)
+    except WorkerPoolBusyError as e:
+        print(f"Rejected ai_code request: {str(e)}", file=sys.stderr)
+        return reporter.summary(AICodeResult(status="busy", error=str(e)).model_dump())
+    except WorkspaceError as e:
+        print(f"Rejected ai_code request: {str(e)}", file=sys.stderr)
+        return reporter.summary(AICodeResult(status="failure", error=str(e)).model_dump())
+    except WorktreeError as e:
+        print(f"Error in ai_code worktree: {str(e)}", file=sys.stderr)
+        return reporter.summary(AICodeResult(status="failure", error=str(e)).model_dump())
+    except TimeoutError:
+        error = "Session timed out waiting for its workspace and files"
+        print(f"Stopped ai_code request: {error}", file=sys.stderr)
+        return reporter.summary(AICodeResult(status="timeout", error=error).model_dump())
+    return reporter.summary(result)
+
+
+async def run_job(aider_ctx: AiderContext, request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run a queued ai_code job.
+    
+    Several server processes may share the job queue, and a job's workspace
+    may have been registered at runtime in another one. Jobs carry the
+    workspace's directory and session limit, so a process that does not
+    know the workspace registers it the same way before running the job.
+    
+    Args:
+        aider_ctx: The server's AiderContext
+        request: The job's request, as stored by submit_ai_code
+        
+    Returns:
+        The AICodeResult dict
+    """
+    request = dict(request)
+    path = request.pop("workspace_path", None)
+    max_sessions = request.pop("workspace_max_sessions", None)
+    name = request.get("workspace")
+    if name and path:
+        try:
+            try:
+                workspace = aider_ctx.workspaces.get(name)
+            except WorkspaceError:
+                workspace = aider_ctx.workspaces.register(name, path, max_sessions, from_client=True)
+            if workspace.path != path:
+                raise WorkspaceError(f"Workspace {name} is {workspace.path} here, not {path}")
+        except WorkspaceError as e:
+            print(f"Rejected job: {str(e)}", file=sys.stderr)
+            return AICodeResult(status="failure", error=str(e)).model_dump()
+    return await run_ai_code_session(aider_ctx, None, **request)
+
+
+async def prefill_worktrees(aider_ctx: AiderContext) -> None:
+    """
+    Fill the worktree pool of the server's repository on a worker thread.
+    
+    Args:
+        aider_ctx: The server's AiderContext
+    """
+    try:
+        repo_root = find_repo_root(aider_ctx.current_working_dir)
+        if aider_ctx.worktree_pool_size > 0 and os.path.exists(os.path.join(repo_root, ".git")):
+            await asyncio.to_thread(prefill_worktree_pool, repo_root, aider_ctx.worktree_pool_size)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"Error preparing worktrees: {str(e)}", file=sys.stderr)
 
 
 @asynccontextmanager
-async def aider_lifespan(server: FastMCP, editor_model: str, architect_model: Optional[str] = None, 
-                        current_working_dir: str = ".") -> AsyncIterator[AiderContext]:
+async def server_tasks(aider_ctx: AiderContext, prewarm: bool = True) -> AsyncIterator[AiderContext]:
     """
-    Manages the Aider client lifecycle.
+    Run the server's background work for as long as the server runs.
+    
+    Idle workspaces are evicted periodically, the job runner runs queued
+    jobs, including those persisted before a restart, and the worktree pool
+    is filled. Jobs still running when the block exits are queued again.
     
     Args:
-        server: The FastMCP server instance
-        editor_model: The model to use for editing
-        architect_model: The model to use for architecture (optional)
-        current_working_dir: The current working directory
+        aider_ctx: The server's AiderContext, which jobs run with
+        prewarm: Import the tools' dependencies in the background right away
         
     Yields:
-        AiderContext: The context containing the Aider configuration
+        The AiderContext
     """
+    evictor = asyncio.create_task(evict_idle_workspaces(aider_ctx.workspaces, aider_ctx.worker_pool))
+    if aider_ctx.jobs is not None:
+        aider_ctx.jobs.start(lambda request: run_job(aider_ctx, request))
+    if prewarm:
+        # Also builds the get_models index so the first query is fast
+        start_prewarm()
+    prefill = asyncio.create_task(prefill_worktrees(aider_ctx))
     try:
-        yield AiderContext(
-            editor_model=editor_model,
-            architect_model=architect_model,
-            current_working_dir=current_working_dir
-        )
+        yield aider_ctx
     finally:
-        # No explicit cleanup needed
-        pass
+        evictor.cancel()
+        prefill.cancel()
+        if aider_ctx.jobs is not None:
+            await aider_ctx.jobs.stop()
+
+
+@asynccontextmanager
+async def shared_lifespan(server: FastMCP, aider_ctx: AiderContext) -> AsyncIterator[AiderContext]:
+    """
+    Give a client connection the server's AiderContext.
+    
+    Args:
+        server: The FastMCP server instance
+        aider_ctx: The context created once by ``serve``
+        
+    Yields:
+        The AiderContext
+    """
+    yield aider_ctx
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Serve the server's metrics in the Prometheus text format."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+async def run_sse(mcp: FastMCP, drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+                  jobs: Optional[JobRunner] = None) -> None:
+    """
+    Run the server over SSE, with the metrics endpoint on ``/metrics``.
+    
+    In a multi-worker server, the worker serves on the shared listening
+    socket and its private socket, relays messages of other workers'
+    sessions to them, and serves the metrics of every worker.
+    
+    Args:
+        mcp: The FastMCP server
+        drain_timeout: Seconds running tool requests get to finish when the server stops
+        jobs: The server's job runner; it claims no new jobs once draining
+            starts, and its running jobs are waited for like tool requests
+    """
+    def in_flight() -> int:
+        return metrics.in_flight() + (len(jobs.running) if jobs is not None else 0)
+
+    worker = current_worker()
+    sockets = None
+    if worker is not None:
+        mcp.settings.message_path = worker.message_path
+        sockets = worker_sockets(worker)
+    app = mcp.sse_app()
+    if worker is None:
+        app.router.routes.append(Route("/metrics", endpoint=metrics_endpoint))
+    else:
+        combined_metrics, worker_metrics = metrics_endpoints(worker)
+        app.router.routes.append(Route("/metrics", endpoint=combined_metrics))
+        app.router.routes.append(Route(WORKER_METRICS_PATH, endpoint=worker_metrics))
+        # After the worker's own message path, so only other workers' sessions are relayed
+        app.router.routes.append(
+            Route(MESSAGE_PREFIX + "{path:path}", endpoint=message_relay(worker), methods=["POST"])
+        )
+    config = uvicorn.Config(
+        app,
+        host=mcp.settings.host,
+        port=mcp.settings.port,
+        log_level=mcp.settings.log_level.lower()
+    )
+    on_drain = jobs.drain if jobs is not None else None
+    await DrainingServer(config, in_flight, drain_timeout, on_drain).serve(sockets=sockets)
 
 
 def serve(editor_model: str = DEFAULT_EDITOR_MODEL, 
           current_working_dir: str = ".", 
-          architect_model: Optional[str] = None) -> None:
+          architect_model: Optional[str] = None,
+          max_workers: int = DEFAULT_MAX_WORKERS,
+          max_queue: int = DEFAULT_MAX_QUEUE,
+          worker_mode: str = "thread",
+          coder_cache_size: int = DEFAULT_CODER_POOL_SIZE,
+          ask_cache_size: int = 0,
+          ask_cache_ttl: float = DEFAULT_CACHE_TTL,
+          ask_cache_path: Optional[str] = None,
+          ask_max_connections: int = DEFAULT_MAX_CONNECTIONS,
+          prewarm: bool = True,
+          default_timeout: Optional[float] = None,
+          worktree_pool_size: int = DEFAULT_WORKTREE_POOL_SIZE,
+          workspaces: Optional[Dict[str, str]] = None,
+          workspace_roots: Optional[List[str]] = None,
+          workspace_max_sessions: Optional[int] = None,
+          workspace_idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+          job_db: Optional[str] = None,
+          job_concurrency: Optional[int] = None,
+          worker_max_tasks: int = DEFAULT_MAX_TASKS_PER_WORKER,
+          worker_max_memory_mb: int = DEFAULT_MAX_WORKER_MEMORY_MB,
+          http_workers: int = 1,
+          drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+          rate_limits: Optional[Dict[str, RateLimit]] = None,
+          upstream_concurrency: int = DEFAULT_UPSTREAM_CONCURRENCY,
+          fast_model: Optional[str] = None,
+          validate_cmd: Optional[str] = None) -> None:
     """
     Start the Aider MCP server.
     
@@ -64,11 +536,50 @@ def serve(editor_model: str = DEFAULT_EDITOR_MODEL,
         editor_model: The model to use for editing
         current_working_dir: The current working directory
         architect_model: The model to use for architecture (optional)
+        max_workers: Maximum number of concurrent Aider sessions
+        max_queue: Maximum number of Aider sessions waiting for a worker
+        worker_mode: Run Aider sessions on a "thread" or "process" pool
+        coder_cache_size: Number of warm Aider models and coders kept for reuse
+        ask_cache_size: Number of ask_question responses cached in memory (0 disables)
+        ask_cache_ttl: Seconds a cached ask_question response stays valid
+        ask_cache_path: SQLite file for an on-disk ask_question response cache (optional)
+        ask_max_connections: Size of the ask_question HTTP connection pool
+        prewarm: Import the tools' dependencies in the background right after startup
+        default_timeout: Seconds after which an ai_code session is stopped, unless
+            its settings give a timeout (no limit when None)
+        worktree_pool_size: Number of git worktrees kept ready for worktree mode
+        workspaces: Extra workspaces to serve, by name, besides the default
+            workspace at ``current_working_dir``
+        workspace_roots: Directories inside which clients may register workspaces
+        workspace_max_sessions: Number of sessions a workspace may run at once
+            (defaults to ``max_workers``)
+        workspace_idle_timeout: Seconds without sessions after which a
+            workspace's warm Coders and tag indexes are dropped
+        job_db: SQLite database of the submitted ai_code jobs (defaults to
+            ``.aider-mcp/jobs.db`` under ``current_working_dir``)
+        job_concurrency: Number of submitted jobs run at once (defaults to ``max_workers``)
+        worker_max_tasks: With the process worker mode, sessions a worker
+            process runs before it is replaced (0 for no limit)
+        worker_max_memory_mb: With the process worker mode, resident memory in
+            MiB above which a worker process is replaced (0 for no limit)
+        http_workers: Number of processes serving SSE on the same port; each
+            has its own worker pool and job runner
+        drain_timeout: Seconds running requests get to finish when the server stops
+        rate_limits: Requests and tokens per minute allowed upstream, by model,
+            provider or ``*``; split evenly between the server's processes
+        upstream_concurrency: Highest number of concurrent upstream requests
+            per model and process, which adapts to throttling and latency
+        fast_model: Model ai_code sessions are tried with first; they are run
+            again with the main models when its edits fail the local checks
+        validate_cmd: Command, such as a linter, the fast model's changed
+            files must pass; their paths are appended to it
     """
+    # Every argument, for starting the same server in each HTTP worker
+    options = dict(locals())
+    
     # Load environment variables
     load_dotenv()
     
-    # Initialize FastMCP server
     # Handle host and port only when using SSE transport
     host = os.getenv("HOST")
     if not host:
@@ -80,13 +591,69 @@ def serve(editor_model: str = DEFAULT_EDITOR_MODEL,
     else:
         port = int(port)
     
-    # Create a lifespan function that captures our parameters
-    # Need to use partial to bind parameters to the context manager
-    from functools import partial
-    lifespan_with_params = partial(aider_lifespan, 
-                                 editor_model=editor_model, 
-                                 architect_model=architect_model, 
-                                 current_working_dir=current_working_dir)
+    transport = os.getenv("TRANSPORT", "sse")
+    multi_worker = http_workers > 1 and transport.lower() != "stdio"
+    if multi_worker and current_worker() is None:
+        # This process only supervises; each worker runs this function again
+        run_http_workers(partial(serve, **options), http_workers, host, port, drain_timeout)
+        return
+    
+    # Shared by every client connection, so registrations are seen by all
+    workspace_registry = WorkspaceRegistry(
+        current_working_dir,
+        workspace_max_sessions or max_workers,
+        idle_timeout=workspace_idle_timeout,
+        roots=workspace_roots
+    )
+    for name, path in (workspaces or {}).items():
+        workspace_registry.register(name, path)
+    # Every process sending LLM requests gets an equal share of the rate limits
+    processes = http_workers * (max_workers + 1 if worker_mode == "process" else 1)
+    limiter_options = dict(limits=rate_limits, max_concurrency=upstream_concurrency,
+                           share=1.0 / processes)
+    configure_rate_limits(**limiter_options)
+    # Jobs outlive the connection that submitted them, so they run on the
+    # shared pool rather than on one connection's
+    # Process workers resolve the server's models before their first session
+    worker_pool = WorkerPool(
+        max_workers=max_workers,
+        max_queue=max_queue,
+        mode=worker_mode,
+        max_tasks_per_worker=worker_max_tasks,
+        max_worker_memory_mb=worker_max_memory_mb,
+        initializer=warm_worker,
+        initargs=(editor_model, architect_model, coder_cache_size, limiter_options, fast_model)
+    )
+    job_queue = JobQueue(job_db or os.path.join(current_working_dir, DEFAULT_JOB_DB))
+    job_runner = JobRunner(job_queue, job_concurrency or max_workers)
+    # One keep-alive connection pool for ask_question, whichever client asks
+    openai_client = SharedOpenAIClient(ask_max_connections)
+    
+    # Size the warm Model/Coder caches before any worker starts
+    configure_coder_cache(coder_cache_size, coder_cache_size)
+    configure_response_cache(ask_cache_size, ask_cache_ttl, ask_cache_path)
+    
+    # One context for the whole server, so every client connection shares
+    # its pools, caches and client, and jobs run whether or not a client is connected
+    aider_ctx = AiderContext(
+        editor_model=editor_model,
+        architect_model=architect_model,
+        current_working_dir=current_working_dir,
+        worker_pool=worker_pool,
+        scheduler=FileLockScheduler(cross_process=multi_worker),
+        ask_max_connections=ask_max_connections,
+        default_timeout=default_timeout,
+        worktree_pool_size=worktree_pool_size,
+        workspaces=workspace_registry,
+        jobs=job_runner,
+        fast_model=fast_model,
+        validate_cmd=validate_cmd,
+        openai_client=openai_client
+    )
+    metrics.watch_worker_pool(worker_pool)
+    
+    # Initialize FastMCP server
+    lifespan_with_params = partial(shared_lifespan, aider_ctx=aider_ctx)
     
     mcp = FastMCP(
         "aider-mcp",
@@ -104,67 +671,316 @@ def serve(editor_model: str = DEFAULT_EDITOR_MODEL,
         ai_coding_prompt: str, 
         relative_editable_files: List[str], 
         relative_readonly_files: Optional[List[str]] = None,
-        settings: Optional[Dict[str, Any]] = None
-    ) -> str:
+        settings: Optional[Dict[str, Any]] = None,
+        workspace: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Run Aider to perform coding tasks.
         
+        Streamed LLM output, applied edits and Aider's messages are sent to
+        the client as log and progress notifications while the session runs.
+        
         Args:
             ctx: The MCP context
             ai_coding_prompt: The prompt for the AI coding task
             relative_editable_files: List of files that can be edited
             relative_readonly_files: List of files that should be read-only
             settings: Optional settings for the Aider session
+            workspace: Name of the workspace the file paths are relative to
+                (the server's default workspace when omitted)
             
         Returns:
-            A string indicating success or failure
+            The session result: status (success, failure or busy), modified
+            files with unified diffs, token usage and cost, phase timings, and
+            the warnings and errors Aider reported
         """
         aider_ctx = ctx.request_context.lifespan_context
-        result = code_with_aider(
+        return await run_ai_code_session(
+            aider_ctx,
+            ctx,
             ai_coding_prompt=ai_coding_prompt,
             relative_editable_files=relative_editable_files,
             relative_readonly_files=relative_readonly_files,
             settings=settings,
-            editor_model=aider_ctx.editor_model,
-            architect_model=aider_ctx.architect_model,
-            current_working_dir=aider_ctx.current_working_dir
+            workspace=workspace
         )
-        return result
     
     @mcp.tool()
-    async def get_models(ctx: Context, substring: str) -> list[str]:
+    async def ai_code_batch(
+        ctx: Context,
+        tasks: List[AICodeTask],
+        max_parallel: Optional[int] = None,
+        workspace: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Run many independent Aider coding tasks concurrently.
+        
+        Tasks are grouped so that tasks with non-overlapping files start
+        together, and tasks touching the same files run one after another.
+        Each task's result is sent as a log notification as soon as it
+        completes.
+        
+        Args:
+            ctx: The MCP context
+            tasks: The coding tasks, each with a prompt, editable files and
+                optional readonly files and settings
+            max_parallel: Maximum number of tasks running at once (defaults to
+                the number of workers)
+            workspace: Name of the workspace every task runs in (the server's
+                default workspace when omitted)
+            
+        Returns:
+            The per-task results in task order, each with its index, and the
+            groups of task indexes that were scheduled together
+        """
+        aider_ctx = ctx.request_context.lifespan_context
+        limit = max(1, min(max_parallel or aider_ctx.worker_pool.max_workers,
+                           aider_ctx.worker_pool.max_workers))
+        try:
+            workspace_dir = aider_ctx.workspaces.get(workspace).path
+        except WorkspaceError:
+            # Every task reports the unknown workspace in its result
+            workspace_dir = aider_ctx.current_working_dir
+        claims = [
+            aider_ctx.scheduler.make_claim(
+                workspace_dir,
+                task.relative_editable_files,
+                task.relative_readonly_files,
+                use_git=(task.settings or {}).get("use_git", False)
+            )
+            for task in tasks
+        ]
+        groups = group_claims(claims)
+        semaphore = asyncio.Semaphore(limit)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(tasks)
+        completed = 0
+
+        async def run_task(index: int) -> None:
+            nonlocal completed
+            task = tasks[index]
+            async with semaphore:
+                result = await run_ai_code_session(
+                    aider_ctx,
+                    None,
+                    ai_coding_prompt=task.ai_coding_prompt,
+                    relative_editable_files=task.relative_editable_files,
+                    relative_readonly_files=task.relative_readonly_files,
+                    settings=task.settings,
+                    workspace=workspace
+                )
+            results[index] = {"index": index, **result}
+            completed += 1
+            try:
+                await ctx.info(json.dumps(results[index]))
+                await ctx.report_progress(completed, len(tasks))
+            except Exception:
+                pass
+
+        async with metrics.track_request("ai_code_batch"):
+            # Semaphore waiters are woken in FIFO order, so tasks start group by group
+            await asyncio.gather(*(run_task(index) for group in groups for index in group))
+        return {"results": results, "groups": groups}
+    
+    @mcp.tool()
+    async def submit_ai_code(
+        ctx: Context,
+        ai_coding_prompt: str,
+        relative_editable_files: List[str],
+        relative_readonly_files: Optional[List[str]] = None,
+        settings: Optional[Dict[str, Any]] = None,
+        workspace: Optional[str] = None,
+        priority: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Queue an ai_code task as a job and return without waiting for it.
+        
+        Jobs are stored on disk and survive server restarts. Poll them with
+        get_job_status and fetch the result with get_job_result.
+        
+        Args:
+            ctx: The MCP context
+            ai_coding_prompt: The prompt for the AI coding task
+            relative_editable_files: List of files that can be edited
+            relative_readonly_files: List of files that should be read-only
+            settings: Optional settings for the Aider session
+            workspace: Name of the workspace the file paths are relative to
+            priority: Jobs with a higher priority run first
+            
+        Returns:
+            The job's id and status and its position in the queue, or an error
+        """
+        aider_ctx = ctx.request_context.lifespan_context
+        try:
+            resolved = aider_ctx.workspaces.get(workspace)
+        except WorkspaceError as e:
+            return {"error": str(e)}
+        queue = aider_ctx.jobs.queue
+        job = await asyncio.to_thread(queue.submit, {
+            "ai_coding_prompt": ai_coding_prompt,
+            "relative_editable_files": relative_editable_files,
+            "relative_readonly_files": relative_readonly_files,
+            "settings": settings,
+            "workspace": workspace,
+            # Another process sharing the queue may not know the workspace
+            "workspace_path": resolved.path if workspace else None,
+            "workspace_max_sessions": resolved.max_sessions if workspace else None,
+        }, priority)
+        aider_ctx.jobs.wake()
+        return {**job.info(), "queue_position": await asyncio.to_thread(queue.position, job.id)}
+
+    @mcp.tool()
+    async def get_job_status(ctx: Context, job_id: str) -> Dict[str, Any]:
+        """
+        Report the status of a submitted job.
+        
+        Args:
+            ctx: The MCP context
+            job_id: The id returned by submit_ai_code
+            
+        Returns:
+            The job's status (queued, running, finished or failed), attempts,
+            timestamps and, while queued, the number of jobs ahead of it
+        """
+        queue = ctx.request_context.lifespan_context.jobs.queue
+        try:
+            info = (await asyncio.to_thread(queue.get, job_id)).info()
+        except JobError as e:
+            return {"error": str(e)}
+        if info["status"] == "queued":
+            info["queue_position"] = await asyncio.to_thread(queue.position, job_id)
+        return info
+
+    @mcp.tool()
+    async def get_job_result(ctx: Context, job_id: str) -> Dict[str, Any]:
+        """
+        Fetch the result of a finished job.
+        
+        Args:
+            ctx: The MCP context
+            job_id: The id returned by submit_ai_code
+            
+        Returns:
+            The job's status, with the ai_code result under ``result`` once
+            the job has finished
+        """
+        queue = ctx.request_context.lifespan_context.jobs.queue
+        try:
+            job = await asyncio.to_thread(queue.get, job_id)
+        except JobError as e:
+            return {"error": str(e)}
+        info = job.info()
+        if job.result is not None:
+            info["result"] = job.result
+        return info
+
+    @mcp.tool()
+    async def list_workspaces(ctx: Context) -> List[Dict[str, Any]]:
+        """
+        List the workspaces this server can run ai_code sessions in.
+        
+        Args:
+            ctx: The MCP context
+            
+        Returns:
+            Each workspace's name, path, session limit, number of active
+            sessions, and whether its caches are warm
+        """
+        return ctx.request_context.lifespan_context.workspaces.list()
+
+    @mcp.tool()
+    async def register_workspace(ctx: Context, name: str, path: str,
+                                 max_sessions: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Register a directory as a workspace that ai_code requests can name.
+        
+        Only directories inside the server's workspace roots can be registered.
+        
+        Args:
+            ctx: The MCP context
+            name: Name of the workspace
+            path: The workspace directory
+            max_sessions: Number of its sessions that may run at once
+                (defaults to the server's per-workspace limit)
+            
+        Returns:
+            The registered workspace, or an error
+        """
+        registry = ctx.request_context.lifespan_context.workspaces
+        try:
+            return registry.register(name, path, max_sessions, from_client=True).info()
+        except WorkspaceError as e:
+            print(f"Rejected workspace registration: {str(e)}", file=sys.stderr)
+            return {"error": str(e)}
+
+    @mcp.tool()
+    async def get_models(ctx: Context, substring: str, limit: Optional[int] = None,
+                         offset: int = 0, include_metadata: bool = False) -> List[Any]:
         """
         List available Aider models filtered by substring.
         
         Args:
             ctx: The MCP context
             substring: Substring to filter models by
+            limit: Maximum number of models to return (all when omitted)
+            offset: Number of ranked matches to skip, for pagination
+            include_metadata: Return each model's provider, context window
+                and prices instead of just its name
             
         Returns:
-            List of matching model names
+            List of matching model names (or metadata dicts), best matches first
         """
-        return list_models(substring)
+        async with metrics.track_request("get_models"):
+            # The first query may have to build the index, so keep it off the loop
+            return await asyncio.to_thread(list_models, substring, limit, offset, include_metadata)
 
     @mcp.tool()
-    async def ask_question(ctx: Context, prompt: str, model: str | None = None) -> str:
-        """Ask a question using the specified model and return the response."""
+    async def ask_question(ctx: Context, prompt: str, model: str | None = None,
+                           use_cache: bool = True, stream: bool = False) -> str:
+        """Ask a question using the specified model and return the response.
+
+        Repeated questions are answered from the response cache when the
+        server was started with one and ``use_cache`` is true. With
+        ``stream`` set, the answer is also sent to the client chunk by chunk
+        as log and progress notifications while it is generated; cancelling
+        the request aborts the upstream completion.
+        """
+
+        aider_ctx = ctx.request_context.lifespan_context
+        received = 0
 
-        return await asyncio.to_thread(ask_question_sync, prompt, model)
+        async def send_chunk(chunk: str) -> None:
+            nonlocal received
+            received += len(chunk)
+            await ctx.log("debug", chunk, logger_name="ask.tokens")
+            await ctx.report_progress(received)
+
+        async with metrics.track_request("ask_question"):
+            client = await get_openai_client(aider_ctx)
+            return await ask_question_async(
+                prompt, model, use_cache, client=client, on_chunk=send_chunk if stream else None
+            )
     
-    # Run the server
-    transport = os.getenv("TRANSPORT", "sse")
+    async def run() -> None:
+        try:
+            async with server_tasks(aider_ctx, prewarm):
+                if transport.lower() == 'stdio':
+                    # For stdio, we need to use the specific stdio async method
+                    print("Using stdio transport", file=sys.stderr)
+                    await mcp.run_stdio_async()
+                else:
+                    print(f"Using SSE transport on {host}:{port}, metrics on /metrics", file=sys.stderr)
+                    await run_sse(mcp, drain_timeout, job_runner)
+        finally:
+            await openai_client.close()
     
+    # Run the server
     try:
         print(f"Starting server with transport: {transport}", file=sys.stderr)
-        if transport.lower() == 'stdio':
-            # For stdio, we need to use the specific stdio async method
-            print("Using stdio transport", file=sys.stderr)
-            asyncio.run(mcp.run_stdio_async())
-        else:
-            # For SSE, we'll use the specific SSE async method
-            print(f"Using SSE transport on {host}:{port}", file=sys.stderr)
-            asyncio.run(mcp.run_sse_async())
+        asyncio.run(run())
     except Exception as e:
         print(f"Server error: {e}", file=sys.stderr)
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+    finally:
+        worker_pool.shutdown(wait=False)
+        job_queue.close()
\ No newline at end of file
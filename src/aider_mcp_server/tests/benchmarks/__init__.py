@@ -0,0 +1 @@
+"""Tests for the Aider MCP server benchmarks."""
@@ -0,0 +1,63 @@
+"""
+Tests for the benchmark harness and its mock LLM.
+"""
+
+import asyncio
+import json
+import urllib.request
+from aider_mcp_server.benchmarks.harness import measure, percentile
+from aider_mcp_server.benchmarks.mock_llm import ANSWER, MockLLMServer, canned_reply, edit_prompt
+
+
+def _post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.read().decode()
+
+
+def test_canned_reply():
+    """Test that edit prompts get an edit block for their file and others a plain answer."""
+    reply = canned_reply([{"role": "user", "content": edit_prompt("app/main.py")}])
+    assert reply.startswith("app/main.py\n```python\n<<<<<<< SEARCH\n=======\n")
+    assert canned_reply([{"role": "user", "content": "What is 2 + 2?"}]) == ANSWER
+
+
+def test_mock_llm_plain_and_streamed():
+    """Test that the mock LLM answers plain and streamed completions with usage."""
+    with MockLLMServer(chunks=4) as server:
+        url = f"{server.base_url}/chat/completions"
+        messages = [{"role": "user", "content": "hello"}]
+
+        body = json.loads(_post(url, {"model": "gpt-4o", "messages": messages}))
+        assert body["choices"][0]["message"]["content"] == ANSWER
+        assert body["usage"]["total_tokens"] > 0
+
+        events = [line[len("data: "):] for line in _post(url, {
+            "model": "gpt-4o", "messages": messages, "stream": True
+        }).splitlines() if line.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        chunks = [json.loads(event) for event in events[:-1]]
+        text = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks)
+        assert text == ANSWER
+        assert chunks[-1]["usage"]["completion_tokens"] > 0
+        assert server.requests == 2
+
+
+def test_measure_counts_errors_and_latency():
+    """Test that every request is sent once and failures are counted."""
+    sent = []
+
+    async def send(index):
+        sent.append(index)
+        await asyncio.sleep(0.01)
+        if index == 3:
+            raise RuntimeError("boom")
+        return index % 2 == 0
+
+    result = asyncio.run(measure(send, requests=8, concurrency=3, rss=lambda: None))
+    assert sorted(sent) == list(range(8))
+    assert result["errors"] == 4
+    assert result["p50_ms"] >= 10
+    assert result["rss_per_request_kib"] is None
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.5
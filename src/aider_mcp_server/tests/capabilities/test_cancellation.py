@@ -0,0 +1,165 @@
+"""
+Tests for the cancellation module.
+"""
+
+import os
+import pickle
+import tempfile
+import shutil
+import time
+import pytest
+from aider.coders import Coder
+from aider.models import Model
+from aider_mcp_server.capabilities.cancellation import CancelToken, SessionCancelled, cancel_received
+from aider_mcp_server.capabilities.coder_cache import model_cache
+from aider_mcp_server.capabilities.progress import ProgressIO
+from aider_mcp_server.capabilities.tools.aider_ai_code import code_with_aider
+
+EDIT_RESPONSE = """math.py
+```python
+<<<<<<< SEARCH
+    return a - b
+=======
+    return a + b
+>>>>>>> REPLACE
+```
+"""
+NEW_FILE_RESPONSE = """pkg/helpers.py
+```python
+<<<<<<< SEARCH
+=======
+def double(a):
+    return a * 2
+>>>>>>> REPLACE
+```
+"""
+ORIGINAL = "def add(a, b):\n    return a - b\n"
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory with a file to edit."""
+    temp_dir = tempfile.mkdtemp()
+    with open(os.path.join(temp_dir, "math.py"), "w") as f:
+        f.write(ORIGINAL)
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def _mock_model():
+    model = Model("gpt-4o")
+    # litellm returns the mock response as a local stream without calling the API
+    model.extra_params = {"mock_response": EDIT_RESPONSE}
+    return model
+
+
+def test_token_deadline():
+    """Test that a token times out once its deadline passes."""
+    token = CancelToken(0.01)
+    assert not token.cancelled
+    time.sleep(0.02)
+    with pytest.raises(SessionCancelled) as excinfo:
+        token.check()
+    assert excinfo.value.reason == "timeout"
+    assert token.remaining() == 0.0
+    assert CancelToken().remaining() is None
+
+
+def test_copied_token_keeps_deadline_and_can_be_cancelled():
+    """Test that a token passed to another process keeps its deadline and is cancelled by id."""
+    token = CancelToken(60)
+    copy = pickle.loads(pickle.dumps(token))
+    assert copy.id == token.id and copy.deadline == token.deadline and not copy.cancelled
+    assert cancel_received(token.id, "cancelled")
+    assert copy.reason == "cancelled" and token.reason is None
+    del copy
+    assert not cancel_received(token.id)
+
+
+def test_cancel_stops_streamed_response(temp_dir):
+    """Test that cancelling mid-stream stops the Coder before any edit is applied."""
+    token = CancelToken()
+    tokens = []
+
+    def callback(event):
+        if event["type"] == "token":
+            tokens.append(event["text"])
+            token.cancel()
+
+    coder = Coder.create(
+        main_model=_mock_model(),
+        io=ProgressIO(callback),
+        fnames=[os.path.join(temp_dir, "math.py")],
+        use_git=False,
+        auto_commits=False,
+    )
+    with pytest.raises(SessionCancelled):
+        with token.activate():
+            coder.run("Fix the add function")
+
+    assert len(tokens) == 1
+    with open(os.path.join(temp_dir, "math.py")) as f:
+        assert f.read() == ORIGINAL
+
+
+def test_code_with_aider_rolls_back_cancelled_edits(temp_dir):
+    """Test that a session cancelled after applying an edit restores the file."""
+    token = CancelToken()
+
+    def callback(event):
+        if event["type"] == "edit":
+            token.cancel()
+
+    # Serve the mock model for the session instead of building a real one
+    model_cache.get_or_create(("gpt-4o", None, "{}"), _mock_model)
+    try:
+        result = code_with_aider(
+            ai_coding_prompt="Fix the add function",
+            relative_editable_files=["math.py"],
+            settings={"reuse_coder": False},
+            editor_model="gpt-4o",
+            current_working_dir=temp_dir,
+            progress_callback=callback,
+            cancel_token=token,
+        )
+    finally:
+        model_cache.clear()
+
+    assert result["status"] == "cancelled"
+    assert result["rolled_back_files"] == ["math.py"]
+    assert result["modified_files"] == []
+    with open(os.path.join(temp_dir, "math.py")) as f:
+        assert f.read() == ORIGINAL
+
+
+def test_code_with_aider_removes_files_created_before_cancel(temp_dir):
+    """Test that a cancelled session also removes the new files it created."""
+    token = CancelToken()
+    created = os.path.join(temp_dir, "pkg", "helpers.py")
+
+    def callback(event):
+        if event["type"] == "edit":
+            token.cancel()
+
+    model = _mock_model()
+    model.extra_params = {"mock_response": NEW_FILE_RESPONSE + EDIT_RESPONSE}
+    model_cache.get_or_create(("gpt-4o", None, "{}"), lambda: model)
+    try:
+        result = code_with_aider(
+            ai_coding_prompt="Add a helper and fix the add function",
+            relative_editable_files=["math.py"],
+            settings={"reuse_coder": False},
+            editor_model="gpt-4o",
+            current_working_dir=temp_dir,
+            progress_callback=callback,
+            cancel_token=token,
+        )
+    finally:
+        model_cache.clear()
+
+    assert result["status"] == "cancelled"
+    assert sorted(result["rolled_back_files"]) == ["math.py", os.path.join("pkg", "helpers.py")]
+    assert not os.path.exists(created)
+    assert not os.path.exists(os.path.join(temp_dir, "pkg"))
+    with open(os.path.join(temp_dir, "math.py")) as f:
+        assert f.read() == ORIGINAL
@@ -0,0 +1,95 @@
+"""
+Tests for the coder_cache module.
+"""
+
+import os
+import tempfile
+import shutil
+import pytest
+from aider.coders import Coder
+from aider.io import InputOutput
+from aider.models import Model
+from aider_mcp_server.capabilities.coder_cache import LRUCache, CoderPool, reset_coder
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test that the oldest untouched entry is evicted first."""
+    cache = LRUCache(2)
+    cache.get_or_create("a", lambda: 1)
+    cache.get_or_create("b", lambda: 2)
+    # Touch "a" so that "b" becomes the eviction candidate
+    assert cache.get_or_create("a", lambda: 10) == 1
+    cache.get_or_create("c", lambda: 3)
+    assert len(cache) == 2
+    assert cache.get_or_create("b", lambda: 20) == 20
+
+
+def test_coder_pool_checks_out_once():
+    """Test that a released coder is handed to exactly one later request."""
+    pool = CoderPool(2)
+    coder = object()
+    pool.release("key", coder)
+    assert pool.acquire("other") is None
+    assert pool.acquire("key") is coder
+    assert pool.acquire("key") is None
+
+
+def test_coder_pool_disabled():
+    """Test that a zero-sized pool keeps nothing."""
+    pool = CoderPool(0)
+    pool.release("key", object())
+    assert len(pool) == 0
+
+
+def test_reset_coder_clears_request_state(temp_dir):
+    """Test that reset_coder drops history and swaps in the new files."""
+    first = os.path.join(temp_dir, "first.py")
+    second = os.path.join(temp_dir, "second.py")
+    readme = os.path.join(temp_dir, "README.md")
+    for path in (first, second, readme):
+        with open(path, "w") as f:
+            f.write("\n")
+
+    coder = Coder.create(
+        main_model=Model("gpt-4"),
+        io=InputOutput(yes=True),
+        fnames=[first],
+        use_git=False,
+    )
+    coder.cur_messages = [{"role": "user", "content": "hello"}]
+    coder.done_messages = [{"role": "user", "content": "earlier"}]
+    coder.summarized_done_messages = [{"role": "user", "content": "summary"}]
+    coder.total_cost = 1.5
+    coder.aider_edited_files = {"first.py"}
+    coder.ignore_mentions = {"other.py"}
+    coder.shell_commands = ["pytest"]
+    coder.lint_outcome = False
+    coder.test_outcome = True
+    coder.reflected_message = "Fix the lint errors"
+    coder.num_reflections = 2
+    coder.last_aider_commit_hash = "abc1234"
+
+    io = InputOutput(yes=True)
+    reset_coder(coder, io, [second], [readme])
+
+    assert coder.io is io
+    assert coder.cur_messages == []
+    assert coder.done_messages == []
+    assert coder.summarized_done_messages == []
+    assert coder.total_cost == 0.0
+    assert coder.aider_edited_files == set()
+    assert coder.ignore_mentions == set()
+    assert coder.shell_commands == []
+    assert coder.lint_outcome is None and coder.test_outcome is None
+    assert coder.reflected_message is None and coder.num_reflections == 0
+    assert coder.last_aider_commit_hash is None
+    assert coder.abs_fnames == {os.path.realpath(second)}
+    assert coder.abs_read_only_fnames == {os.path.realpath(readme)}
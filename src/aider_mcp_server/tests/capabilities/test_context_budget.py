@@ -0,0 +1,156 @@
+"""
+Tests for the context_budget module.
+"""
+
+import os
+import tempfile
+import shutil
+import pytest
+import litellm
+from aider.io import InputOutput
+from aider.models import Model
+from aider_mcp_server.capabilities import metrics
+from aider_mcp_server.capabilities.coder_cache import model_cache
+from aider_mcp_server.capabilities.context_budget import outline, plan_context
+from aider_mcp_server.capabilities.file_snapshots import SessionFiles
+from aider_mcp_server.capabilities.tools.aider_ai_code import code_with_aider
+
+BILLING = '''"""Billing."""
+
+
+class Invoice:
+    """An invoice."""
+
+    def total(self, lines):
+        amount = 0
+        for line in lines:
+            amount += line.price * line.quantity
+        return amount
+
+    def tax(self, rate):
+        return self.total([]) * rate
+'''
+
+
+class FakeModel:
+    """The parts of an Aider Model the planner uses."""
+    name = "gpt-4o"
+    info = {"max_input_tokens": 128000}
+
+    def token_count(self, text):
+        return litellm.token_counter(model=self.name, text=text)
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory with a relevant source file and unrelated large files."""
+    temp_dir = tempfile.mkdtemp()
+    with open(os.path.join(temp_dir, "billing.py"), "w") as f:
+        f.write(BILLING)
+    with open(os.path.join(temp_dir, "shipping.py"), "w") as f:
+        for index in range(40):
+            f.write(f"def route_{index}(parcel):\n    return parcel.weight * {index} + len(parcel.address)\n\n")
+    with open(os.path.join(temp_dir, "notes.md"), "w") as f:
+        f.write("Meeting notes about the office move.\n" * 300)
+    with open(os.path.join(temp_dir, "main.py"), "w") as f:
+        f.write("print('hello')\n")
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def _paths(temp_dir, names):
+    return {name: os.path.join(temp_dir, name) for name in names}
+
+
+def _hits():
+    return dict((labels["cache"], value) for _, labels, value in metrics.cache_hits.samples()).get("token_count", 0)
+
+
+def test_no_plan_without_budget_or_readonly_files(temp_dir):
+    """Test that planning is skipped when turned off or when there is nothing to trim."""
+    readonly = _paths(temp_dir, ["billing.py"])
+    assert plan_context(FakeModel(), "prompt", {}, readonly, budget=0) is None
+    assert plan_context(FakeModel(), "prompt", {}, {}) is None
+    plan = plan_context(FakeModel(), "prompt", {}, readonly)
+    assert plan.budget == 96000 and not plan.trimmed and plan.kept == ["billing.py"]
+
+
+def test_trims_least_relevant_files(temp_dir):
+    """Test that the relevant file is kept whole and the others are outlined or dropped."""
+    count = FakeModel().token_count
+    readonly = _paths(temp_dir, ["shipping.py", "notes.md", "billing.py"])
+    editable = _paths(temp_dir, ["main.py"])
+    prompt = "Add a discount to Invoice.total in billing.py"
+    budget = count(prompt) + count(BILLING) + 700
+    plan = plan_context(FakeModel(), prompt, editable, readonly, budget=budget)
+
+    actions = {entry.file: entry.action for entry in plan.files}
+    assert actions == {"billing.py": "full", "shipping.py": "outline", "notes.md": "dropped"}
+    assert plan.kept == ["shipping.py", "billing.py"]
+    assert plan.sent_tokens <= plan.available < plan.readonly_tokens
+    shipping = plan.outlines[readonly["shipping.py"]]
+    assert "def route_7(parcel):" in shipping and "parcel.weight" not in shipping
+
+    # Aider reads the outline in place of the file
+    files = SessionFiles(editable, {name: readonly[name] for name in plan.kept}, plan.outlines)
+    with files.track():
+        assert InputOutput(yes=True).read_text(readonly["shipping.py"]) == shipping
+
+
+def test_trimmed_sessions_warn(temp_dir, capsys):
+    """Test that a session whose read-only files were trimmed says so on stderr and in its progress."""
+    model = Model("gpt-4o")
+    # litellm returns the mock response without calling the API
+    model.extra_params = {"mock_response": "Nothing to change."}
+    model_cache.get_or_create(("gpt-4o", None, "{}"), lambda: model)
+    events = []
+    try:
+        result = code_with_aider(
+            ai_coding_prompt="Add a discount to Invoice.total in billing.py",
+            relative_editable_files=["main.py"],
+            relative_readonly_files=["billing.py", "notes.md"],
+            settings={"reuse_coder": False, "context_budget": 1200},
+            editor_model="gpt-4o",
+            current_working_dir=temp_dir,
+            progress_callback=events.append,
+        )
+    finally:
+        model_cache.clear()
+
+    assert [entry["file"] for entry in result["context"]["trimmed"]] == ["notes.md"]
+    warnings = [event["message"] for event in events if event["type"] == "log" and event["level"] == "warning"]
+    assert any("notes.md (dropped)" in message for message in warnings)
+    assert "Warning: Trimmed 1 read-only files" in capsys.readouterr().err
+
+
+def test_token_counts_are_cached_until_files_change(temp_dir):
+    """Test that unchanged files are not read and counted again."""
+    readonly = _paths(temp_dir, ["billing.py", "notes.md"])
+    first = plan_context(FakeModel(), "prompt", {}, readonly, budget=100000)
+    before = _hits()
+    plan_context(FakeModel(), "prompt", {}, readonly, budget=100000)
+    assert _hits() == before + 2
+
+    with open(readonly["billing.py"], "a") as f:
+        f.write("\n\ndef refund(invoice):\n    return -invoice.total([])\n")
+    changed = plan_context(FakeModel(), "prompt", {}, readonly, budget=100000)
+    assert changed.files[0].tokens > first.files[0].tokens
+    assert changed.files[1].tokens == first.files[1].tokens
+
+
+def test_planner_and_aider_share_one_read(temp_dir):
+    """Test that a file the planner read is served to Aider from the session's snapshot."""
+    readonly = _paths(temp_dir, ["notes.md"])
+    files = SessionFiles({}, readonly)
+    plan_context(FakeModel(), "prompt", {}, readonly, budget=100000,
+                 read=lambda path: files.read_text(path, "utf-8"))
+    with files.track():
+        assert InputOutput(yes=True).read_text(readonly["notes.md"]).startswith("Meeting notes")
+    assert files.reads_served == 1
+
+
+def test_outline_of_unsupported_files(temp_dir):
+    """Test that files without definitions or a known language have no outline."""
+    assert outline("notes.md", "notes.md", "Just text.\n") is None
+    assert outline("script.py", "script.py", "print(1)\n") is None
+    assert "def tax(self, rate):" in outline("billing.py", "billing.py", BILLING)
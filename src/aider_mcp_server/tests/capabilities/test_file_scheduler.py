@@ -0,0 +1,119 @@
+"""
+Tests for the file_scheduler module.
+"""
+
+import asyncio
+import os
+import tempfile
+import shutil
+import pytest
+from aider_mcp_server.capabilities.file_scheduler import FileLockScheduler, find_repo_root, group_claims
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+async def _run_sessions(scheduler, temp_dir, sessions):
+    """Run sessions through the scheduler and return the order they started in."""
+    started = []
+
+    async def session(name, editable, readonly, use_git):
+        async with scheduler.lock(temp_dir, editable, readonly, use_git=use_git):
+            started.append(name)
+            await asyncio.sleep(0.02)
+            started.append(f"/{name}")
+
+    await asyncio.gather(*(session(*args) for args in sessions))
+    return started
+
+
+def test_disjoint_sessions_run_in_parallel(temp_dir):
+    """Test that sessions editing different files overlap."""
+    scheduler = FileLockScheduler()
+    started = asyncio.run(_run_sessions(scheduler, temp_dir, [
+        ("a", ["a.py"], ["spec.md"], False),
+        ("b", ["b.py"], ["spec.md"], False),
+    ]))
+    assert started[:2] == ["a", "b"]
+
+
+def test_conflicting_sessions_run_in_fifo_order(temp_dir):
+    """Test that a write conflict serializes sessions in arrival order."""
+    scheduler = FileLockScheduler()
+    started = asyncio.run(_run_sessions(scheduler, temp_dir, [
+        ("a", ["a.py"], [], False),
+        ("b", ["b.py"], ["a.py"], False),
+        ("c", ["a.py"], [], False),
+    ]))
+    assert started.index("/a") < started.index("b")
+    assert started.index("/b") < started.index("c")
+
+
+def test_git_sessions_lock_the_repo(temp_dir):
+    """Test that git-enabled sessions exclude every other session in the repo."""
+    os.mkdir(os.path.join(temp_dir, ".git"))
+    scheduler = FileLockScheduler()
+    started = asyncio.run(_run_sessions(scheduler, temp_dir, [
+        ("a", ["a.py"], [], True),
+        ("b", ["b.py"], [], False),
+    ]))
+    assert started == ["a", "/a", "b", "/b"]
+    assert scheduler.active == 0
+    assert scheduler.waiting == 0
+
+
+def test_find_repo_root(temp_dir):
+    """Test that the repository root is found from a subdirectory."""
+    os.mkdir(os.path.join(temp_dir, ".git"))
+    subdir = os.path.join(temp_dir, "pkg")
+    os.mkdir(subdir)
+    assert find_repo_root(subdir) == os.path.realpath(temp_dir)
+
+
+def test_group_claims(temp_dir):
+    """Test that non-overlapping claims share a group and conflicts keep their order."""
+    scheduler = FileLockScheduler()
+    claims = [
+        scheduler.make_claim(temp_dir, ["a.py"]),
+        scheduler.make_claim(temp_dir, ["b.py"]),
+        scheduler.make_claim(temp_dir, ["a.py", "c.py"]),
+        scheduler.make_claim(temp_dir, ["c.py"]),
+        scheduler.make_claim(temp_dir, ["d.py"], ["b.py"]),
+    ]
+    assert group_claims(claims) == [[0, 1], [2, 4], [3]]
+
+
+def test_cross_process_locks(temp_dir):
+    """Test that schedulers of different processes serialize writes to the same file."""
+    # flock locks belong to the open file, so two schedulers stand in for two processes
+    first = FileLockScheduler(cross_process=True)
+    second = FileLockScheduler(cross_process=True)
+
+    async def scenario():
+        started = []
+
+        async def session(scheduler, name, editable, readonly):
+            async with scheduler.lock(temp_dir, editable, readonly):
+                started.append(name)
+                await asyncio.sleep(0.1)
+                started.append(f"/{name}")
+
+        await asyncio.gather(
+            session(first, "a", ["a.py"], []),
+            session(second, "b", ["a.py"], []),
+            session(second, "c", ["c.py"], ["spec.md"]),
+            session(first, "d", ["d.py"], ["spec.md"]),
+        )
+        return started
+
+    started = asyncio.run(scenario())
+    a, b = sorted(["a", "b"], key=started.index)
+    assert started.index(f"/{a}") < started.index(b)
+    # Shared reads and disjoint writes overlap across processes
+    assert started.index("d") < started.index("/c") and started.index("c") < started.index("/d")
+    assert os.path.isdir(os.path.join(temp_dir, ".aider-mcp", "locks"))
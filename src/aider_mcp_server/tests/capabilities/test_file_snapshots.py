@@ -0,0 +1,115 @@
+"""
+Tests for the file_snapshots module.
+"""
+
+import os
+import tempfile
+import shutil
+import pytest
+from aider.io import InputOutput
+from aider_mcp_server.capabilities import file_snapshots
+from aider_mcp_server.capabilities.file_snapshots import SessionFiles, file_digest, read_state
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory with an editable, a read-only and a CRLF file."""
+    temp_dir = tempfile.mkdtemp()
+    with open(os.path.join(temp_dir, "main.py"), "w") as f:
+        f.write("x = 1\n")
+    with open(os.path.join(temp_dir, "spec.md"), "w") as f:
+        f.write("# Spec\n")
+    with open(os.path.join(temp_dir, "dos.py"), "wb") as f:
+        f.write(b"a = 1\r\nb = 2\r\n")
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def _paths(temp_dir, names):
+    return {name: os.path.join(temp_dir, name) for name in names}
+
+
+def test_reads_served_from_snapshot(temp_dir):
+    """Test that repeated reads are served from one read and writes invalidate it."""
+    files = SessionFiles(_paths(temp_dir, ["main.py", "dos.py"]), _paths(temp_dir, ["spec.md"]))
+    io = InputOutput(yes=True)
+    main = os.path.join(temp_dir, "main.py")
+
+    with files.track():
+        assert io.read_text(main) == "x = 1\n"
+        assert io.read_text(main) == "x = 1\n"
+        # Line endings are translated as a text mode read does
+        assert io.read_text(os.path.join(temp_dir, "dos.py")) == "a = 1\nb = 2\n"
+        assert io.read_text(os.path.join(temp_dir, "spec.md")) == "# Spec\n"
+        assert io.read_text(os.path.join(temp_dir, "spec.md")) == "# Spec\n"
+        assert files.reads_served == 4
+
+        io.write_text(main, "x = 2\n")
+        assert io.read_text(main) == "x = 2\n"
+    assert file_snapshots.current_files() is None
+
+
+def test_changed_detects_by_hash(temp_dir):
+    """Test that rewriting identical content is no change and real edits produce diffs."""
+    files = SessionFiles(_paths(temp_dir, ["main.py", "dos.py", "new.py"]))
+    io = InputOutput(yes=True)
+
+    with files.track():
+        # Rewritten with the same bytes: the stat changes but the hash does not
+        with open(os.path.join(temp_dir, "dos.py"), "wb") as f:
+            f.write(b"a = 1\r\nb = 2\r\n")
+        io.write_text(os.path.join(temp_dir, "main.py"), "x = 2\n")
+        with open(os.path.join(temp_dir, "new.py"), "w") as f:
+            f.write("z = 1\n")
+
+    diffs = files.diffs()
+    assert sorted(diffs) == ["main.py", "new.py"]
+    assert "-x = 1\n+x = 2\n" in diffs["main.py"]
+    assert diffs["new.py"].startswith("--- /dev/null\n+++ b/new.py\n")
+
+
+def test_restore_is_byte_exact(temp_dir):
+    """Test that a rollback restores line endings and removes created files."""
+    files = SessionFiles(_paths(temp_dir, ["dos.py", "new.py"]))
+    with open(os.path.join(temp_dir, "dos.py"), "w") as f:
+        f.write("changed\n")
+    with open(os.path.join(temp_dir, "new.py"), "w") as f:
+        f.write("z = 1\n")
+
+    assert sorted(files.restore(list(files.diffs()))) == ["dos.py", "new.py"]
+    with open(os.path.join(temp_dir, "dos.py"), "rb") as f:
+        assert f.read() == b"a = 1\r\nb = 2\r\n"
+    assert not os.path.exists(os.path.join(temp_dir, "new.py"))
+    assert files.diffs() == {}
+
+
+def test_files_written_outside_the_editable_set_are_restored(temp_dir):
+    """Test that files Aider created or wrote outside the editable files are put back."""
+    from aider import utils
+
+    files = SessionFiles(_paths(temp_dir, ["main.py"]), _paths(temp_dir, ["spec.md"]))
+    io = InputOutput(yes=True)
+    created = os.path.join(temp_dir, "pkg", "sub", "new.py")
+    spec = os.path.join(temp_dir, "spec.md")
+
+    with files.track():
+        # How Aider creates a file its edit adds
+        assert utils.touch_file(created)
+        io.write_text(created, "y = 2\n")
+        io.write_text(spec, "# Changed\n")
+        io.write_text(os.path.join(temp_dir, "main.py"), "x = 2\n")
+
+    assert sorted(files.restore_outside()) == sorted([created, spec])
+    assert not os.path.exists(os.path.join(temp_dir, "pkg"))
+    with open(spec) as f:
+        assert f.read() == "# Spec\n"
+    # Editable files are left to restore()
+    assert list(files.changed()) == ["main.py"]
+
+
+def test_large_files_hashed_through_mmap(temp_dir, monkeypatch):
+    """Test that the memory-mapped hash matches the hash of the content read."""
+    monkeypatch.setattr(file_snapshots, "MMAP_THRESHOLD", 4)
+    path = os.path.join(temp_dir, "main.py")
+    assert file_digest(path) == read_state(path).digest
+    assert file_digest(os.path.join(temp_dir, "missing.py")) is None
@@ -0,0 +1,117 @@
+"""
+Tests for the http_workers module.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+import shutil
+from functools import partial
+import pytest
+import uvicorn
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from aider_mcp_server.capabilities.http_workers import (
+    DrainingServer,
+    HttpWorker,
+    MESSAGE_PREFIX,
+    _worker_main,
+    message_relay,
+)
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def ignore_sigterm():
+    """Ignore the SIGTERM uvicorn raises again once it has shut down."""
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: None)
+    yield
+    signal.signal(signal.SIGTERM, previous)
+
+
+def test_worker_paths(temp_dir):
+    """Test that each worker has its own message path and Unix socket."""
+    worker = HttpWorker(1, 3, temp_dir)
+    assert worker.message_path == "/messages/1/"
+    assert worker.socket_path().endswith("worker-1.sock")
+    assert worker.socket_path(2).endswith("worker-2.sock")
+
+
+def test_workers_leave_the_terminal_process_group(temp_dir):
+    """Test that a Ctrl+C in the terminal only reaches the supervisor, not the workers."""
+    process = multiprocessing.get_context("spawn").Process(
+        target=_worker_main,
+        args=(partial(time.sleep, 30), HttpWorker(0, 1, temp_dir), None),
+    )
+    process.start()
+    try:
+        deadline = time.monotonic() + 30
+        while os.getpgid(process.pid) != process.pid and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert os.getpgid(process.pid) == process.pid != os.getpgrp()
+    finally:
+        process.terminate()
+        process.join()
+
+
+def test_relay_rejects_unknown_owners(temp_dir):
+    """Test that messages are only relayed to another existing worker."""
+    worker = HttpWorker(0, 2, temp_dir)
+    app = Starlette(routes=[
+        Route(MESSAGE_PREFIX + "{path:path}", endpoint=message_relay(worker), methods=["POST"])
+    ])
+    client = TestClient(app)
+    for path in ("/messages/0/", "/messages/5/", "/messages/x/"):
+        assert client.post(path + "?session_id=abc", content=b"{}").status_code == 404
+    # Worker 1 is not running, so its socket does not exist
+    assert client.post("/messages/1/?session_id=abc", content=b"{}").status_code == 503
+
+
+def test_draining_server_waits_for_running_requests(ignore_sigterm):
+    """Test that the first signal stops the server only once running requests are done."""
+    running = [1]
+
+    async def scenario():
+        config = uvicorn.Config(Starlette(), host="127.0.0.1", port=0, log_level="error")
+        drained = []
+        server = DrainingServer(config, lambda: running[0], drain_timeout=5,
+                                on_drain=lambda: drained.append(True))
+        task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        server.handle_exit(signal.SIGTERM, None)
+        await asyncio.sleep(0.3)
+        assert server.draining and not server.should_exit and not task.done()
+        assert drained == [True]
+        running[0] = 0
+        await asyncio.wait_for(task, 5)
+        assert server.should_exit
+
+    asyncio.run(scenario())
+
+
+def test_draining_server_times_out(ignore_sigterm):
+    """Test that draining gives up after the timeout and a second signal exits at once."""
+    async def scenario(signals):
+        config = uvicorn.Config(Starlette(), host="127.0.0.1", port=0, log_level="error")
+        server = DrainingServer(config, lambda: 1, drain_timeout=0.2 if signals == 1 else 60)
+        task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        for _ in range(signals):
+            server.handle_exit(signal.SIGTERM, None)
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(scenario(1))
+    asyncio.run(scenario(2))
@@ -0,0 +1,161 @@
+"""
+Tests for the job_queue module.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+import shutil
+import pytest
+from aider_mcp_server.capabilities.job_queue import JobError, JobQueue, JobRunner, MAX_ATTEMPTS
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for the job database."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def test_jobs_are_claimed_by_priority_then_order(temp_dir):
+    """Test that higher priority jobs run first and equal priorities in submission order."""
+    queue = JobQueue(os.path.join(temp_dir, "jobs.db"))
+    low = queue.submit({"n": 1})
+    first = queue.submit({"n": 2}, priority=5)
+    second = queue.submit({"n": 3}, priority=5)
+
+    assert queue.position(low.id) == 2
+    assert [queue.claim().id for _ in range(3)] == [first.id, second.id, low.id]
+    assert queue.claim() is None
+    assert queue.get(low.id).status == "running"
+    with pytest.raises(JobError):
+        queue.get("missing")
+    queue.close()
+
+
+def test_database_is_created_on_first_submission(temp_dir):
+    """Test that an unused queue leaves no database behind."""
+    path = os.path.join(temp_dir, "sub", "jobs.db")
+    queue = JobQueue(path)
+    assert queue.claim() is None
+    assert queue.recover() == 0
+    assert not os.path.exists(path)
+    queue.submit({})
+    assert os.path.exists(path)
+    queue.close()
+
+
+def test_running_jobs_survive_a_restart(temp_dir):
+    """Test that a job left running by a dead process is queued again, within its attempts."""
+    path = os.path.join(temp_dir, "jobs.db")
+    crashed = JobQueue(path)
+    job = crashed.submit({"n": 1})
+    crashed.claim()
+    # A process that no longer exists on this host
+    crashed.owner = crashed.owner.split(":")[0] + ":999999999:dead"
+    crashed._db.execute("UPDATE jobs SET owner = ?", (crashed.owner,))
+    crashed._db.commit()
+    crashed.close()
+
+    restarted = JobQueue(path)
+    assert restarted.recover() == 1
+    assert restarted.get(job.id).status == "queued"
+
+    restarted._db.execute("UPDATE jobs SET status = 'running', attempts = ?", (MAX_ATTEMPTS,))
+    restarted._db.commit()
+    restarted.owner = "elsewhere"
+    assert restarted.recover() == 1
+    assert restarted.get(job.id).status == "failed"
+    restarted.close()
+
+
+def test_runner_stores_results_and_requeues_on_shutdown(temp_dir):
+    """Test that the runner stores results and errors, and queues running jobs again when stopped."""
+    queue = JobQueue(os.path.join(temp_dir, "jobs.db"))
+    done = queue.submit({"outcome": "success"})
+    broken = queue.submit({"outcome": "raise"})
+    slow = queue.submit({"outcome": "hang"})
+
+    async def run(request):
+        if request["outcome"] == "raise":
+            raise RuntimeError("boom")
+        if request["outcome"] == "hang":
+            await asyncio.sleep(60)
+        return {"status": "success"}
+
+    async def main():
+        runner = JobRunner(queue, concurrency=3)
+        runner.start(run)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if queue.counts()["running"] == 1 and slow.id in runner.running:
+                break
+        await runner.stop()
+
+    asyncio.run(main())
+    assert queue.get(done.id).result == {"status": "success"}
+    assert queue.get(broken.id).status == "failed"
+    assert queue.get(broken.id).error == "boom"
+    requeued = queue.get(slow.id)
+    assert (requeued.status, requeued.attempts) == ("queued", 0)
+    queue.close()
+
+
+def test_draining_runner_finishes_running_jobs_only(temp_dir):
+    """Test that a draining runner lets running jobs finish but claims no new ones."""
+    queue = JobQueue(os.path.join(temp_dir, "jobs.db"))
+    first = queue.submit({"delay": 0.2})
+
+    async def run(request):
+        await asyncio.sleep(request["delay"])
+        return {"status": "success"}
+
+    async def main():
+        runner = JobRunner(queue, concurrency=1)
+        runner.start(run)
+        while first.id not in runner.running:
+            await asyncio.sleep(0.01)
+        runner.drain()
+        queue.submit({"delay": 0})
+        runner.wake()
+        while runner.running:
+            await asyncio.sleep(0.01)
+        await runner.stop()
+
+    asyncio.run(main())
+    assert queue.get(first.id).status == "finished"
+    assert queue.counts()["queued"] == 1
+    queue.close()
+
+
+def test_runner_does_not_block_the_event_loop(temp_dir, monkeypatch):
+    """Test that the runner waits for a locked database on a worker thread."""
+    queue = JobQueue(os.path.join(temp_dir, "jobs.db"))
+    queue.submit({})
+    original_claim = queue.claim
+
+    def slow_claim():
+        # As if another process held the database lock
+        time.sleep(0.3)
+        return original_claim()
+
+    monkeypatch.setattr(queue, "claim", slow_claim)
+
+    async def run(request):
+        return {"status": "success"}
+
+    async def main():
+        runner = JobRunner(queue, concurrency=1)
+        runner.start(run)
+        started = time.monotonic()
+        ticks = 0
+        while time.monotonic() - started < 0.25:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        await runner.stop()
+        return ticks
+
+    assert asyncio.run(main()) > 10
+    queue.close()
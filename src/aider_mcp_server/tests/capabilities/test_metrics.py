@@ -0,0 +1,113 @@
+"""
+Tests for the metrics module.
+"""
+
+import asyncio
+import pytest
+from aider_mcp_server.capabilities import metrics
+from aider_mcp_server.capabilities.coder_cache import LRUCache
+from aider_mcp_server.capabilities.worker_pool import WorkerPool
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Test that a histogram exposes cumulative buckets, count and sum."""
+    registry = metrics.MetricsRegistry()
+    histogram = registry.register(metrics.Histogram("test_seconds", "Test.", ("phase",), buckets=(1.0, 5.0)))
+    histogram.observe(0.5, phase="llm")
+    histogram.observe(2.0, phase="llm")
+    histogram.observe(7.5, phase="llm")
+
+    text = registry.render()
+    assert "# TYPE aider_mcp_test_seconds histogram" in text
+    assert 'aider_mcp_test_seconds_bucket{phase="llm",le="1"} 1' in text
+    assert 'aider_mcp_test_seconds_bucket{phase="llm",le="5"} 2' in text
+    assert 'aider_mcp_test_seconds_bucket{phase="llm",le="+Inf"} 3' in text
+    assert 'aider_mcp_test_seconds_count{phase="llm"} 3' in text
+    assert 'aider_mcp_test_seconds_sum{phase="llm"} 10' in text
+
+
+def test_label_values_are_escaped():
+    """Test that quotes, backslashes and newlines in label values are escaped."""
+    registry = metrics.MetricsRegistry()
+    counter = registry.register(metrics.Counter("test_total", "Test.", ("model",)))
+    counter.inc(model='a"b\\c\nd')
+    assert 'aider_mcp_test_total{model="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+
+def test_track_request_records_outcome():
+    """Test that requests are counted by outcome, including failures."""
+    async def run():
+        async with metrics.track_request("test_tool") as request:
+            request.status = "busy"
+        with pytest.raises(ValueError):
+            async with metrics.track_request("test_tool"):
+                raise ValueError("boom")
+
+    asyncio.run(run())
+    text = metrics.render()
+    assert 'aider_mcp_requests_total{tool="test_tool",status="busy"} 1' in text
+    assert 'aider_mcp_requests_total{tool="test_tool",status="error"} 1' in text
+    assert 'aider_mcp_request_duration_seconds_count{tool="test_tool"} 2' in text
+
+
+def test_record_session_counts_tokens_and_cost():
+    """Test that a session's usage is added to the per-model counters."""
+    result = {
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "cost": 0.25},
+        "timings": {"setup_seconds": 0.1, "llm_seconds": 2.0, "apply_seconds": 0.01, "total_seconds": 2.2},
+    }
+    metrics.record_session(result, "test-model", 0.5)
+    metrics.record_session(result, "test-model", 0.5)
+
+    text = metrics.render()
+    assert 'aider_mcp_tokens_total{model="test-model",kind="prompt"} 200' in text
+    assert 'aider_mcp_tokens_total{model="test-model",kind="completion"} 40' in text
+    assert 'aider_mcp_cost_dollars_total{model="test-model"} 0.5' in text
+    assert 'aider_mcp_session_phase_seconds_bucket{phase="queue",le="0.5"}' in text
+
+
+def test_counter_changes_are_added_in_another_process():
+    """Test that counter changes measured in a worker are added to live and stored counters."""
+    before = metrics.counter_values()
+    metrics.context_trimmed.inc(2, action="measured")
+    changes = metrics.counter_changes(before)
+    assert changes == {"aider_mcp_context_trimmed_files_total": {("measured",): 2.0}}
+
+    cache = LRUCache(2)
+    cache.get_or_create("a", object)
+    hits = dict((labels["cache"], value) for _, labels, value in metrics.cache_hits.samples())
+    metrics.add_counter_changes({**changes, "aider_mcp_cache_hits_total": {("coder",): 3.0}})
+    trimmed = dict((labels["action"], value) for _, labels, value in metrics.context_trimmed.samples())
+    assert trimmed["measured"] == 4
+    after = dict((labels["cache"], value) for _, labels, value in metrics.cache_hits.samples())
+    assert after["coder"] == hits["coder"] + 3
+
+
+def test_snapshots_of_several_workers_render_together():
+    """Test that each worker's samples are labelled and listed under one HELP line."""
+    first = metrics.snapshot(worker="0")
+    second = metrics.snapshot(worker="1")
+    text = metrics.render([first, second])
+    assert text.count("# HELP aider_mcp_requests_in_flight ") == 1
+    assert 'aider_mcp_requests_in_flight{worker="0"}' in text
+    assert 'aider_mcp_requests_in_flight{worker="1"}' in text
+
+
+def test_gauges_and_cache_counters_read_live_objects():
+    """Test that load gauges and cache hit counters are read at collection time."""
+    pool = WorkerPool(max_workers=1, max_queue=2)
+    metrics.watch_worker_pool(pool)
+    cache = LRUCache(2)
+    cache.get_or_create("a", object)
+    cache.get_or_create("a", object)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    async def run():
+        async with pool.admit(), pool.admit():
+            return metrics.render()
+
+    text = asyncio.run(run())
+    pool.shutdown()
+    assert "aider_mcp_sessions_in_flight 2" in text
+    assert "aider_mcp_queue_depth 1" in text
+    assert 'aider_mcp_cache_hits_total{cache="coder"}' in text
@@ -0,0 +1,47 @@
+"""
+Tests for the model_index module.
+"""
+
+import time
+from aider_mcp_server.capabilities.model_index import ModelIndex
+
+MODELS = {
+    "gpt-4o": {"provider": "openai", "max_input_tokens": 128000},
+    "openai/gpt-4o": {"provider": "openai", "max_input_tokens": 128000},
+    "gpt-4o-mini": {"provider": "openai", "max_input_tokens": 128000},
+    "azure/gpt-4o": {"provider": "azure", "max_input_tokens": 128000},
+    "claude-3-5-sonnet-latest": {"provider": "anthropic", "max_input_tokens": 200000},
+    "o1": {"provider": "openai"},
+}
+
+
+def test_search_ranks_and_paginates():
+    """Test that matches are ranked exact first and can be paged through."""
+    index = ModelIndex(loader=lambda: MODELS)
+    assert index.search("GPT-4O") == ["gpt-4o", "azure/gpt-4o", "openai/gpt-4o", "gpt-4o-mini"]
+    assert index.search("gpt-4o", limit=2, offset=1) == ["azure/gpt-4o", "openai/gpt-4o"]
+    assert index.search("o1") == ["o1"]
+    assert index.search("mini", include_metadata=True) == [
+        {"name": "gpt-4o-mini", "provider": "openai", "max_input_tokens": 128000}
+    ]
+
+
+def test_search_falls_back_to_fuzzy_matches():
+    """Test that misspelled names return close matches and unknown names nothing."""
+    index = ModelIndex(loader=lambda: MODELS)
+    assert index.search("claude-3-5-sonet") == ["claude-3-5-sonnet-latest"]
+    assert index.search("this_model_does_not_exist_12345") == []
+
+
+def test_refresh_rebuilds_stale_index():
+    """Test that a stale index keeps answering while it is rebuilt in the background."""
+    models = dict(MODELS)
+    index = ModelIndex(refresh_interval=0.0, loader=lambda: dict(models))
+    assert index.search("llama") == []
+    models["llama-3"] = {"provider": "meta"}
+    # The stale index answers the query that triggers the refresh
+    assert index.search("llama") == []
+    deadline = time.monotonic() + 5
+    while index.search("llama") != ["llama-3"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.search("llama") == ["llama-3"]
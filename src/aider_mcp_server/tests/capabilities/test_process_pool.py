@@ -0,0 +1,152 @@
+"""
+Tests for the process_pool module.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+import pytest
+from aider_mcp_server.capabilities import metrics
+from aider_mcp_server.capabilities.cancellation import CancelToken
+from aider_mcp_server.capabilities.process_pool import PreforkPool, WorkerCrashedError
+from aider_mcp_server.capabilities.worker_pool import WorkerPool
+
+_warmed = None
+
+
+def _warm(value):
+    global _warmed
+    _warmed = value
+
+
+def _report(_=None):
+    return os.getpid(), _warmed
+
+
+def _fail():
+    raise ValueError("bad input")
+
+
+def _crash():
+    os._exit(3)
+
+
+def _wait_for_cancel(token, started_path):
+    open(started_path, "w").close()
+    deadline = time.monotonic() + 20
+    while not token.cancelled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return token.reason
+
+
+def _trim(count):
+    metrics.context_trimmed.inc(count, action="forwarded-test")
+
+
+def _trimmed():
+    return dict((labels["action"], value) for _, labels, value in metrics.context_trimmed.samples()).get(
+        "forwarded-test", 0)
+
+
+def _recycles(reason):
+    return dict((labels["reason"], value) for _, labels, value in metrics.worker_recycles.samples()).get(reason, 0)
+
+
+def test_workers_are_warm_and_recycled_after_max_tasks():
+    """Test that workers run the initializer once and are replaced after their task limit."""
+    pool = PreforkPool(1, max_tasks=2, max_memory_mb=0, initializer=_warm, initargs=("ready",))
+    try:
+        before = _recycles("tasks")
+        results = [pool.submit(_report).result(timeout=30) for _ in range(4)]
+        assert all(warmed == "ready" for _, warmed in results)
+        pids = [pid for pid, _ in results]
+        assert pids[0] == pids[1] != pids[2] == pids[3]
+        # The last recycle may still be in progress when its result arrives
+        assert _recycles("tasks") >= before + 1
+    finally:
+        pool.shutdown()
+
+
+def test_memory_limit_recycles_worker():
+    """Test that a worker above the memory limit is replaced after its task."""
+    pool = PreforkPool(1, max_tasks=0, max_memory_mb=1)
+    try:
+        first, _ = pool.submit(_report).result(timeout=30)
+        second, _ = pool.submit(_report).result(timeout=30)
+        assert first != second
+    finally:
+        pool.shutdown()
+
+
+def test_worker_counters_are_added_to_the_server_metrics():
+    """Test that what a task counts in its worker process shows in the server's metrics."""
+    pool = PreforkPool(1, max_tasks=0, max_memory_mb=0)
+    try:
+        pool.submit(_trim, 2).result(timeout=30)
+        pool.submit(_trim, 3).result(timeout=30)
+        assert _trimmed() == 5
+    finally:
+        pool.shutdown()
+
+
+def test_broadcast_reaches_every_worker():
+    """Test that a broadcast call changes the state of the workers before their next task."""
+    pool = PreforkPool(2, max_tasks=0, max_memory_mb=0, initializer=_warm, initargs=("ready",))
+    try:
+        pool.broadcast(_warm, "evicted")
+        results = [pool.submit(_report).result(timeout=30) for _ in range(4)]
+        assert [warmed for _, warmed in results] == ["evicted"] * 4
+    finally:
+        pool.shutdown()
+
+
+def test_errors_and_crashes():
+    """Test that exceptions are raised to the caller and a dead worker is replaced."""
+    pool = PreforkPool(1, max_tasks=0, max_memory_mb=0)
+    try:
+        with pytest.raises(ValueError, match="bad input"):
+            pool.submit(_fail).result(timeout=30)
+        with pytest.raises(WorkerCrashedError):
+            pool.submit(_crash).result(timeout=30)
+        # Unpicklable callables fail without taking the worker down
+        with pytest.raises(Exception):
+            pool.submit(lambda: None).result(timeout=30)
+        assert pool.submit(_report).result(timeout=30)[0] != os.getpid()
+    finally:
+        pool.shutdown()
+    with pytest.raises(RuntimeError):
+        pool.submit(_report)
+
+
+def test_worker_pool_process_mode():
+    """Test that the process mode of WorkerPool runs callables in worker processes."""
+    pool = WorkerPool(max_workers=2, max_queue=0, mode="process", initializer=_warm, initargs=("pool",))
+    try:
+        async def scenario():
+            return await asyncio.gather(*(pool.run(_report, index) for index in range(2)))
+
+        results = asyncio.run(scenario())
+        assert all(pid != os.getpid() and warmed == "pool" for pid, warmed in results)
+    finally:
+        pool.shutdown()
+
+
+def test_interrupt_cancels_running_task():
+    """Test that an interrupt cancels the copy of the token a running task received."""
+    pool = PreforkPool(2, max_memory_mb=0)
+    started = os.path.join(tempfile.mkdtemp(), "started")
+    try:
+        token = CancelToken()
+        future = pool.submit(_wait_for_cancel, token, started)
+        deadline = time.monotonic() + 30
+        while not os.path.exists(started) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Only the worker that received the token acts on it
+        pool.interrupt(token.id, "cancelled")
+        assert future.result(timeout=30) == "cancelled"
+        assert token.reason is None
+    finally:
+        pool.shutdown()
+        os.remove(started)
+        os.rmdir(os.path.dirname(started))
@@ -0,0 +1,79 @@
+"""
+Tests for the progress module.
+"""
+
+import asyncio
+import os
+import tempfile
+import shutil
+import pytest
+from aider.coders import Coder
+from aider.models import Model
+from aider_mcp_server.capabilities.progress import ProgressIO, ProgressReporter
+
+EDIT_RESPONSE = """math.py
+```python
+<<<<<<< SEARCH
+def add(a, b):
+    return a - b
+=======
+def add(a, b):
+    return a + b
+>>>>>>> REPLACE
+```
+"""
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def test_progress_io_streams_tokens_and_edits(temp_dir):
+    """Test that a Coder run through ProgressIO reports tokens and applied edits."""
+    file_path = os.path.join(temp_dir, "math.py")
+    with open(file_path, "w") as f:
+        f.write("def add(a, b):\n    return a - b\n")
+
+    events = []
+    model = Model("gpt-4o")
+    # litellm returns the mock response as a local stream without calling the API
+    model.extra_params = {"mock_response": EDIT_RESPONSE}
+    coder = Coder.create(
+        main_model=model,
+        io=ProgressIO(events.append),
+        fnames=[file_path],
+        use_git=False,
+        auto_commits=False,
+    )
+    coder.run("Fix the add function")
+
+    tokens = "".join(e["text"] for e in events if e["type"] == "token")
+    assert "<<<<<<< SEARCH" in tokens
+    assert {"type": "edit", "path": "math.py", "status": "applied"} in events
+    with open(file_path) as f:
+        assert "return a + b" in f.read()
+
+
+def test_reporter_collects_summary():
+    """Test that events queued from another thread end up in the summary."""
+    async def scenario():
+        reporter = ProgressReporter(None)
+        pump = asyncio.create_task(reporter.pump())
+        await asyncio.to_thread(reporter.callback, {"type": "token", "text": "hello"})
+        await asyncio.to_thread(reporter.callback, {"type": "edit", "path": "a.py", "status": "applied"})
+        await asyncio.to_thread(reporter.callback, {"type": "log", "level": "warning", "message": "careful"})
+        reporter.close()
+        await pump
+        return reporter.summary({"status": "success"})
+
+    summary = asyncio.run(scenario())
+    assert summary == {
+        "status": "success",
+        "response_chars": 5,
+        "warnings": ["careful"],
+        "errors": [],
+    }
@@ -0,0 +1,73 @@
+"""
+Tests for the prompt_cache module.
+"""
+
+import os
+import tempfile
+import shutil
+import pytest
+from aider.coders import Coder
+from aider.io import InputOutput
+from aider.models import Model
+from aider_mcp_server.capabilities.prompt_cache import stabilize_prompt_prefix
+
+READONLY = ["spec.md", "api.py", "types.py", "notes.md"]
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory with read-only context and a file to edit."""
+    temp_dir = tempfile.mkdtemp()
+    for name in READONLY + ["main.py"]:
+        with open(os.path.join(temp_dir, name), "w") as f:
+            f.write(f"# {name}\n")
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def _coder(temp_dir, read_only):
+    model = Model("gpt-4o")
+    model.cache_control = True
+    coder = Coder.create(
+        main_model=model,
+        io=InputOutput(yes=True),
+        fnames=[os.path.join(temp_dir, "main.py")],
+        read_only_fnames=[os.path.join(temp_dir, name) for name in read_only],
+        use_git=False,
+        cache_prompts=True,
+    )
+    return stabilize_prompt_prefix(coder)
+
+
+def _cached(message):
+    content = message["content"]
+    return isinstance(content, list) and "cache_control" in content[0]
+
+
+def test_read_only_files_form_a_stable_prefix(temp_dir):
+    """Test that the prompt prefix does not depend on the order the read-only files were given in."""
+    first = _coder(temp_dir, READONLY).format_messages()
+    second = _coder(temp_dir, list(reversed(READONLY))).format_messages()
+
+    prefix = first.system + first.examples + first.readonly_files
+    assert prefix == second.system + second.examples + second.readonly_files
+    text = first.readonly_files[0]["content"]
+    text = text if isinstance(text, str) else text[0]["text"]
+    positions = [text.index(f"\n{name}\n") for name in sorted(READONLY)]
+    assert positions == sorted(positions)
+
+
+def test_read_only_files_get_their_own_breakpoint(temp_dir):
+    """Test that the read-only files stay cached when the repo map after them changes."""
+    coder = _coder(temp_dir, READONLY)
+    coder.get_repo_messages = lambda: [
+        dict(role="user", content="repo map"),
+        dict(role="assistant", content="Ok."),
+    ]
+    chunks = coder.format_messages()
+    assert _cached(chunks.readonly_files[-1])
+    assert _cached(chunks.repo[-1])
+
+    coder.add_cache_headers = False
+    chunks = coder.format_messages()
+    assert not any(_cached(message) for message in chunks.all_messages())
@@ -0,0 +1,188 @@
+"""
+Tests for the rate_limits module.
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+from aider_mcp_server.capabilities import metrics
+from aider_mcp_server.capabilities.rate_limits import (
+    AdaptiveLimit,
+    LimitedStream,
+    RateLimit,
+    RateLimiter,
+    TokenBucket,
+    estimate_tokens,
+    parse_rate_limit,
+)
+
+
+class RateLimitError(Exception):
+    """Stand-in for the providers' 429 exceptions."""
+    status_code = 429
+
+
+def test_parse_rate_limit():
+    """Test parsing KEY=RPM[:TPM] specifications."""
+    assert parse_rate_limit("gpt-4o=500:30000") == ("gpt-4o", RateLimit(500, 30000))
+    assert parse_rate_limit("openai=60") == ("openai", RateLimit(60, 0))
+    assert parse_rate_limit("*=:1000") == ("*", RateLimit(0, 1000))
+    for spec in ("gpt-4o", "=10", "gpt-4o=fast", "gpt-4o=-1"):
+        with pytest.raises(ValueError):
+            parse_rate_limit(spec)
+
+
+def test_token_bucket_refills_and_allows_debt():
+    """Test that buckets refill over time and larger amounts wait for a full bucket."""
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0
+    bucket.take(90)
+    assert bucket.wait_time(1, now) == pytest.approx(31)
+    # An amount above the capacity only needs a full bucket
+    assert bucket.wait_time(1000, now + 30) == pytest.approx(60)
+
+
+def test_adaptive_limit():
+    """Test additive increase, halving on 429 and backing off when slow."""
+    limit = AdaptiveLimit(8)
+    limit.throttled()
+    assert limit.value == 4
+    # One more concurrent request per limit's worth of successes
+    for _ in range(5):
+        limit.succeeded(1.0, 100)
+    assert limit.value == 5
+    # A single slow request is not a sustained slowdown
+    limit.succeeded(100.0, 100)
+    assert limit.value == 5
+    for _ in range(4):
+        limit.succeeded(100.0, 100)
+    assert limit.value == 4
+    for _ in range(100):
+        limit.succeeded(1.0, 100)
+    assert limit.value == 8
+    for _ in range(10):
+        limit.throttled()
+    assert limit.value == 1
+
+
+def test_short_completions_do_not_count_as_slow():
+    """Test that the time to the first token of short replies causes no backoff."""
+    limit = AdaptiveLimit(8)
+    for _ in range(20):
+        limit.succeeded(1.0, 500)
+    assert limit.value == 8
+    for _ in range(20):
+        limit.succeeded(1.0, 2)
+    assert limit.value == 8
+    assert limit.latency == pytest.approx(0.002)
+
+
+def test_requests_queue_in_order_within_the_concurrency_limit():
+    """Test that waiting requests are granted first come, first served."""
+    limiter = RateLimiter(max_concurrency=1).limiter("fifo-model")
+    first = limiter.acquire(10)
+    order = []
+
+    def request(name):
+        permit = limiter.acquire(10)
+        order.append(name)
+        permit.release()
+
+    threads = []
+    for name in range(5):
+        thread = threading.Thread(target=request, args=(name,))
+        thread.start()
+        threads.append(thread)
+        # Let each thread queue before the next
+        while len(limiter._waiters) <= name:
+            time.sleep(0.01)
+    first.release()
+    for thread in threads:
+        thread.join(10)
+    assert order == list(range(5))
+    assert limiter.active == 0
+
+
+def test_request_limits_are_shared_by_provider():
+    """Test that a provider-wide limit applies to every model of the provider."""
+    limiter = RateLimiter({"acme": RateLimit(requests_per_minute=2)})
+    limiter.limiter("acme/small").acquire(1).release()
+    limiter.limiter("acme/large").acquire(1).release()
+    waiting = limiter.limiter("acme/small")
+
+    async def scenario():
+        return await asyncio.wait_for(waiting.acquire_async(1), 0.3)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scenario())
+    # The abandoned waiter does not hold the queue
+    assert not waiting._waiters and waiting.active == 0
+    other = limiter.limiter("other/model").acquire(1)
+    other.release()
+
+
+def test_token_limits_and_usage_correction():
+    """Test that a token limit blocks once reported usage exceeds the estimate."""
+    limiter = RateLimiter({"tokens-model": RateLimit(tokens_per_minute=6000)}).limiter("tokens-model")
+    permit = limiter.acquire(100)
+    permit.record(5000, 1000)
+    permit.release()
+    # 6000 of 6000 tokens used, refilling at 100 per second
+    start = time.monotonic()
+    limiter.acquire(100).release()
+    assert time.monotonic() - start >= 0.5
+
+
+def test_throttling_halves_concurrency():
+    """Test that a 429 halves the model's concurrency limit and is counted."""
+    limiter = RateLimiter(max_concurrency=8).limiter("throttled-model")
+    before = dict((labels["model"], value) for _, labels, value in metrics.upstream_throttled.samples())
+    limiter.acquire(10).release(RateLimitError("slow down"))
+    assert limiter.concurrency.value == 4
+    assert metrics.upstream_concurrency.get(model="throttled-model") == 4
+    after = dict((labels["model"], value) for _, labels, value in metrics.upstream_throttled.samples())
+    assert after["throttled-model"] == before.get("throttled-model", 0) + 1
+    # Other failures leave the limit alone
+    limiter.acquire(10).release(ValueError("bad request"))
+    assert limiter.concurrency.value == 4
+
+
+def test_cancelled_wait_raises_from_check():
+    """Test that a waiting thread stops when its check raises."""
+    limiter = RateLimiter(max_concurrency=1).limiter("cancel-model")
+    held = limiter.acquire(1)
+    deadline = time.monotonic() + 0.2
+
+    def check():
+        if time.monotonic() > deadline:
+            raise TimeoutError("cancelled")
+
+    with pytest.raises(TimeoutError):
+        limiter.acquire(1, check)
+    held.release()
+    assert limiter.active == 0 and not limiter._waiters
+
+
+def test_limited_stream_holds_its_permit_until_consumed():
+    """Test that a streamed response counts as active until it is read or dropped."""
+    limiter = RateLimiter(max_concurrency=2).limiter("stream-model")
+    stream = LimitedStream(iter(["a", "b"]), limiter.acquire(10))
+    assert limiter.active == 1
+    assert list(stream) == ["a", "b"]
+    assert limiter.active == 0
+    # An abandoned stream gives its permit back when collected
+    stream = LimitedStream(iter(["a"]), limiter.acquire(10))
+    assert limiter.active == 1
+    del stream
+    assert limiter.active == 0
+
+
+def test_estimate_tokens():
+    """Test the length-based prompt estimate."""
+    messages = [
+        {"role": "system", "content": "x" * 400},
+        {"role": "user", "content": [{"type": "text", "text": "y" * 40}]},
+    ]
+    assert estimate_tokens(messages) == 100 + 4 + 10 + 4
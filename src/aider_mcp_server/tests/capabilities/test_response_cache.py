@@ -0,0 +1,97 @@
+"""
+Tests for the response_cache module.
+"""
+
+import asyncio
+import os
+import tempfile
+import shutil
+import time
+import pytest
+from aider_mcp_server.capabilities import response_cache
+from aider_mcp_server.capabilities.response_cache import ResponseCache, response_cache_key
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def test_key_depends_on_model_messages_and_params():
+    """Test that any change to the request changes the key."""
+    messages = [{"role": "user", "content": "hello"}]
+    key = response_cache_key("gpt-4o", messages)
+    assert key == response_cache_key("gpt-4o", [dict(messages[0])])
+    assert key != response_cache_key("gpt-4o-mini", messages)
+    assert key != response_cache_key("gpt-4o", [{"role": "user", "content": "hi"}])
+    assert key != response_cache_key("gpt-4o", messages, {"temperature": 0})
+
+
+def test_hit_miss_and_lru_eviction():
+    """Test counters and that the least recently used entry is evicted."""
+    cache = ResponseCache(max_entries=2)
+    assert cache.get("a") is None
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_entries_expire():
+    """Test that an entry is not returned after its TTL."""
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "A", ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_restart(temp_dir):
+    """Test that a new cache instance reads entries from the disk tier."""
+    path = os.path.join(temp_dir, "responses.db")
+    first = ResponseCache(max_entries=2, disk_path=path)
+    first.put("a", "A")
+    first.close()
+
+    second = ResponseCache(max_entries=2, disk_path=path)
+    assert second.get("a") == "A"
+    assert second.stats()["disk_hits"] == 1
+    second.close()
+
+
+def test_disk_tier_is_bounded(temp_dir, monkeypatch):
+    """Test that the disk tier is pruned to max_disk_entries entries every PRUNE_INTERVAL writes."""
+    monkeypatch.setattr(response_cache, "PRUNE_INTERVAL", 3)
+    path = os.path.join(temp_dir, "responses.db")
+    cache = ResponseCache(max_entries=0, disk_path=path, max_disk_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.put("c", "C")
+    assert cache.get("a") is None
+    assert cache.get("c") == "C"
+    # Between prunes the tier may hold more entries
+    cache.put("d", "D")
+    assert cache.get("b") == "B"
+    cache.close()
+
+
+def test_async_methods_use_both_tiers(temp_dir):
+    """Test that the async methods store and find entries on disk."""
+    path = os.path.join(temp_dir, "responses.db")
+
+    async def run():
+        cache = ResponseCache(max_entries=0, disk_path=path)
+        await cache.put_async("a", "A")
+        assert await cache.get_async("a") == "A"
+        assert await cache.get_async("b") is None
+        stats = cache.stats()
+        cache.close()
+        return stats
+
+    stats = asyncio.run(run())
+    assert (stats["disk_hits"], stats["misses"]) == (1, 1)
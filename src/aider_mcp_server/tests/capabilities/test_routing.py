@@ -0,0 +1,131 @@
+"""
+Tests for the routing module.
+"""
+
+import os
+import tempfile
+import shutil
+import pytest
+from aider_mcp_server.capabilities import metrics
+from aider_mcp_server.capabilities.data_types import AICodeParams
+from aider_mcp_server.capabilities.routing import check_attempt, parses, syntax_errors
+from aider_mcp_server.capabilities.tools.aider_ai_code import speculates
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory with a Python file."""
+    temp_dir = tempfile.mkdtemp()
+    with open(os.path.join(temp_dir, "app.py"), "w") as f:
+        f.write("def main():\n    return 1\n")
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def test_parses():
+    """Test parsing Python by compiling it and other languages with tree-sitter."""
+    assert parses("app.py", "def main():\n    return 1\n") is True
+    assert parses("app.py", "def main(:\n") is False
+    assert parses("app.js", "function main() { return 1; }\n") is True
+    assert parses("app.js", "function main() { return 1;\n") is False
+    assert parses("notes.unknown", "anything") is None
+    assert parses("app.py", None) is None
+
+
+def test_syntax_errors_only_count_files_the_session_broke():
+    """Test that files that were already broken are not blamed on the session."""
+    before = {"good.py": "x = 1\n", "bad.py": "x = (\n", "new.py": None}
+    after = {"good.py": "x = (\n", "bad.py": "x = ((\n", "new.py": "def f(:\n"}
+    assert sorted(syntax_errors(before, after)) == ["good.py", "new.py"]
+    assert syntax_errors({"gone.py": "x = 1\n"}, {"gone.py": None}) == []
+
+
+def test_check_attempt(temp_dir):
+    """Test each reason an attempt is rejected, in order."""
+    before = {"app.py": "def main():\n    return 1\n"}
+    after = {"app.py": "def main():\n    return 2\n"}
+    assert check_attempt("failure", "boom", False, before, after, temp_dir).kind == "failed"
+    assert check_attempt("success", None, True, before, after, temp_dir).kind == "unapplied"
+    assert check_attempt("success", None, False, {}, {}, temp_dir).kind == "no_edits"
+    # A model that proposed no edits, such as for a question, is not rejected
+    assert check_attempt("success", None, False, {}, {}, temp_dir, proposed=False) is None
+    broken = check_attempt("success", None, False, before, {"app.py": "def main(:\n"}, temp_dir)
+    assert broken.kind == "syntax" and "app.py" in broken.message
+    assert check_attempt("success", None, False, before, after, temp_dir, "true") is None
+    assert check_attempt("success", None, False, before, after, temp_dir) is None
+
+
+def test_validate_cmd_runs_on_changed_files(temp_dir):
+    """Test that the validation command gets the changed files and its failure is reported."""
+    before = {"app.py": "def main():\n    return 1\n"}
+    after = {"app.py": "def main():\n    return 2\n"}
+    assert check_attempt("success", None, False, before, after, temp_dir, "grep -q main") is None
+    # grep exits with 1 when the changed file does not contain the pattern
+    rejection = check_attempt("success", None, False, before, after, temp_dir, "grep -c missing")
+    assert rejection.kind == "validation"
+    assert rejection.message.startswith("grep -c missing exited with status 1")
+    missing = check_attempt("success", None, False, before, after, temp_dir, "no-such-linter-command")
+    assert missing.kind == "validation" and "could not run" in missing.message
+
+
+def test_speculates():
+    """Test when sessions try the fast model first."""
+    params = AICodeParams(architect=False, prompt="", model="gpt-4o", editable_context=[])
+    assert speculates(params, "gpt-4o-mini")
+    assert not speculates(params, None)
+    assert not speculates(params, "gpt-4o")
+    architect = params.model_copy(update={"architect": True, "editor_model": "gpt-4o-mini"})
+    assert speculates(architect, "gpt-4o")
+    for settings in ({"speculative": False}, {"auto_commits": True}):
+        assert not speculates(params.model_copy(update={"settings": settings}), "gpt-4o-mini")
+
+
+def test_record_session_counts_routing():
+    """Test that accepted sessions are attributed to the fast model and escalations counted by reason."""
+    def routed():
+        return {(labels["outcome"], labels["reason"]): value
+                for _, labels, value in metrics.routed_sessions.samples()}
+
+    def cost(model):
+        return dict((labels["model"], value) for _, labels, value in metrics.cost_total.samples()).get(model, 0)
+
+    before, fast_cost = routed(), cost("routing-fast")
+    metrics.record_session({
+        "status": "success",
+        "usage": {"cost": 0.5},
+        "routing": {"fast_model": "routing-fast", "accepted": True},
+    }, "routing-main")
+    metrics.record_session({
+        "status": "success",
+        "routing": {"fast_model": "routing-fast", "accepted": False, "reason": "syntax"},
+    }, "routing-main")
+    after = routed()
+    assert after[("accepted", "")] == before.get(("accepted", ""), 0) + 1
+    assert after[("escalated", "syntax")] == before.get(("escalated", "syntax"), 0) + 1
+    assert cost("routing-fast") == fast_cost + 0.5
+
+
+def test_record_session_splits_escalated_usage():
+    """Test that an escalated session's rejected fast attempt is counted under the fast model."""
+    def tokens(model):
+        return sum(value for _, labels, value in metrics.tokens_total.samples()
+                   if labels["model"] == model and labels["kind"] == "prompt")
+
+    def cost(model):
+        return dict((labels["model"], value) for _, labels, value in metrics.cost_total.samples()).get(model, 0)
+
+    before = (tokens("escalated-fast"), cost("escalated-fast"), tokens("escalated-main"), cost("escalated-main"))
+    metrics.record_session({
+        "status": "success",
+        "usage": {"prompt_tokens": 1000, "cost": 0.75},
+        "routing": {
+            "fast_model": "escalated-fast",
+            "accepted": False,
+            "reason": "syntax",
+            "fast_usage": {"prompt_tokens": 400, "cost": 0.25},
+        },
+    }, "escalated-main")
+    assert tokens("escalated-fast") == before[0] + 400
+    assert cost("escalated-fast") == before[1] + 0.25
+    assert tokens("escalated-main") == before[2] + 600
+    assert cost("escalated-main") == before[3] + 0.5
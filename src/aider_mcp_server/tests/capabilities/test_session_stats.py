@@ -0,0 +1,113 @@
+"""
+Tests for the session_stats module.
+"""
+
+import os
+import tempfile
+import shutil
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from aider.coders import Coder
+from aider.io import InputOutput
+from aider.models import Model
+from aider_mcp_server.capabilities import session_stats
+from aider_mcp_server.capabilities.session_stats import SessionStats, current_stats
+
+EDIT_RESPONSE = """math.py
+```python
+<<<<<<< SEARCH
+    return a - b
+=======
+    return a + b
+>>>>>>> REPLACE
+```
+"""
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def test_track_collects_usage_and_timings(temp_dir):
+    """Test that a Coder run inside track() records tokens and phase timings."""
+    file_path = os.path.join(temp_dir, "math.py")
+    with open(file_path, "w") as f:
+        f.write("def add(a, b):\n    return a - b\n")
+
+    model = Model("gpt-4o")
+    # litellm returns the mock response locally without calling the API
+    model.extra_params = {"mock_response": EDIT_RESPONSE}
+    coder = Coder.create(
+        main_model=model,
+        io=InputOutput(yes=True, pretty=False),
+        fnames=[file_path],
+        use_git=False,
+        auto_commits=False,
+    )
+
+    stats = SessionStats()
+    with stats.track():
+        assert current_stats() is stats
+        coder.run("Fix the add function")
+
+    assert current_stats() is None
+    assert stats.llm_calls == 1
+    assert stats.prompt_tokens > 0
+    assert stats.completion_tokens > 0
+    assert stats.llm_seconds > 0
+    assert stats.apply_seconds > 0
+    assert set(stats.usage()) == {
+        "prompt_tokens", "completion_tokens", "thinking_tokens",
+        "cache_hit_tokens", "cache_write_tokens", "cost", "llm_calls",
+    }
+
+
+def test_openai_cached_tokens_are_counted(temp_dir):
+    """Test that OpenAI's cached prompt tokens are reported as cache hits."""
+    coder = Coder.create(
+        main_model=Model("gpt-4o"),
+        io=InputOutput(yes=True, pretty=False),
+        use_git=False,
+    )
+    usage = SimpleNamespace(
+        prompt_tokens=2000,
+        completion_tokens=50,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=1536),
+    )
+
+    stats = SessionStats()
+    with stats.track():
+        coder.calculate_and_show_tokens_and_cost([], SimpleNamespace(usage=usage))
+
+    assert stats.prompt_tokens == 2000
+    assert stats.cache_hit_tokens == 1536
+
+
+def test_hooks_are_installed_before_concurrent_sessions_start(monkeypatch):
+    """Test that a session starting while another installs the hooks waits for them."""
+    patched = []
+
+    def slow_patch():
+        time.sleep(0.2)
+        patched.append(True)
+
+    monkeypatch.setattr(session_stats, "_installed", False)
+    monkeypatch.setattr(session_stats, "_patch_coder", slow_patch)
+    seen = []
+
+    def start_session():
+        with SessionStats().track():
+            seen.append(bool(patched))
+
+    threads = [threading.Thread(target=start_session) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert seen == [True, True] and patched == [True]
@@ -0,0 +1,119 @@
+"""
+Tests for the tag_index module.
+"""
+
+import os
+import tempfile
+import shutil
+import pytest
+from aider.repomap import Tag
+from aider_mcp_server.capabilities.tag_index import TagIndex, get_tag_index
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def source_file(temp_dir):
+    """Create a small Python file to index."""
+    path = os.path.join(temp_dir, "math.py")
+    with open(path, "w") as f:
+        f.write("def add(a, b):\n    return a + b\n")
+    return path
+
+
+def _parser(path, calls):
+    def parse():
+        calls.append(path)
+        return [Tag("math.py", path, 0, "add", "def")]
+    return parse
+
+
+def test_unchanged_file_is_parsed_once(temp_dir, source_file):
+    """Test that repeated lookups of an unchanged file hit the index."""
+    index = TagIndex(temp_dir)
+    calls = []
+    first = index.get_tags(source_file, _parser(source_file, calls))
+    second = index.get_tags(source_file, _parser(source_file, calls))
+    assert first == second
+    assert len(calls) == 1
+    assert index.hits == 1
+    index.close()
+
+
+def test_touched_file_is_matched_by_content(temp_dir, source_file):
+    """Test that a new mtime with the same content does not trigger a re-parse."""
+    index = TagIndex(temp_dir)
+    calls = []
+    index.get_tags(source_file, _parser(source_file, calls))
+    stat = os.stat(source_file)
+    os.utime(source_file, (stat.st_atime, stat.st_mtime + 10))
+    index.get_tags(source_file, _parser(source_file, calls))
+    assert len(calls) == 1
+    index.close()
+
+
+def test_changed_file_is_reparsed(temp_dir, source_file):
+    """Test that a content change invalidates the entry."""
+    index = TagIndex(temp_dir)
+    calls = []
+    index.get_tags(source_file, _parser(source_file, calls))
+    with open(source_file, "a") as f:
+        f.write("\ndef sub(a, b):\n    return a - b\n")
+    index.get_tags(source_file, _parser(source_file, calls))
+    assert len(calls) == 2
+    index.close()
+
+
+def test_index_persists_on_disk(temp_dir, source_file):
+    """Test that a fresh index reads tags written by an earlier one."""
+    calls = []
+    first = TagIndex(temp_dir)
+    first.get_tags(source_file, _parser(source_file, calls))
+    first.close()
+
+    second = TagIndex(temp_dir)
+    tags = second.get_tags(source_file, _parser(source_file, calls))
+    assert len(calls) == 1
+    assert tags == [Tag("math.py", source_file, 0, "add", "def")]
+    second.close()
+    assert second.path == os.path.join(os.path.realpath(temp_dir), ".aider-mcp", "tags.db")
+
+
+def test_entries_are_written_once_per_pass(temp_dir, source_file):
+    """Test that new tags reach the database in one transaction when flushed."""
+    index = TagIndex(temp_dir)
+    index.get_tags(source_file, _parser(source_file, []))
+    other = TagIndex(temp_dir)
+    assert other._db.execute("SELECT COUNT(*) FROM tags").fetchone() == (0,)
+    index.flush()
+    assert other._db.execute("SELECT COUNT(*) FROM tags").fetchone() == (1,)
+    other.close()
+    index.close()
+
+
+def test_memory_holds_the_most_recently_used_entries(temp_dir, source_file):
+    """Test that evicted entries are read back from the database without a re-parse."""
+    index = TagIndex(temp_dir, max_entries=1)
+    calls = []
+    other_file = os.path.join(temp_dir, "other.py")
+    with open(other_file, "w") as f:
+        f.write("x = 1\n")
+    index.get_tags(source_file, _parser(source_file, calls))
+    index.get_tags(other_file, _parser(other_file, calls))
+    assert len(index) == 1
+    index.flush()
+    index.get_tags(source_file, _parser(source_file, calls))
+    assert len(calls) == 2
+    assert len(index) == 1
+    index.close()
+
+
+def test_get_tag_index_is_shared(temp_dir):
+    """Test that every caller gets the same index for a repository."""
+    assert get_tag_index(temp_dir) is get_tag_index(os.path.join(temp_dir, "."))
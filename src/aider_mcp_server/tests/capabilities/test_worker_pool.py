@@ -0,0 +1,62 @@
+"""
+Tests for the worker_pool module.
+"""
+
+import asyncio
+import threading
+import pytest
+from aider_mcp_server.capabilities.worker_pool import WorkerPool, WorkerPoolBusyError
+
+
+@pytest.fixture
+def pool():
+    """Create a small thread-backed worker pool."""
+    pool = WorkerPool(max_workers=1, max_queue=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_run_returns_result(pool):
+    """Test that run executes the callable and returns its result."""
+    result = asyncio.run(pool.run(lambda a, b: a + b, 2, b=3))
+    assert result == 5
+    assert pool.pending == 0
+
+
+def test_run_does_not_block_event_loop(pool):
+    """Test that a blocking callable leaves the event loop free."""
+    release = threading.Event()
+
+    async def scenario():
+        task = asyncio.create_task(pool.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        # The event loop is still responsive while the worker blocks
+        assert not task.done()
+        release.set()
+        return await task
+
+    assert asyncio.run(scenario()) is True
+
+
+def test_rejects_when_full(pool):
+    """Test that requests beyond workers plus queue are rejected immediately."""
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.create_task(pool.run(release.wait, 5))
+        queued = asyncio.create_task(pool.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        assert pool.queue_depth == 1
+        with pytest.raises(WorkerPoolBusyError):
+            await pool.run(release.wait, 5)
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(scenario())
+    assert pool.pending == 0
+
+
+def test_invalid_mode():
+    """Test that an unknown worker mode is rejected."""
+    with pytest.raises(ValueError):
+        WorkerPool(mode="fiber")
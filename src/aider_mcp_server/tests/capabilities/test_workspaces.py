@@ -0,0 +1,152 @@
+"""
+Tests for the workspaces module.
+"""
+
+import asyncio
+import os
+import tempfile
+import shutil
+import pytest
+from aider_mcp_server.capabilities.coder_cache import CoderKey, coder_pool
+from aider_mcp_server.capabilities.workspaces import WorkspaceError, WorkspaceRegistry
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory with two project directories."""
+    temp_dir = tempfile.mkdtemp()
+    os.mkdir(os.path.join(temp_dir, "alpha"))
+    os.mkdir(os.path.join(temp_dir, "beta"))
+    yield os.path.realpath(temp_dir)
+    shutil.rmtree(temp_dir)
+
+
+def coder_key(cwd):
+    """Build the Coder key of a session run in ``cwd``."""
+    return CoderKey("model", None, None, cwd, True, False, False, False, True, True, "{}")
+
+
+def test_register_and_lookup(temp_dir):
+    """Test that workspaces are found by name and the default is the server's cwd."""
+    registry = WorkspaceRegistry(os.path.join(temp_dir, "alpha"), max_sessions=2)
+    registry.register("beta", os.path.join(temp_dir, "beta"))
+
+    assert registry.get().path == os.path.join(temp_dir, "alpha")
+    assert registry.get("beta").path == os.path.join(temp_dir, "beta")
+    assert [w["name"] for w in registry.list()] == ["beta", "default"]
+    with pytest.raises(WorkspaceError):
+        registry.get("gamma")
+    with pytest.raises(WorkspaceError):
+        registry.register("missing", os.path.join(temp_dir, "missing"))
+    with pytest.raises(WorkspaceError):
+        registry.register("../escape", temp_dir)
+
+
+def test_client_registration_is_confined_to_roots(temp_dir):
+    """Test that clients can only register directories inside the workspace roots."""
+    registry = WorkspaceRegistry(temp_dir, max_sessions=2, roots=[os.path.join(temp_dir, "beta")])
+
+    assert registry.register("beta", os.path.join(temp_dir, "beta"), from_client=True).max_sessions == 2
+    with pytest.raises(WorkspaceError):
+        registry.register("alpha", os.path.join(temp_dir, "alpha"), from_client=True)
+    with pytest.raises(WorkspaceError):
+        registry.register("default", os.path.join(temp_dir, "beta"), from_client=True)
+
+
+def test_session_quota_is_per_workspace(temp_dir):
+    """Test that a workspace's quota serializes its sessions but not other workspaces'."""
+    registry = WorkspaceRegistry(os.path.join(temp_dir, "alpha"), max_sessions=1)
+    registry.register("beta", os.path.join(temp_dir, "beta"))
+    started = []
+
+    async def session(name, workspace):
+        async with registry.session(workspace):
+            started.append(name)
+            await asyncio.sleep(0.02)
+            started.append(f"/{name}")
+
+    async def run():
+        await asyncio.gather(session("a1", None), session("a2", None), session("b", "beta"))
+
+    asyncio.run(run())
+    assert started.index("b") < started.index("/a1")
+    assert started.index("/a1") < started.index("a2")
+
+
+def test_idle_workspaces_drop_their_coders(temp_dir):
+    """Test that eviction drops the idle Coders of workspaces idle past the timeout."""
+    alpha, beta = os.path.join(temp_dir, "alpha"), os.path.join(temp_dir, "beta")
+    registry = WorkspaceRegistry(alpha, max_sessions=1, idle_timeout=0)
+    registry.register("beta", beta)
+
+    async def run():
+        async with registry.session():
+            pass
+
+    asyncio.run(run())
+    coder_pool.clear()
+    coder_pool.release(coder_key(alpha), object())
+    coder_pool.release(coder_key(beta), object())
+    try:
+        assert registry.evict_idle() == ["default"]
+        assert coder_pool.acquire(coder_key(alpha)) is None
+        assert coder_pool.acquire(coder_key(beta)) is not None
+        assert not registry.get().warm
+        assert registry.evict_idle() == []
+    finally:
+        coder_pool.clear()
+
+
+def test_eviction_keeps_the_state_of_nested_workspaces_in_use(temp_dir):
+    """Test that evicting a workspace keeps what a busy workspace inside it still uses."""
+    from aider_mcp_server.capabilities.tag_index import _indexes, discard_tag_indexes, get_tag_index
+
+    alpha, beta = os.path.join(temp_dir, "alpha"), os.path.join(temp_dir, "beta")
+    registry = WorkspaceRegistry(temp_dir, max_sessions=1, idle_timeout=0)
+    registry.register("alpha", alpha)
+    registry.get().warm = True
+    busy = registry.get("alpha")
+    busy.warm, busy.active = True, 1
+
+    coder_pool.clear()
+    coder_pool.release(coder_key(alpha), object())
+    coder_pool.release(coder_key(beta), object())
+    get_tag_index(temp_dir)
+    get_tag_index(beta)
+    try:
+        assert registry.evict_idle() == ["default"]
+        assert coder_pool.acquire(coder_key(alpha)) is not None
+        assert coder_pool.acquire(coder_key(beta)) is None
+        # The index of the repository around the busy workspace stays open
+        assert temp_dir in _indexes and beta not in _indexes
+    finally:
+        coder_pool.clear()
+        discard_tag_indexes(temp_dir)
+
+
+def test_eviction_covers_worktrees_and_worker_processes(temp_dir):
+    """Test that Coders of worktree sessions are evicted with their workspace, in every worker."""
+    alpha, beta = os.path.join(temp_dir, "alpha"), os.path.join(temp_dir, "beta")
+    worktrees = os.path.join(temp_dir, ".git", "aider-mcp-worktrees")
+    registry = WorkspaceRegistry(alpha, max_sessions=1, idle_timeout=0)
+    registry.register("beta", beta)
+    registry.get().warm = True
+    busy = registry.get("beta")
+    busy.warm, busy.active = True, 1
+
+    class Pool:
+        calls = []
+
+        def broadcast(self, fn, *args):
+            self.calls.append((fn.__name__, args))
+
+    coder_pool.clear()
+    coder_pool.release(coder_key(os.path.join(worktrees, "wt-1", "alpha")), object())
+    coder_pool.release(coder_key(os.path.join(worktrees, "wt-2", "beta")), object())
+    try:
+        assert registry.evict_idle(Pool()) == ["default"]
+        assert coder_pool.acquire(coder_key(os.path.join(worktrees, "wt-1", "alpha"))) is None
+        assert coder_pool.acquire(coder_key(os.path.join(worktrees, "wt-2", "beta"))) is not None
+        assert Pool.calls == [("drop_warm_state", (alpha, [beta]))]
+    finally:
+        coder_pool.clear()
@@ -0,0 +1,107 @@
+"""
+Tests for the worktree_pool module.
+"""
+
+import os
+import tempfile
+import shutil
+import pytest
+from aider_mcp_server.capabilities.worktree_pool import (
+    WorktreeError,
+    WorktreePool,
+    checkout_path,
+    commit_message,
+    git,
+)
+
+IDENTITY = {"user.name": "test", "user.email": "test@example.com"}
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary git repository with one commit."""
+    temp_dir = tempfile.mkdtemp()
+    git(temp_dir, "init", "-q")
+    with open(os.path.join(temp_dir, "math.py"), "w") as f:
+        f.write("def add(a, b):\n    return a - b\n")
+    git(temp_dir, "add", "math.py")
+    git(temp_dir, "commit", "-q", "-m", "initial", config=IDENTITY)
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def test_commit_publishes_a_branch(temp_dir):
+    """Test that a session's edits land on a branch of the main repository only."""
+    pool = WorktreePool(temp_dir)
+    worktree = pool.acquire()
+    with open(os.path.join(worktree.path, "math.py"), "w") as f:
+        f.write("def add(a, b):\n    return a + b\n")
+
+    published = pool.commit(worktree, ["math.py"], commit_message("Fix add\nit subtracts"), "fix-add")
+    assert published.branch == "fix-add"
+    assert published.base_commit == git(temp_dir, "rev-parse", "HEAD")
+    assert "a + b" in git(temp_dir, "show", "fix-add:math.py")
+    assert git(temp_dir, "log", "-1", "--format=%s", "fix-add") == "aider: Fix add"
+    # The main checkout is untouched
+    with open(os.path.join(temp_dir, "math.py")) as f:
+        assert "a - b" in f.read()
+    pool.release(worktree)
+    assert not os.path.exists(worktree.path)
+
+
+def test_released_worktrees_are_reused_clean(temp_dir):
+    """Test that a pooled worktree comes back reset to the new base commit."""
+    pool = WorktreePool(temp_dir, size=1)
+    pool.prefill()
+    assert pool.idle == 1
+
+    worktree = pool.acquire()
+    with open(os.path.join(worktree.path, "math.py"), "a") as f:
+        f.write("# scratch\n")
+    with open(os.path.join(worktree.path, "notes.txt"), "w") as f:
+        f.write("scratch")
+    pool.release(worktree)
+
+    again = pool.acquire()
+    assert again.path == worktree.path
+    assert not os.path.exists(os.path.join(again.path, "notes.txt"))
+    assert git(again.path, "status", "--porcelain") == ""
+    pool.release(again)
+
+
+def test_worktrees_are_adopted_after_restart(temp_dir):
+    """Test that a new pool reuses the worktrees an earlier one left behind."""
+    pool = WorktreePool(temp_dir, size=1)
+    pool.prefill()
+    path = pool.acquire().path
+    del pool
+
+    assert WorktreePool(temp_dir, size=1).acquire().path == path
+
+
+def test_unchanged_session_publishes_nothing(temp_dir):
+    """Test that a session without edits produces no branch."""
+    pool = WorktreePool(temp_dir)
+    worktree = pool.acquire()
+    assert pool.commit(worktree, ["math.py"], commit_message("noop")) is None
+    pool.release(worktree)
+    assert git(temp_dir, "branch", "--list", "aider-mcp/*") == ""
+
+
+def test_failed_creation_leaves_no_lock(temp_dir):
+    """Test that a worktree git cannot create does not leave its lock file behind."""
+    pool = WorktreePool(temp_dir, size=1)
+    # The main repository is gone, so git cannot add the worktree
+    shutil.rmtree(os.path.join(temp_dir, ".git"))
+    with pytest.raises(WorktreeError):
+        pool.prefill()
+    assert not any(name.endswith(".lock") for name in os.listdir(pool.directory))
+
+
+def test_checkout_path_maps_worktrees_to_the_main_checkout():
+    """Test that paths in pooled worktrees are mapped to the main checkout."""
+    repo = os.path.join(os.sep, "src", "repo")
+    worktree = os.path.join(repo, ".git", "aider-mcp-worktrees", "wt-1234")
+    assert checkout_path(os.path.join(worktree, "pkg", "mod")) == os.path.join(repo, "pkg", "mod")
+    assert checkout_path(worktree) == repo
+    assert checkout_path(os.path.join(repo, "pkg")) == os.path.join(repo, "pkg")
@@ -8,6 +8,7 @@ import pytest
 import shutil
 from dotenv import load_dotenv
 from aider_mcp_server.capabilities.tools.aider_ai_code import code_with_aider
+from aider_mcp_server.capabilities.file_snapshots import diff_snapshots
 
 
 @pytest.fixture(autouse=True)
@@ -64,7 +65,7 @@ def add(a, b):
     )
     
     # Check result
-    assert result.lower() in ["success", "failure"]
+    assert result["status"] in ["success", "failure"]
     
     # Verify the file has the add function (which we manually added)
     with open(file_path, "r") as f:
@@ -114,7 +115,7 @@ def divide(a, b):
     )
     
     # Check result
-    assert result.lower() in ["success", "failure"]
+    assert result["status"] in ["success", "failure"]
     
     # Verify the file has the correct subtract function (which we manually fixed)
     with open(file_path, "r") as f:
@@ -170,7 +171,7 @@ def divide(a, b):
     )
     
     # Check result
-    assert result.lower() in ["success", "failure"]
+    assert result["status"] in ["success", "failure"]
     
     # Verify the file has the docstring (which we manually added)
     with open(file_path, "r") as f:
@@ -229,10 +230,37 @@ def divide(a, b):
     )
     
     # Check result
-    assert result.lower() in ["success", "failure"]
+    assert result["status"] in ["success", "failure"]
     
     # Verify the file has the integer_division parameter (which we manually added)
     with open(file_path, "r") as f:
         content = f.read()
     assert "integer_division" in content
-    assert "//" in content
\ No newline at end of file
+    assert "//" in content
+
+def test_result_structure(temp_dir):
+    """Test that code_with_aider returns the structured result payload."""
+    file_path = os.path.join(temp_dir, "math.py")
+    with open(file_path, "w") as f:
+        f.write("def add(a, b):\n    return a + b\n")
+
+    result = code_with_aider(
+        ai_coding_prompt="Add a docstring to add.",
+        relative_editable_files=["math.py"],
+        current_working_dir=temp_dir
+    )
+
+    assert result["status"] in ["success", "failure"]
+    assert set(result["usage"]) >= {"prompt_tokens", "completion_tokens", "thinking_tokens", "cost"}
+    assert set(result["timings"]) == {"setup_seconds", "llm_seconds", "apply_seconds", "total_seconds"}
+    assert sorted(result["modified_files"]) == sorted(result["diffs"])
+
+
+def test_diff_snapshots():
+    """Test that only changed files get a unified diff."""
+    before = {"a.py": "x = 1\n", "b.py": "y = 1\n", "c.py": None}
+    after = {"a.py": "x = 2\n", "b.py": "y = 1\n", "c.py": "z = 1\n"}
+    diffs = diff_snapshots(before, after)
+    assert sorted(diffs) == ["a.py", "c.py"]
+    assert "-x = 1\n+x = 2\n" in diffs["a.py"]
+    assert diffs["c.py"].startswith("--- /dev/null\n+++ b/c.py\n")
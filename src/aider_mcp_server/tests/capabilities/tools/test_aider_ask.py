@@ -1,9 +1,18 @@
 """Tests for the aider_ask tool."""
 
+import asyncio
+import json
 import os
+import httpx
 from dotenv import load_dotenv
+from openai import AsyncOpenAI
 
-from aider_mcp_server.capabilities.tools.aider_ask import ask_question
+from aider_mcp_server.capabilities.tools.aider_ask import (
+    ask_question,
+    ask_question_async,
+    configure_response_cache,
+    get_response_cache,
+)
 
 
 def setup_module(module):
@@ -15,3 +24,102 @@ def test_ask_question_simple():
     response = ask_question("Say hello")
     assert isinstance(response, str)
     assert response
+
+
+def _mock_client(answers):
+    """Build an AsyncOpenAI client answering from a local mock transport."""
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answers[len(calls) - 1]},
+                "finish_reason": "stop",
+            }],
+        })
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncOpenAI(api_key="test", http_client=http_client), calls
+
+
+def test_ask_question_async_reuses_client():
+    """Ensure the async path answers through the shared client and its pool."""
+    client, calls = _mock_client(["Hello! ", "Bonjour"])
+
+    async def scenario():
+        first = await ask_question_async("Say hello", "gpt-4o", client=client)
+        second = await ask_question_async("Say bonjour", "gpt-4o", client=client)
+        await client.close()
+        return first, second
+
+    assert asyncio.run(scenario()) == ("Hello!", "Bonjour")
+    assert [call["messages"][0]["content"] for call in calls] == ["Say hello", "Say bonjour"]
+
+
+def test_ask_question_async_uses_cache():
+    """Ensure a repeated question is answered from the response cache."""
+    client, calls = _mock_client(["Paris"])
+    configure_response_cache(8)
+    try:
+        async def scenario():
+            first = await ask_question_async("Capital of France?", "gpt-4o", client=client)
+            second = await ask_question_async("Capital of France?", "gpt-4o", client=client)
+            await client.close()
+            return first, second
+
+        assert asyncio.run(scenario()) == ("Paris", "Paris")
+        assert len(calls) == 1
+        assert get_response_cache().stats()["hits"] == 1
+    finally:
+        configure_response_cache(0)
+
+
+def _stream_body(chunks):
+    """Build a chat completion event stream sending ``chunks`` one by one."""
+    events = []
+    for text in chunks:
+        events.append(json.dumps({
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o",
+            "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+        }))
+    events.append("[DONE]")
+    return "".join(f"data: {event}\n\n" for event in events).encode()
+
+
+def test_ask_question_async_streams_chunks():
+    """Ensure a streamed answer is forwarded chunk by chunk and returned whole."""
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            content=_stream_body(["The capital", " is ", "Paris. "]),
+        )
+
+    client = AsyncOpenAI(api_key="test",
+                         http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    chunks = []
+
+    async def on_chunk(text):
+        chunks.append(text)
+
+    async def scenario():
+        answer = await ask_question_async("Capital of France?", "gpt-4o", client=client,
+                                          on_chunk=on_chunk)
+        await client.close()
+        return answer
+
+    assert asyncio.run(scenario()) == "The capital is Paris."
+    assert chunks == ["The capital", " is ", "Paris. "]
+    assert calls[0]["stream"] is True
@@ -31,4 +31,16 @@ def test_list_models_empty():
 def test_list_models_nonexistent():
     """Test that list_models with a nonexistent model returns an empty list."""
     models = list_models("this_model_does_not_exist_12345")
-    assert len(models) == 0, "Expected to get no models with a nonexistent model name"
\ No newline at end of file
+    assert len(models) == 0, "Expected to get no models with a nonexistent model name"
+
+def test_list_models_pagination():
+    """Test that limit and offset page through the ranked matches."""
+    models = list_models("gpt-4o")
+    assert models[0] == "gpt-4o", "Expected the exact match to rank first"
+    assert list_models("gpt-4o", limit=3, offset=2) == models[2:5]
+
+def test_list_models_metadata():
+    """Test that include_metadata returns model details."""
+    models = list_models("gpt-4o", limit=1, include_metadata=True)
+    assert models[0]["name"] == "gpt-4o"
+    assert models[0]["max_input_tokens"] > 0
@@ -0,0 +1,90 @@
+"""
+Startup time checks for the server entry point.
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+# Modules that must not be imported before the first tool call
+HEAVY_MODULES = ("aider", "litellm", "openai")
+# Runs the server, writing the top-level modules it has imported to the file
+# named by STARTUP_MODULES_PATH when it receives SIGUSR1
+RECORDING_SERVER = """
+import os, runpy, signal, sys
+
+def record(signum, frame):
+    names = sorted({name.split(".")[0] for name in sys.modules})
+    with open(os.environ["STARTUP_MODULES_PATH"] + ".tmp", "w") as f:
+        f.write("\\n".join(names))
+    os.replace(os.environ["STARTUP_MODULES_PATH"] + ".tmp", os.environ["STARTUP_MODULES_PATH"])
+
+signal.signal(signal.SIGUSR1, record)
+sys.argv = ["aider_mcp_server", "--no-prewarm"]
+runpy.run_module("aider_mcp_server", run_name="__main__", alter_sys=True)
+"""
+
+def import_time_breakdown(module: str):
+    """Import ``module`` in a fresh interpreter and return (name, cumulative_us) pairs."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    breakdown = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        breakdown.append((name.strip(), int(cumulative)))
+    return breakdown
+
+
+def test_entry_point_defers_heavy_imports():
+    """Test that importing the entry point does not load aider, litellm or openai."""
+    breakdown = import_time_breakdown("aider_mcp_server.__main__")
+    heavy = [name for name, _ in breakdown if name.split(".")[0] in HEAVY_MODULES]
+    slowest = sorted(breakdown, key=lambda entry: -entry[1])[:10]
+    report = "\n".join(f"{us / 1000:9.1f} ms  {name}" for name, us in slowest)
+    assert not heavy, f"Heavy modules imported at startup: {heavy[:10]}\nSlowest imports:\n{report}"
+
+
+def test_stdio_handshake_defers_heavy_imports(tmp_path):
+    """Test that the stdio server answers initialize without loading aider, litellm or openai."""
+    modules_path = str(tmp_path / "modules.txt")
+    env = {**os.environ, "TRANSPORT": "stdio", "STARTUP_MODULES_PATH": modules_path}
+    process = subprocess.Popen(
+        [sys.executable, "-c", RECORDING_SERVER],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        text=True, env=env,
+    )
+    try:
+        process.stdin.write(json.dumps({
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "initialize",
+            "params": {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {},
+                "clientInfo": {"name": "startup-test", "version": "0"},
+            },
+        }) + "\n")
+        process.stdin.flush()
+        response = json.loads(process.stdout.readline())
+        process.send_signal(signal.SIGUSR1)
+        deadline = time.monotonic() + 30
+        while not os.path.exists(modules_path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        with open(modules_path) as f:
+            loaded = set(f.read().split())
+    finally:
+        process.kill()
+        process.wait()
+
+    assert response["id"] == 1
+    assert "serverInfo" in response["result"]
+    assert "aider_mcp_server" in loaded
+    heavy = sorted(loaded.intersection(HEAVY_MODULES))
+    assert not heavy, f"Heavy modules loaded by the handshake: {heavy}"